@@ -2,13 +2,20 @@
 # -*- coding: utf-8 -*-
 
 from django.db import transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from decimal import Decimal
 
-from app_orders.models import Order, OrderItem
+from app_orders.models import CartReservation, Order, OrderItem, ProductSalesDaily
 from app_customers.models import Customer
-from app_orders.utils.cart import Cart
-from app_products.models import Product  # ✅ Importar Product
+from app_orders.utils.cart import get_cart
+from app_products.models import Product, ProductVariant  # ✅ Importar Product
+from app_products.signals import (
+    refresh_category_tiles,
+    refresh_facets,
+    refresh_product,
+    refresh_variant_matrix,
+)
 
 class OrderService:
     """Servicio para manejar la lógica de negocio de las órdenes"""
@@ -23,13 +30,21 @@ class OrderService:
         """
         try:
             with transaction.atomic():
-                # 1. Obtener carrito
-                cart = Cart(request)
+                # 1. Obtener carrito (precios leídos de las variantes, no del cliente)
+                cart = get_cart(request)
                 cart_items = cart.get_items()
                 
                 if not cart_items:
                     return None, None, False, 'El carrito está vacío'
                 
+                # 1.1 Descontar el stock de todas las líneas (todo o nada)
+                quantities = {item['variant_id']: item['quantity'] for item in cart_items}
+                short = CartReservation.checkout(cart.session_key, quantities)
+                if short:
+                    skus = ', '.join(item['sku'] for item in cart_items if item['variant_id'] in short)
+                    return None, None, False, f'Stock insuficiente para: {skus}'
+                OrderService._refresh_stock(cart_items)
+                
                 # 2. Obtener o crear usuario y customer
                 user, customer = OrderService._get_or_create_user_and_customer(
                     request,
@@ -52,24 +67,26 @@ class OrderService:
                 order.save()
                 
                 # 4. Crear items de la orden e incrementar sales_count
-                for item in cart_items:
-                    # Crear OrderItem
-                    OrderItem.objects.create(
+                OrderItem.objects.bulk_create([
+                    OrderItem(
                         order=order,
                         product_id=item['product_id'],
                         variant_id=item['variant_id'],
                         quantity=item['quantity'],
                         price=Decimal(str(item['price']))
                     )
-                    
-                    # ✅ Incrementar sales_count del producto
-                    try:
-                        product = Product.objects.get(id=item['product_id'])
-                        product.sales_count += item['quantity']  # Sumar la cantidad vendida
-                        product.save(update_fields=['sales_count'])
-                        print(f"✅ Product {product.id} sales_count actualizado a {product.sales_count}")
-                    except Product.DoesNotExist:
-                        print(f"⚠️ Producto {item['product_id']} no encontrado")
+                    for item in cart_items
+                ])
+                
+                # ✅ Sumar la cantidad vendida con F() (no pisa otras compras simultáneas)
+                sold = {}
+                for item in cart_items:
+                    sold[item['product_id']] = sold.get(item['product_id'], 0) + item['quantity']
+                for product_id, quantity in sold.items():
+                    Product.objects.filter(id=product_id).update(sales_count=F('sales_count') + quantity)
+                
+                # Sumar la orden a las ventas del día (rankings de más vendidos)
+                ProductSalesDaily.record_order(order)
                 
                 # 5. Generar mensaje de WhatsApp
                 whatsapp_message = OrderService._generate_whatsapp_message(
@@ -89,6 +106,27 @@ class OrderService:
             print(traceback.format_exc())
             return None, None, False, f'Error al crear la orden: {str(e)}'
     
+    @staticmethod
+    def _refresh_stock(cart_items):
+        """
+        Al confirmar: el detalle muestra el stock de cada variante y, si alguna
+        se agotó, cambian también la tarjeta, las facetas y las categorías.
+        """
+        variant_ids = [item['variant_id'] for item in cart_items]
+        product_ids = sorted({item['product_id'] for item in cart_items})
+        refresh_variant_matrix(product_ids)
+
+        sold_out = sorted(set(
+            ProductVariant.objects
+            .filter(id__in=variant_ids, stock=0)
+            .values_list('product_id', flat=True)
+        ))
+        for product_id in sold_out:
+            refresh_product(product_id)
+        if sold_out:
+            refresh_facets(sold_out)
+            refresh_category_tiles(sold_out)
+    
     @staticmethod
     def _get_or_create_user_and_customer(request, form_data):
         """Obtiene o crea un usuario y su perfil de Customer"""
@@ -184,27 +184,27 @@ class OrderAdmin(admin.ModelAdmin):
     
     # Acciones masivas
     def mark_as_sent_to_provider(self, request, queryset):
-        updated = queryset.update(status='sent_to_provider')
+        updated = Order.bulk_set_status(queryset, 'sent_to_provider')
         self.message_user(request, f'{updated} órdenes marcadas como enviadas al proveedor.')
     mark_as_sent_to_provider.short_description = '📤 Marcar como enviada al proveedor'
     
     def mark_as_accepted(self, request, queryset):
-        updated = queryset.update(status='accepted')
+        updated = Order.bulk_set_status(queryset, 'accepted')
         self.message_user(request, f'{updated} órdenes marcadas como aceptadas.')
     mark_as_accepted.short_description = '✓ Marcar como aceptada'
     
     def mark_as_shipped(self, request, queryset):
-        updated = queryset.update(status='shipped')
+        updated = Order.bulk_set_status(queryset, 'shipped')
         self.message_user(request, f'{updated} órdenes marcadas como enviadas.')
     mark_as_shipped.short_description = '🚚 Marcar como enviada'
     
     def mark_as_delivered(self, request, queryset):
-        updated = queryset.update(status='delivered')
+        updated = Order.bulk_set_status(queryset, 'delivered')
         self.message_user(request, f'{updated} órdenes marcadas como entregadas.')
     mark_as_delivered.short_description = '✓ Marcar como entregada'
     
     def mark_as_canceled(self, request, queryset):
-        updated = queryset.update(status='canceled')
+        updated = Order.bulk_set_status(queryset, 'canceled')
         self.message_user(request, f'{updated} órdenes canceladas.')
     mark_as_canceled.short_description = '✕ Cancelar órdenes'
 
@@ -339,7 +339,8 @@ class CartReservationAdmin(admin.ModelAdmin):
     
     list_filter = ('is_active', 'created_at', 'expires_at')
     search_fields = ('session_key', 'variant__sku')
-    readonly_fields = ('created_at', 'expires_at')
+    # Cantidad y estado solo cambian con reserve/release (mueven el disponible de la variante)
+    readonly_fields = ('created_at', 'expires_at', 'quantity', 'is_active')
     
     actions = ['mark_as_inactive', 'clean_expired_reservations']
     
@@ -362,11 +363,11 @@ class CartReservationAdmin(admin.ModelAdmin):
     status_badge.short_description = 'Estado'
     
     def mark_as_inactive(self, request, queryset):
-        updated = queryset.update(is_active=False)
+        updated = CartReservation.release_queryset(queryset)
         self.message_user(request, f'{updated} reservas marcadas como inactivas.')
     mark_as_inactive.short_description = '✕ Marcar como inactivas'
     
     def clean_expired_reservations(self, request, queryset):
         count = CartReservation.clean_expired()
-        self.message_user(request, f'{count} reservas expiradas limpiadas.')
+        self.message_user(request, f'{count} reservas expiradas desactivadas.')
     clean_expired_reservations.short_description = '🧹 Limpiar reservas expiradas'
\ No newline at end of file
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from app_orders.models import CartReservation, CartSession
+
+
+class Command(BaseCommand):
+    help = "Desactiva en lotes las reservas de carrito vencidas y borra los carritos abandonados"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=CartReservation.SWEEP_BATCH_SIZE)
+        parser.add_argument(
+            "--max-lotes",
+            type=int,
+            default=None,
+            help="Máximo de lotes por ejecución (por defecto hasta terminar)",
+        )
+
+    def handle(self, *args, **options):
+        total = CartReservation.clean_expired(
+            batch_size=options["batch_size"],
+            max_batches=options["max_lotes"],
+        )
+        carts = CartSession.purge_expired(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} reservas vencidas desactivadas, {carts} carritos abandonados borrados"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app_orders.models import ProductRecommendation
+
+
+class Command(BaseCommand):
+    help = "Calcula los productos comprados juntos con más frecuencia a partir del historial de órdenes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=ProductRecommendation.TOP_K)
+
+    def handle(self, *args, **options):
+        total = ProductRecommendation.rebuild(top_k=options["top"])
+        self.stdout.write(self.style.SUCCESS(f"✅ Recomendaciones de {total} productos actualizadas"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from app_orders.models import ProductSalesDaily
+from app_products.models import Category
+
+
+class Command(BaseCommand):
+    help = "Precalcula los rankings de más vendidos (7, 30 y 90 días); con --completo recalcula antes las ventas por día"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--completo",
+            action="store_true",
+            help="Recalcula la tabla de ventas por día desde todas las órdenes",
+        )
+
+    def handle(self, *args, **options):
+        if options["completo"]:
+            rows = ProductSalesDaily.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"✅ {rows} filas de ventas por día recalculadas"))
+
+        ProductSalesDaily.warm_rankings(Category.objects.values_list("id", flat=True))
+        self.stdout.write(self.style.SUCCESS(f"✅ Rankings de {', '.join(map(str, ProductSalesDaily.WINDOWS))} días listos"))
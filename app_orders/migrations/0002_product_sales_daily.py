@@ -0,0 +1,92 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_sales(apps, schema_editor):
+    # Acumula por día las órdenes existentes que no están canceladas
+    OrderItem = apps.get_model("app_orders", "OrderItem")
+    ProductSalesDaily = apps.get_model("app_orders", "ProductSalesDaily")
+
+    totals = (
+        OrderItem.objects.filter(product__isnull=False)
+        .exclude(order__status="canceled")
+        .annotate(day=TruncDate("order__created_at"))
+        .values("day", "product_id", "product__category_id")
+        .annotate(units=Sum("quantity"), revenue=Sum(F("price") * F("quantity")))
+    )
+    ProductSalesDaily.objects.bulk_create(
+        [
+            ProductSalesDaily(
+                day=row["day"],
+                product_id=row["product_id"],
+                category_id=row["product__category_id"],
+                units=row["units"],
+                revenue=row["revenue"],
+            )
+            for row in totals
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_orders", "0001_initial"),
+        ("app_products", "0008_category_tiles"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSalesDaily",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("units", models.IntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="app_products.category",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_sales",
+                        to="app_products.product",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["category", "day"],
+                        name="app_orders__categor_442c43_idx",
+                    )
+                ],
+                "unique_together": {("day", "product")},
+            },
+        ),
+        migrations.RunPython(backfill_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_orders", "0002_product_sales_daily"),
+        ("app_products", "0010_product_variant_matrix"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductRecommendation",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="recommendations",
+                        serialize=False,
+                        to="app_products.product",
+                    ),
+                ),
+                ("related_ids", models.JSONField(default=list)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
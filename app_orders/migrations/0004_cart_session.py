@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_orders", "0003_product_recommendation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CartSession",
+            fields=[
+                (
+                    "session_key",
+                    models.CharField(max_length=40, primary_key=True, serialize=False),
+                ),
+                ("lines", models.JSONField(default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_orders", "0004_cart_session"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productsalesdaily",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
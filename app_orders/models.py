@@ -1,8 +1,18 @@
 # app_orders/models.py
 
 
-from django.db import models
-from app_products.models import Product, ProductVariant
+import heapq
+import math
+from collections import Counter, defaultdict
+from itertools import combinations
+
+from django.core.cache import cache
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from app_products.models import Category, Product, ProductVariant
+from app_products.upsert import upsert
+from app_products.versions import SALES, bump_version, get_version, product_key
 from app_customers.models import Customer
 from django.utils import timezone
 from datetime import timedelta
@@ -11,11 +21,28 @@ from datetime import timedelta
 #   CARRITO TEMPORAL (para gestión de stock)
 # ---------------------------
 
+class CartReservationQuerySet(models.QuerySet):
+    def live(self):
+        """Reservas que todavía apartan stock (activas y sin vencer)"""
+        return self.filter(is_active=True, expires_at__gte=timezone.now())
+
+    def expired(self):
+        """Activas pero vencidas: cuentan como libres al reservar; las desactiva el barrido"""
+        return self.filter(is_active=True, expires_at__lt=timezone.now())
+
+
 class CartReservation(models.Model):
     """
     Modelo para rastrear reservas temporales de stock en el carrito.
-    Se eliminan automáticamente después de 3 horas si no se completa la compra.
+    Cada reserva activa está descontada de ProductVariant.available: se
+    aparta con un UPDATE condicional (reserve) y se devuelve al liberarla
+    (release) o cuando el barrido (expire_cart_reservations) desactiva las
+    vencidas. Vencen a las 3 horas si no se completa la compra; desde ahí
+    sus unidades ya cuentan como libres aunque el barrido no haya pasado.
     """
+    TTL = timedelta(hours=3)
+    SWEEP_BATCH_SIZE = 1000
+
     session_key = models.CharField(max_length=40, db_index=True)  # ID único del carrito
     variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
@@ -25,6 +52,8 @@ class CartReservation(models.Model):
     
     is_active = models.BooleanField(default=True)
 
+    objects = CartReservationQuerySet.as_manager()
+
     class Meta:
         unique_together = ('session_key', 'variant')
         indexes = [
@@ -33,27 +62,271 @@ class CartReservation(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.expires_at:
-            self.expires_at = timezone.now() + timedelta(hours=3)
+            self.expires_at = timezone.now() + self.TTL
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Reserva {self.session_key} - {self.variant.sku}"
 
+    @property
+    def is_live(self):
+        """True si la reserva todavía aparta stock"""
+        return self.is_active and self.expires_at >= timezone.now()
+
+    # ---------------------------
+    #   DISPONIBILIDAD (contador available)
+    # ---------------------------
+    # Nada de SELECT ... FOR UPDATE sobre la variante: el UPDATE condicional
+    # solo descuenta si alcanza, y la base de datos lo aplica fila a fila.
+    # Solo se bloquean las filas de reserva, que son de una sola sesión.
+    # Libre = available + unidades de reservas vencidas que el barrido todavía
+    # no desactivó: quien las toma deja available en negativo y el barrido lo
+    # compensa al devolverlas, sin escribir en reservas ajenas al reservar.
+
+    @classmethod
+    def _expired_units(cls):
+        """Subconsulta con las unidades vencidas (aún activas) de cada variante del UPDATE"""
+        expired = (
+            cls.objects.expired()
+            .filter(variant=OuterRef("pk"))
+            .values("variant")
+            .annotate(total=Sum("quantity"))
+            .values("total")
+        )
+        return Coalesce(Subquery(expired), 0)
+
     @classmethod
-    def clean_expired(cls):
-        """Limpia las reservas expiradas"""
-        expired = cls.objects.filter(
-            expires_at__lt=timezone.now(),
-            is_active=True
+    def _take(cls, variant_id, quantity, needed):
+        """
+        UPDATE ... SET available = available - quantity
+        WHERE available + vencidas >= needed; True si alcanzó
+        """
+        return bool(
+            ProductVariant.objects
+            .filter(id=variant_id, is_active=True, available__gte=needed - cls._expired_units())
+            .update(available=F("available") - quantity)
         )
-        
-        count = 0
-        for reservation in expired:
-            reservation.is_active = False
-            reservation.save()
-            count += 1
-        
-        return count
+
+    @classmethod
+    def _free(cls, variant_ids):
+        """{variant_id: (stock, libre)} para informar cuánto queda"""
+        return {
+            variant_id: (stock, free)
+            for variant_id, stock, free in ProductVariant.objects
+            .filter(id__in=variant_ids, is_active=True)
+            .annotate(free=F("available") + cls._expired_units())
+            .values_list("id", "stock", "free")
+        }
+
+    @staticmethod
+    def _per_variant(values):
+        """CASE id WHEN ... THEN ... END con el valor de cada variante"""
+        return Case(
+            *[When(id=variant_id, then=Value(value)) for variant_id, value in values.items()],
+            output_field=models.IntegerField(),
+        )
+
+    @classmethod
+    def _give_back(cls, rows):
+        """Devuelve al contador las cantidades de [(variant_id, quantity), ...] en un UPDATE"""
+        totals = Counter()
+        for variant_id, quantity in rows:
+            totals[variant_id] += quantity
+        totals = {variant_id: quantity for variant_id, quantity in totals.items() if quantity}
+        if not totals:
+            return
+        ProductVariant.objects.filter(id__in=totals).update(available=F("available") + cls._per_variant(totals))
+
+    @classmethod
+    def reserve(cls, session_key, variant_id, quantity):
+        """
+        Deja en `quantity` las unidades que la sesión aparta de la variante,
+        descontando o devolviendo solo la diferencia. Las reservas vencidas
+        (también la propia) cuentan como libres, sin desactivarlas aquí.
+        Retorna: (ok: bool, disponible para esta sesión: int)
+        """
+        if quantity < 1:
+            # Con 0 o negativos se devolverían unidades que la sesión no apartó
+            raise ValueError("La cantidad a reservar debe ser al menos 1 (para quitar usar release)")
+        with transaction.atomic():
+            held, expires_at = (
+                cls.objects.select_for_update()
+                .filter(session_key=session_key, variant_id=variant_id, is_active=True)
+                .values_list("quantity", "expires_at")
+                .first()
+            ) or (0, None)
+            # Si la propia ya venció, otra sesión pudo tomar sus unidades: se piden de nuevo
+            live = held if held and expires_at >= timezone.now() else 0
+            if quantity > live:
+                if not cls._take(variant_id, quantity - held, quantity - live):
+                    _, free = cls._free([variant_id]).get(variant_id, (0, 0))
+                    return False, max(free, 0) + live
+            elif quantity < held:
+                cls._give_back([(variant_id, held - quantity)])
+
+            # Crea o renueva la reserva en una sola sentencia (según el motor)
+            upsert(
+                cls,
+                [cls(
+                    session_key=session_key,
+                    variant_id=variant_id,
+                    quantity=quantity,
+                    expires_at=timezone.now() + cls.TTL,
+                    is_active=True,
+                )],
+                unique_fields=["session_key", "variant"],
+                update_fields=["quantity", "expires_at", "is_active"],
+            )
+        return True, quantity
+
+    @classmethod
+    def checkout(cls, session_key, quantities):
+        """
+        Convierte en venta las unidades {variant_id: cantidad} del carrito.
+        Un solo UPDATE descuenta el stock de todas las líneas, solo si a cada
+        una le alcanza lo libre más lo que esta sesión tiene apartado sin vencer, y
+        otro desactiva esas reservas. Si a alguna línea le falta no se
+        descuenta nada. Devuelve los ids de las variantes sin stock suficiente.
+        """
+        quantities = {variant_id: quantity for variant_id, quantity in quantities.items() if quantity > 0}
+        if not quantities:
+            return []
+
+        with transaction.atomic():
+            now = timezone.now()
+            held, live = {}, {}
+            for variant_id, quantity, expires_at in (
+                cls.objects.select_for_update()
+                .filter(session_key=session_key, variant_id__in=quantities, is_active=True)
+                .values_list("variant_id", "quantity", "expires_at")
+            ):
+                held[variant_id] = quantity
+                live[variant_id] = quantity if expires_at >= now else 0
+            # Del disponible solo sale lo que no estaba apartado (o vuelve el sobrante);
+            # lo apartado ya vencido tiene que volver a alcanzar
+            taken = {variant_id: quantity - held.get(variant_id, 0) for variant_id, quantity in quantities.items()}
+            needed = {variant_id: quantity - live.get(variant_id, 0) for variant_id, quantity in quantities.items()}
+
+            with transaction.atomic():
+                updated = (
+                    ProductVariant.objects
+                    .filter(
+                        id__in=quantities,
+                        is_active=True,
+                        stock__gte=cls._per_variant(quantities),
+                        available__gte=cls._per_variant(needed) - cls._expired_units(),
+                    )
+                    .update(
+                        stock=F("stock") - cls._per_variant(quantities),
+                        available=F("available") - cls._per_variant(taken),
+                    )
+                )
+                if updated < len(quantities):
+                    # Alguna línea no alcanzó: se deshacen también las que sí
+                    transaction.set_rollback(True)
+
+            if updated < len(quantities):
+                variants = cls._free(quantities)
+                short = [
+                    variant_id for variant_id, quantity in quantities.items()
+                    if variant_id not in variants
+                    or variants[variant_id][0] < quantity
+                    or variants[variant_id][1] < needed[variant_id]
+                ]
+                # Si otra sesión liberó stock entre medias, igual se informa el fallo
+                return short or list(quantities)
+
+            if held:
+                cls.objects.filter(session_key=session_key, variant_id__in=held, is_active=True).update(is_active=False)
+        return []
+
+    @classmethod
+    def release_queryset(cls, reservations):
+        """Desactiva las reservas dadas y devuelve sus unidades; cuántas se liberaron"""
+        with transaction.atomic():
+            rows = list(
+                reservations.select_for_update()
+                .filter(is_active=True)
+                .values_list("id", "variant_id", "quantity")
+            )
+            if not rows:
+                return 0
+            cls.objects.filter(id__in=[row[0] for row in rows]).update(is_active=False)
+            cls._give_back([(variant_id, quantity) for _, variant_id, quantity in rows])
+        return len(rows)
+
+    @classmethod
+    def release(cls, session_key, variant_ids=None):
+        """Libera las reservas de la sesión (todas o solo las de esas variantes)"""
+        reservations = cls.objects.filter(session_key=session_key)
+        if variant_ids is not None:
+            reservations = reservations.filter(variant_id__in=variant_ids)
+        return cls.release_queryset(reservations)
+
+    @classmethod
+    def clean_expired(cls, batch_size=None, max_batches=None):
+        """
+        Desactiva las reservas vencidas en lotes de `batch_size` filas (para no
+        bloquear la tabla) y devuelve sus unidades al contador de cada
+        variante. Devuelve cuántas se desactivaron.
+        """
+        batch_size = batch_size or cls.SWEEP_BATCH_SIZE
+        now = timezone.now()
+        expired = cls.objects.filter(is_active=True, expires_at__lt=now)
+
+        total = batches = 0
+        while max_batches is None or batches < max_batches:
+            ids = list(expired.order_by("expires_at").values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            # Se repite la condición: una reserva renovada entre medias no se toca
+            total += cls.release_queryset(cls.objects.filter(id__in=ids, expires_at__lt=now))
+            batches += 1
+            if len(ids) < batch_size:
+                break
+        return total
+
+
+class CartSession(models.Model):
+    """
+    Carrito guardado en el servidor (backend "db" de app_orders/utils/cart_store.py).
+    Solo líneas compactas {variant_id: [cantidad, precio, precio original]};
+    nombres, imágenes y opciones se leen de la base de datos al mostrarlo.
+    """
+    session_key = models.CharField(max_length=40, primary_key=True)  # Mismo ID que las reservas
+    lines = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Último cambio o visita (ver touch)
+
+    # La cookie se renueva en cada visita; la fila a lo sumo cada 5 minutos
+    TOUCH_INTERVAL = timedelta(minutes=5)
+
+    def __str__(self):
+        return f"Carrito {self.session_key}"
+
+    @classmethod
+    def touch(cls, session_key):
+        """
+        Marca el carrito como visitado al renovar la cookie, así no se borra
+        mientras la cookie sigue vigente. Solo escribe si pasó TOUCH_INTERVAL.
+        """
+        now = timezone.now()
+        return cls.objects.filter(
+            session_key=session_key,
+            updated_at__lt=now - cls.TOUCH_INTERVAL,
+        ).update(updated_at=now)
+
+    @classmethod
+    def purge_expired(cls, batch_size=1000):
+        """Borra en lotes los carritos cuya cookie ya venció (sin visitas desde hace más de una reserva)"""
+        limit = timezone.now() - CartReservation.TTL - cls.TOUCH_INTERVAL
+        total = 0
+        while True:
+            keys = list(cls.objects.filter(updated_at__lt=limit).values_list("session_key", flat=True)[:batch_size])
+            if not keys:
+                return total
+            total += cls.objects.filter(session_key__in=keys, updated_at__lt=limit).delete()[0]
+            if len(keys) < batch_size:
+                return total
 
 
 # ---------------------------
@@ -89,6 +362,21 @@ class Order(models.Model):
     def __str__(self):
         return f"Orden #{self.id} - {self.customer}"
 
+    @classmethod
+    def bulk_set_status(cls, queryset, status):
+        """
+        Cambia el estado de varias órdenes (acciones del admin) ajustando
+        las ventas por día de las que se cancelan o dejan de estar canceladas.
+        """
+        with transaction.atomic():
+            if status == "canceled":
+                changed, sign = queryset.exclude(status="canceled"), -1
+            else:
+                changed, sign = queryset.filter(status="canceled"), 1
+            for order in changed.only("id", "created_at"):
+                ProductSalesDaily.record_order(order, sign)
+            return queryset.update(status=status)
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
@@ -104,6 +392,249 @@ class OrderItem(models.Model):
         return f"Item de orden {self.order.id}"
 
 
+# ---------------------------
+#   VENTAS POR DÍA (más vendidos)
+# ---------------------------
+
+class ProductSalesDaily(models.Model):
+    """
+    Unidades e ingresos de cada producto por día, con su categoría.
+    Se actualiza al crear y al cancelar órdenes; de aquí salen los
+    rankings de 7, 30 y 90 días sin recorrer todos los OrderItem.
+    """
+    WINDOWS = (7, 30, 90)  # Días de cada ranking
+    RANKING_SIZE = 200  # Productos que se guardan por ranking
+    RANKING_TIMEOUT = 60 * 60 * 24
+
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_sales")
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Última venta o cancelación (ETag de los rankings)
+
+    class Meta:
+        unique_together = ("day", "product")
+        indexes = [
+            models.Index(fields=["category", "day"]),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - producto {self.product_id}: {self.units}"
+
+    @classmethod
+    def record_order(cls, order, sign=1):
+        """
+        Suma (sign=1) o resta (sign=-1) los items de la orden en el día en
+        que se hizo. Cada fila se actualiza con F() para no pisar ventas
+        simultáneas del mismo producto.
+        """
+        day = timezone.localdate(order.created_at)
+        totals = {}
+        for item in order.items.filter(product__isnull=False).values(
+            "product_id", "product__category_id", "quantity", "price"
+        ):
+            units, revenue, category_id = totals.get(item["product_id"], (0, 0, item["product__category_id"]))
+            totals[item["product_id"]] = (
+                units + item["quantity"],
+                revenue + item["price"] * item["quantity"],
+                category_id,
+            )
+
+        for product_id, (units, revenue, category_id) in totals.items():
+            changes = {
+                "units": F("units") + sign * units,
+                "revenue": F("revenue") + sign * revenue,
+                "updated_at": timezone.now(),
+            }
+            rows = cls.objects.filter(day=day, product_id=product_id)
+            if rows.update(**changes):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(
+                        day=day,
+                        product_id=product_id,
+                        category_id=category_id,
+                        units=sign * units,
+                        revenue=sign * revenue,
+                    )
+            except IntegrityError:
+                # Otra orden creó la fila al mismo tiempo
+                rows.update(**changes)
+
+        if totals:
+            transaction.on_commit(lambda: bump_version(SALES))
+
+    @classmethod
+    def rebuild(cls):
+        """Recalcula toda la tabla desde las órdenes no canceladas (reparación)"""
+        totals = (
+            OrderItem.objects
+            .filter(product__isnull=False)
+            .exclude(order__status="canceled")
+            .annotate(day=TruncDate("order__created_at"))
+            .values("day", "product_id", "product__category_id")
+            .annotate(units=Sum("quantity"), revenue=Sum(F("price") * F("quantity")))
+        )
+        rows = [
+            cls(
+                day=row["day"],
+                product_id=row["product_id"],
+                category_id=row["product__category_id"],
+                units=row["units"],
+                revenue=row["revenue"],
+            )
+            for row in totals
+        ]
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        transaction.on_commit(lambda: bump_version(SALES))
+        return len(rows)
+
+    @classmethod
+    def build_ranking(cls, days, category_id=None, today=None):
+        """[(unidades, product_id), ...] de los últimos `days` días, de mayor a menor"""
+        today = today or timezone.localdate()
+        rows = cls.objects.filter(day__gt=today - timedelta(days=days))
+        if category_id:
+            rows = rows.filter(category_id=category_id)
+        rows = (
+            rows.values("product_id")
+            .annotate(total=Sum("units"))
+            .filter(total__gt=0)
+            .order_by("-total", "product_id")[:cls.RANKING_SIZE]
+        )
+        return [(row["total"], row["product_id"]) for row in rows]
+
+    @classmethod
+    def top_products(cls, days, category_id=None):
+        """
+        Ranking precalculado de los más vendidos. Se guarda en caché hasta
+        que haya una venta o cancelación nueva o cambie el día.
+        """
+        today = timezone.localdate()
+        key = f"top-sellers:{days}:{category_id or 'all'}:{today.isoformat()}:{get_version(SALES)}"
+        ranking = cache.get(key)
+        if ranking is None:
+            ranking = cls.build_ranking(days, category_id, today)
+            cache.set(key, ranking, cls.RANKING_TIMEOUT)
+        return ranking
+
+    @classmethod
+    def warm_rankings(cls, category_ids=()):
+        """Calcula por adelantado los rankings generales y de las categorías dadas"""
+        for days in cls.WINDOWS:
+            for category_id in (None, *category_ids):
+                cls.top_products(days, category_id)
+
+
+# ---------------------------
+#   COMPRADOS JUNTOS (recomendaciones)
+# ---------------------------
+
+class ProductRecommendation(models.Model):
+    """
+    Productos que más se compran junto a cada producto, calculados por
+    lotes desde el historial de órdenes (`python manage.py rebuild_recommendations`).
+    El detalle del producto los lee con el mismo SELECT del producto.
+    """
+    TOP_K = 8  # Relacionados que se guardan por producto
+    MAX_BASKET = 50  # Órdenes más grandes (mayoristas) no aportan señal
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="recommendations"
+    )
+    related_ids = models.JSONField(default=list)  # Ordenados de más a menos afines
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Recomendaciones de {self.product_id}"
+
+    @classmethod
+    def count_pairs(cls, rows):
+        """
+        Cuenta en una pasada cuántas órdenes tiene cada producto y cada par
+        de productos, a partir de (order_id, product_id) ordenados por orden.
+        Solo se guardan los pares que aparecen (matriz dispersa).
+        """
+        orders = Counter()
+        pairs = Counter()
+        basket = set()
+        current = None
+
+        def flush():
+            if 1 < len(basket) <= cls.MAX_BASKET:
+                pairs.update(combinations(sorted(basket), 2))
+            orders.update(basket)
+
+        for order_id, product_id in rows:
+            if order_id != current:
+                flush()
+                basket = set()
+                current = order_id
+            basket.add(product_id)
+        flush()
+        return orders, pairs
+
+    @classmethod
+    def top_related(cls, orders, pairs, top_k=None):
+        """
+        {producto: [relacionados]} por similitud coseno: veces juntos /
+        sqrt(órdenes de a * órdenes de b), para no premiar solo a los más vendidos.
+        """
+        top_k = top_k or cls.TOP_K
+        candidates = defaultdict(list)
+        for (a, b), together in pairs.items():
+            score = together / math.sqrt(orders[a] * orders[b])
+            candidates[a].append((score, together, -b))
+            candidates[b].append((score, together, -a))
+        return {
+            product_id: [-negative_id for _, _, negative_id in heapq.nlargest(top_k, scored)]
+            for product_id, scored in candidates.items()
+        }
+
+    @classmethod
+    def rebuild(cls, top_k=None):
+        """Recalcula las recomendaciones de todos los productos desde las órdenes"""
+        rows = (
+            OrderItem.objects
+            .filter(product__isnull=False)
+            .exclude(order__status="canceled")
+            .order_by("order_id")
+            .values_list("order_id", "product_id")
+            .iterator(chunk_size=5000)
+        )
+        related = cls.top_related(*cls.count_pairs(rows), top_k=top_k)
+        previous = dict(cls.objects.values_list("product_id", "related_ids"))
+        existing = set(Product.objects.filter(id__in=related).values_list("id", flat=True))
+
+        with transaction.atomic():
+            cls.objects.exclude(product_id__in=existing).delete()
+            upsert(
+                cls,
+                [cls(product_id=product_id, related_ids=related[product_id]) for product_id in existing],
+                unique_fields=["product"],
+                update_fields=["related_ids", "updated_at"],
+                batch_size=1000,
+            )
+
+        # Solo cambia el detalle de los productos cuya lista cambió
+        changed = [
+            product_id
+            for product_id in existing | set(previous)
+            if previous.get(product_id) != related.get(product_id)
+        ]
+        if changed:
+            Product.touch(changed)
+            bump_version(*[product_key(product_id) for product_id in changed])
+        return len(existing)
+
+
 # ---------------------------
 #   WEBHOOKS DEL PROVEEDOR
 # ---------------------------
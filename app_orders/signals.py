@@ -0,0 +1,38 @@
+# app_orders/signals.py
+
+from django.db.models.signals import pre_save, post_save, pre_delete
+from django.dispatch import receiver
+
+from app_orders.models import Order, ProductSalesDaily
+
+
+# ---------------------------
+#   VENTAS POR DÍA
+# ---------------------------
+# Las órdenes nuevas se suman en OrderService (después de crear sus items);
+# aquí solo se ajustan los cambios de estado y los borrados.
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    instance._previous_status = (
+        Order.objects.filter(pk=instance.pk).values_list("status", flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Order)
+def order_status_changed(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_status", None)
+    if created or previous is None or previous == instance.status:
+        return
+    if instance.status == "canceled":
+        ProductSalesDaily.record_order(instance, -1)
+    elif previous == "canceled":
+        ProductSalesDaily.record_order(instance, 1)
+
+
+@receiver(pre_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    # Los items todavía existen en pre_delete
+    if instance.status != "canceled":
+        ProductSalesDaily.record_order(instance, -1)
@@ -1,3 +1,482 @@
-from django.test import TestCase
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from app_orders.models import (
+    CartReservation,
+    CartSession,
+    Order,
+    OrderItem,
+    ProductRecommendation,
+    ProductSalesDaily,
+)
+from app_orders.utils.cart import LEGACY_CART_COOKIE
+from app_products.models import Category, Product, ProductVariant
+from app_products.versions import CATALOG, SALES, get_version
+
+
+def create_variant(sku, stock):
+    product = Product.objects.create(name=f"Taza {sku}", slug=sku.lower())
+    return ProductVariant.objects.create(product=product, sku=sku, price=10000, stock=stock)
+
+
+class ConcurrencyMixin:
+    THREADS = 24
+
+    def run_threads(self, target):
+        """Corre `target(index)` en THREADS hilos que arrancan a la vez; devuelve sus resultados"""
+        barrier = threading.Barrier(self.THREADS)
+        results = [None] * self.THREADS
+        errors = []
+
+        def worker(index):
+            try:
+                barrier.wait()
+                results[index] = target(index)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return results
+
+    def assert_consistent(self, variant):
+        """available = stock - reservas activas, y nunca negativo; devuelve lo reservado"""
+        variant.refresh_from_db()
+        reserved = sum(
+            CartReservation.objects.filter(variant=variant, is_active=True).values_list("quantity", flat=True)
+        )
+        self.assertGreaterEqual(variant.available, 0)
+        self.assertEqual(variant.available, variant.stock - reserved)
+        return reserved
+
+
+# SQLite bloquea toda la base en cada escritura: estas pruebas necesitan MySQL o PostgreSQL
+@skipUnlessDBFeature("has_select_for_update")
+class ReservationConcurrencyTests(ConcurrencyMixin, TransactionTestCase):
+    """Muchos carritos a la vez sobre la misma variante: nunca se aparta más que el stock"""
+
+    STOCK = 10
+
+    def setUp(self):
+        self.variant = create_variant("TAZA-1", self.STOCK)
+
+    def test_reservas_simultaneas_no_sobrevenden(self):
+        results = self.run_threads(
+            lambda index: CartReservation.reserve(uuid.uuid4().hex, self.variant.id, 1)[0]
+        )
+        self.assertEqual(sum(results), self.STOCK)
+        self.assertEqual(self.assert_consistent(self.variant), self.STOCK)
+
+    def test_reservar_y_liberar_a_la_vez(self):
+        def reserve_and_release(index):
+            session_key = uuid.uuid4().hex
+            for _ in range(5):
+                if CartReservation.reserve(session_key, self.variant.id, 2)[0]:
+                    CartReservation.release(session_key)
+            return CartReservation.reserve(session_key, self.variant.id, 1)[0]
+
+        results = self.run_threads(reserve_and_release)
+        self.assertEqual(sum(results), self.STOCK)
+        self.assertEqual(self.assert_consistent(self.variant), self.STOCK)
+
+
+class CheckoutTests(ConcurrencyMixin, TestCase):
+    """La compra descuenta todas las líneas en un UPDATE o ninguna"""
+
+    def setUp(self):
+        self.taza = create_variant("TAZA-1", 5)
+        self.plato = create_variant("PLATO-1", 2)
+        self.session_key = uuid.uuid4().hex
+
+    def test_descuenta_stock_y_cierra_reservas(self):
+        CartReservation.reserve(self.session_key, self.taza.id, 3)
+        CartReservation.reserve(self.session_key, self.plato.id, 2)
+
+        short = CartReservation.checkout(self.session_key, {self.taza.id: 3, self.plato.id: 2})
+
+        self.assertEqual(short, [])
+        self.assertEqual(self.assert_consistent(self.taza), 0)
+        self.assertEqual(self.assert_consistent(self.plato), 0)
+        self.assertEqual((self.taza.stock, self.taza.available), (2, 2))
+        self.assertEqual((self.plato.stock, self.plato.available), (0, 0))
+
+    def test_si_falta_una_linea_no_descuenta_ninguna(self):
+        CartReservation.reserve(self.session_key, self.taza.id, 3)
+        CartReservation.reserve(uuid.uuid4().hex, self.plato.id, 2)  # Otro carrito se llevó los platos
+
+        short = CartReservation.checkout(self.session_key, {self.taza.id: 3, self.plato.id: 1})
+
+        self.assertEqual(short, [self.plato.id])
+        self.assertEqual(self.assert_consistent(self.taza), 3)
+        self.assertEqual(self.assert_consistent(self.plato), 2)
+        self.assertEqual((self.taza.stock, self.plato.stock), (5, 2))
+
+
+class ExpiredReservationTests(ConcurrencyMixin, TestCase):
+    """Las reservas vencidas cuentan como libres sin escribir en ellas; el barrido las devuelve"""
+
+    def setUp(self):
+        self.variant = create_variant("TAZA-1", 3)
+        self.stale = uuid.uuid4().hex
+        CartReservation.reserve(self.stale, self.variant.id, 3)
+        CartReservation.objects.filter(session_key=self.stale).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+    def test_reservar_usa_lo_vencido_sin_desactivarlo(self):
+        with mock.patch.object(CartReservation, "clean_expired") as clean_expired:
+            self.assertEqual(CartReservation.reserve(uuid.uuid4().hex, self.variant.id, 2), (True, 2))
+        clean_expired.assert_not_called()
+        self.assertTrue(CartReservation.objects.get(session_key=self.stale).is_active)
+        self.assertEqual(CartReservation.reserve(uuid.uuid4().hex, self.variant.id, 2), (False, 1))
+
+        self.assertEqual(CartReservation.clean_expired(), 1)
+        self.assertEqual(self.assert_consistent(self.variant), 2)
+        self.assertEqual(self.variant.available, 1)
+
+    def test_la_propia_vencida_se_vuelve_a_pedir(self):
+        CartReservation.reserve(uuid.uuid4().hex, self.variant.id, 2)
+        self.assertEqual(CartReservation.reserve(self.stale, self.variant.id, 3), (False, 1))
+        self.assertEqual(CartReservation.reserve(self.stale, self.variant.id, 1), (True, 1))
+
+        CartReservation.clean_expired()
+        self.assertEqual(self.assert_consistent(self.variant), 3)
+        self.assertEqual(self.variant.available, 0)
+
+    def test_comprar_con_stock_de_reservas_vencidas(self):
+        session_key = uuid.uuid4().hex
+        self.assertEqual(CartReservation.checkout(session_key, {self.variant.id: 3}), [])
+        self.assertEqual(CartReservation.checkout(uuid.uuid4().hex, {self.variant.id: 1}), [self.variant.id])
+
+        CartReservation.clean_expired()
+        self.assertEqual(self.assert_consistent(self.variant), 0)
+        self.assertEqual((self.variant.stock, self.variant.available), (0, 0))
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class CheckoutBenchmarkTests(ConcurrencyMixin, TransactionTestCase):
+    """Compras simultáneas sobre las mismas variantes: rendimiento y stock exacto"""
+
+    ROUNDS = 10  # Compras por hilo
+    STOCK = 150  # Menos que THREADS * ROUNDS: una parte de las compras debe fallar
+
+    def setUp(self):
+        self.variants = [create_variant(f"TAZA-{index}", self.STOCK) for index in range(3)]
+
+    def test_compras_simultaneas(self):
+        def buy(index):
+            bought = 0
+            for _ in range(self.ROUNDS):
+                session_key = uuid.uuid4().hex
+                quantities = {variant.id: 1 for variant in self.variants}
+                for variant_id, quantity in quantities.items():
+                    CartReservation.reserve(session_key, variant_id, quantity)
+                if not CartReservation.checkout(session_key, quantities):
+                    bought += 1
+                else:
+                    CartReservation.release(session_key)
+            return bought
+
+        started = time.perf_counter()
+        results = self.run_threads(buy)
+        elapsed = time.perf_counter() - started
+
+        # Tiempos solo a pedido: CHECKOUT_BENCHMARK=1 python manage.py test app_orders
+        if os.environ.get("CHECKOUT_BENCHMARK"):
+            attempts = self.THREADS * self.ROUNDS
+            print(
+                f"\n{attempts} compras de {len(self.variants)} líneas con {self.THREADS} hilos: "
+                f"{elapsed:.2f}s ({attempts / elapsed:.0f} compras/s, {sum(results)} confirmadas)"
+            )
+        self.assertEqual(sum(results), self.STOCK)
+        for variant in self.variants:
+            self.assertEqual(self.assert_consistent(variant), 0)
+            self.assertEqual(variant.stock, 0)
+
+
+class MySQLUpsertTests(TestCase):
+    """
+    Sin ON CONFLICT (columnas), como en MySQL: las reservas se crean y
+    renuevan igual (UPDATE y luego INSERT).
+    """
+
+    def setUp(self):
+        patcher = mock.patch.object(connection.features, "supports_update_conflicts_with_target", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.variant = create_variant("TAZA-1", 10)
+
+    def test_reservar_y_renovar(self):
+        self.assertEqual(CartReservation.reserve("sesion", self.variant.id, 2), (True, 2))
+        self.assertEqual(CartReservation.reserve("sesion", self.variant.id, 5), (True, 5))
+        self.assertEqual(CartReservation.reserve("sesion", self.variant.id, 1), (True, 1))
+        reservation = CartReservation.objects.get()
+        self.assertEqual(reservation.quantity, 1)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.available, 9)
+
+    def test_reservar_despues_de_liberar(self):
+        CartReservation.reserve("sesion", self.variant.id, 3)
+        CartReservation.release("sesion")
+        self.assertEqual(CartReservation.reserve("sesion", self.variant.id, 4), (True, 4))
+        self.assertTrue(CartReservation.objects.get().is_active)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.available, 6)
+
+    def test_agregar_y_cambiar_desde_el_carrito(self):
+        for name, quantity in (("add_to_cart", 2), ("add_to_cart", 1), ("update_cart", 5)):
+            response = self.client.post(reverse(f"orders:{name}"), {"variant_id": self.variant.id, "quantity": quantity})
+            self.assertTrue(response.json()["success"])
+        self.assertEqual(list(CartSession.objects.get().lines.values())[0][0], 5)
+
+    def test_recomendaciones(self):
+        other = create_variant("PLATO-1", 10)
+        order = Order.objects.create()
+        for variant in (self.variant, other):
+            OrderItem.objects.create(order=order, product=variant.product, variant=variant, price=10000)
+        self.assertEqual(ProductRecommendation.rebuild(), 2)
+        self.assertEqual(ProductRecommendation.rebuild(), 2)
+        self.assertEqual(ProductRecommendation.objects.get(product=self.variant.product).related_ids, [other.product_id])
+
+
+class RecommendationScoreTests(TestCase):
+    """Similitud coseno de los productos comprados juntos"""
+
+    def related(self, baskets, top_k=None):
+        rows = [(order_id, product_id) for order_id, basket in enumerate(baskets) for product_id in basket]
+        return ProductRecommendation.top_related(*ProductRecommendation.count_pairs(rows), top_k=top_k)
+
+    def test_coseno_no_premia_solo_a_los_mas_vendidos(self):
+        # 1 sale en 3 órdenes; 3 y 4 solo una vez juntos pero 4 casi no se vende solo
+        related = self.related([[1, 2], [1, 2], [1, 3], [3, 4]])
+        self.assertEqual(related, {1: [2, 3], 2: [1], 3: [4, 1], 4: [3]})
+
+    def test_empates_por_id_y_top_k(self):
+        related = self.related([[5, 7], [5, 6], [5, 8]], top_k=2)
+        self.assertEqual(related[5], [6, 7])
+
+    def test_canastas_grandes_no_suman_pares(self):
+        huge = list(range(100, 100 + ProductRecommendation.MAX_BASKET + 1))
+        orders, pairs = ProductRecommendation.count_pairs([(1, product_id) for product_id in huge] + [(2, 1), (2, 2)])
+        self.assertEqual(dict(pairs), {(1, 2): 1})
+        self.assertEqual(orders[100], 1)
+
+    def test_reconstruir_ignora_canceladas(self):
+        taza, plato, vaso = (create_variant(sku, 10) for sku in ("TAZA-1", "PLATO-1", "VASO-1"))
+        for status, variants in (("delivered", (taza, plato)), ("canceled", (taza, vaso))):
+            order = Order.objects.create(status=status)
+            for variant in variants:
+                OrderItem.objects.create(order=order, product=variant.product, variant=variant, price=10000)
+        ProductRecommendation.rebuild()
+        self.assertEqual(
+            dict(ProductRecommendation.objects.values_list("product_id", "related_ids")),
+            {taza.product_id: [plato.product_id], plato.product_id: [taza.product_id]},
+        )
+
+
+class CartQueryCountTests(TestCase):
+    """
+    Agregar, cambiar y quitar cuestan un número fijo de consultas: leer el
+    carrito, los precios de la variante, la reserva (leer, apartar, upsert,
+    más el SAVEPOINT y su RELEASE) y guardar el carrito.
+    """
+
+    def setUp(self):
+        self.variant = create_variant("TAZA-1", 10)
+        self.client.post(reverse("orders:add_to_cart"), {"variant_id": self.variant.id, "quantity": 1})
+
+    def post(self, name, data):
+        response = self.client.post(reverse(f"orders:{name}"), data)
+        self.assertTrue(response.json()["success"])
+
+    def test_agregar(self):
+        other = create_variant("PLATO-1", 10)
+        with self.assertNumQueries(8):
+            self.post("add_to_cart", {"variant_id": other.id, "quantity": 1})
+        with self.assertNumQueries(8):
+            self.post("add_to_cart", {"variant_id": self.variant.id, "quantity": 2})
+
+    def test_cambiar_cantidad(self):
+        with self.assertNumQueries(8):
+            self.post("update_cart", {"variant_id": self.variant.id, "quantity": 3})
+        with self.assertNumQueries(8):
+            self.post("update_cart", {"variant_id": self.variant.id, "quantity": 1})
+
+    def test_quitar(self):
+        with self.assertNumQueries(7):
+            self.post("remove_from_cart", {"variant_id": self.variant.id})
+
+    def test_items_no_crecen_con_las_lineas(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("orders:cart_items"))
+        one_line = len(queries)  # Cada petición reinicia connection.queries
+        for sku in ("PLATO-1", "VASO-1"):
+            self.post("add_to_cart", {"variant_id": create_variant(sku, 10).id, "quantity": 1})
+        with self.assertNumQueries(one_line):
+            response = self.client.get(reverse("orders:cart_items"))
+        self.assertEqual(len(response.json()["items"]), 3)
+
+
+class CartQuantityTests(TestCase):
+    """Cantidades inválidas se rechazan sin tocar el disponible"""
+
+    def setUp(self):
+        self.variant = create_variant("TAZA-1", 10)
+
+    def post(self, name, quantity):
+        return self.client.post(reverse(f"orders:{name}"), {"variant_id": self.variant.id, "quantity": quantity})
+
+    def test_agregar_rechaza_texto_cero_y_negativos(self):
+        for quantity in ("abc", "0", "-3"):
+            response = self.post("add_to_cart", quantity)
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(response.json()["success"])
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.available, 10)
+
+    def test_cambiar_a_negativo_no_devuelve_stock(self):
+        self.post("add_to_cart", 2)
+        self.assertEqual(self.post("update_cart", "-5").status_code, 400)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.available, 8)
+
+    def test_cambiar_a_cero_quita_el_producto(self):
+        self.post("add_to_cart", 2)
+        self.assertTrue(self.post("update_cart", "0").json()["success"])
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.available, 10)
+
+
+class LegacyCartCookieTests(ConcurrencyMixin, TestCase):
+    """Las líneas del carrito en cookie (versión anterior) se importan apartando su stock"""
+
+    def test_importa_recorta_y_descarta(self):
+        taza = create_variant("TAZA-1", 5)
+        plato = create_variant("PLATO-1", 2)
+        vaso = create_variant("VASO-1", 1)
+        CartReservation.reserve(uuid.uuid4().hex, vaso.id, 1)  # Otro carrito se llevó el último vaso
+        self.client.cookies[LEGACY_CART_COOKIE] = json.dumps({
+            str(taza.id): {"quantity": 3},
+            str(plato.id): {"quantity": 4},
+            str(vaso.id): {"quantity": 1},
+        })
+
+        response = self.client.get(reverse("orders:cart_count"))
+
+        self.assertEqual(response.json()["cart_count"], 5)
+        session_key = CartReservation.objects.get(variant=taza).session_key
+        self.assertEqual(
+            dict(CartReservation.objects.filter(session_key=session_key).values_list("variant_id", "quantity")),
+            {taza.id: 3, plato.id: 2},
+        )
+        self.assertEqual(self.assert_consistent(taza), 3)
+        self.assertEqual(self.assert_consistent(plato), 2)
+        self.assertEqual(self.assert_consistent(vaso), 1)
+
+
+class CartSessionExpiryTests(TestCase):
+    """El carrito guardado vive lo mismo que su cookie, que se renueva en cada visita"""
+
+    def setUp(self):
+        self.variant = create_variant("TAZA-1", 10)
+        self.client.post(reverse("orders:add_to_cart"), {"variant_id": self.variant.id, "quantity": 1})
+        self.cart = CartSession.objects.get()
+
+    def age(self, delta):
+        CartSession.objects.filter(pk=self.cart.pk).update(updated_at=timezone.now() - delta)
+
+    def test_visita_renueva_el_carrito(self):
+        self.age(CartReservation.TTL)
+        self.client.get(reverse("orders:cart_count"))
+        self.assertEqual(CartSession.purge_expired(), 0)
+        self.assertTrue(CartSession.objects.filter(pk=self.cart.pk).exists())
+
+    def test_visita_reciente_no_escribe(self):
+        self.age(timedelta(minutes=1))
+        self.assertEqual(CartSession.touch(self.cart.pk), 0)
+
+    def test_borra_carritos_con_la_cookie_vencida(self):
+        self.age(CartReservation.TTL + CartSession.TOUCH_INTERVAL + timedelta(minutes=1))
+        self.assertEqual(CartSession.purge_expired(), 1)
+
+
+class SalesRollupTests(TestCase):
+    """Las ventas por día suman al crear la orden y restan al cancelarla, una sola vez"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Tazas", slug="tazas")
+        self.product = Product.objects.create(name="Taza", slug="taza", category=category)
+        self.variant = ProductVariant.objects.create(product=self.product, sku="TAZA-1", price=10000, stock=10)
+        self.order = self.create_order(2)
+
+    def create_order(self, quantity):
+        # Como OrderService: los items se crean y luego se suman las ventas
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(total=10000 * quantity)
+            OrderItem.objects.create(order=order, product=self.product, variant=self.variant, quantity=quantity, price=10000)
+            ProductSalesDaily.record_order(order)
+        return order
+
+    def units(self):
+        return ProductSalesDaily.objects.get(product=self.product).units
+
+    def set_status(self, status):
+        self.order.status = status
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.save()
+
+    def test_cancelar_resta_y_reactivar_suma(self):
+        self.set_status("canceled")
+        self.assertEqual(self.units(), 0)
+        self.set_status("canceled")
+        self.assertEqual(self.units(), 0)
+        self.set_status("pending")
+        self.assertEqual(self.units(), 2)
+
+    def test_cambio_de_estado_sin_cancelar_no_cambia_ventas(self):
+        self.set_status("shipped")
+        self.assertEqual(self.units(), 2)
+
+    def test_cancelacion_masiva_no_resta_dos_veces(self):
+        other = self.create_order(3)
+        Order.bulk_set_status(Order.objects.filter(id=other.id), "canceled")
+        Order.bulk_set_status(Order.objects.all(), "canceled")
+        self.assertEqual(self.units(), 0)
+        Order.bulk_set_status(Order.objects.filter(id=other.id), "pending")
+        self.assertEqual(self.units(), 3)
+
+    def test_borrar_orden_cancelada_no_resta(self):
+        self.set_status("canceled")
+        self.order.delete()
+        self.assertEqual(self.units(), 0)
+
+    def test_venta_y_cancelacion_invalidan_top_products(self):
+        catalog = get_version(CATALOG)
+        self.assertEqual(ProductSalesDaily.top_products(7), [(2, self.product.id)])
+
+        sales = get_version(SALES)
+        self.create_order(3)
+        self.assertNotEqual(get_version(SALES), sales)
+        self.assertEqual(ProductSalesDaily.top_products(7), [(5, self.product.id)])
+
+        self.set_status("canceled")
+        self.assertEqual(ProductSalesDaily.top_products(7), [(3, self.product.id)])
+        # Las ventas no invalidan el resto del catálogo
+        self.assertEqual(get_version(CATALOG), catalog)
@@ -2,103 +2,124 @@
 
 import json
 import uuid
-from django.utils import timezone
-from datetime import timedelta
+
+from django.core import signing
+
 from app_orders.models import CartReservation
+from app_orders.utils.cart_store import CartLine, get_cart_store
 from app_products.models import ProductVariant
 
+CART_COOKIE = "cart_session_key"
+CART_COOKIE_SALT = "kalyzo.cart"
+LEGACY_CART_COOKIE = "cart_data"  # Carrito completo en JSON (versión anterior)
+
+
+def get_cart(request):
+    """El carrito de la petición, cargado del store una sola vez"""
+    cart = getattr(request, "_cart", None)
+    if cart is None:
+        cart = request._cart = Cart(request)
+    return cart
+
+
+def parse_variant_id(variant_id):
+    try:
+        return int(variant_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_quantity(value, default=1):
+    """Cantidad enviada por el cliente; None si no es un entero"""
+    if value in (None, ""):
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
 class Cart:
     """
-    Clase para manejar el carrito de compras con cookies
+    Carrito de compras guardado en el servidor (app_orders/utils/cart_store.py).
+    La cookie solo lleva el ID firmado del carrito; las líneas son compactas
+    ({variant_id: CartLine}) y los datos de cada producto se leen al mostrarlo.
     """
-    
+
     def __init__(self, request):
         self.request = request
-        self.session_key = self._get_or_create_session_key()
-        
-        # ✅ LIMPIAR RESERVAS EXPIRADAS AUTOMÁTICAMENTE
-        # Esto se ejecuta cada vez que se crea una instancia del carrito
-        CartReservation.clean_expired()
-        
-        # Cargar carrito desde cookie
-        self.cart = self._load_cart()
+        self.store = get_cart_store()
+        self.session_key, self.is_new = self._get_or_create_session_key()
+        self.modified = False
+
+        # Las reservas vencidas no se limpian aquí: las desactiva el barrido
+        # programado (expire_cart_reservations); mientras, reserve() ya las cuenta libres
+
+        self.lines = {} if self.is_new else self.store.load(self.session_key)
+        if not self.lines and LEGACY_CART_COOKIE in request.COOKIES:
+            self._import_legacy_cookie()
 
     def _get_or_create_session_key(self):
-        """Obtiene o crea una clave única para el carrito"""
-        session_key = self.request.COOKIES.get('cart_session_key')
-        if not session_key:
-            session_key = str(uuid.uuid4())
-        return session_key
-
-    def _load_cart(self):
-        """Carga el carrito desde la cookie"""
-        cart_data = self.request.COOKIES.get('cart_data', '{}')
+        """(clave, es_nueva): la cookie firmada o una clave nueva si no hay o fue alterada"""
+        session_key = self.request.get_signed_cookie(CART_COOKIE, default=None, salt=CART_COOKIE_SALT)
+        if session_key and len(session_key) <= 40:
+            return session_key, False
+        return str(uuid.uuid4()), True
+
+    def _import_legacy_cookie(self):
+        """
+        Conserva las cantidades del carrito en cookie, apartando el stock de
+        cada línea como add(). Si no alcanza, la línea queda con lo que haya
+        disponible o se descarta; los precios se vuelven a leer.
+        """
         try:
-            return json.loads(cart_data)
-        except json.JSONDecodeError:
-            return {}
+            legacy = json.loads(self.request.COOKIES[LEGACY_CART_COOKIE])
+            quantities = {int(key): int(item["quantity"]) for key, item in legacy.items()}
+        except (ValueError, TypeError, KeyError, AttributeError):
+            quantities = {}
+        variants = ProductVariant.objects.for_cart_line().filter(
+            id__in=[variant_id for variant_id, quantity in quantities.items() if quantity > 0],
+            is_active=True,
+        )
+        for variant in variants:
+            quantity = quantities[variant.id]
+            reserved, available = CartReservation.reserve(self.session_key, variant.id, quantity)
+            if not reserved and available > 0:
+                quantity = available
+                reserved, _ = CartReservation.reserve(self.session_key, variant.id, quantity)
+            if reserved:
+                self.lines[variant.id] = self._line(variant, quantity)
+        self.modified = True
+
+    @staticmethod
+    def _line(variant, quantity):
+        return CartLine(quantity, variant.discount_price or variant.price, variant.price)
 
     def add(self, variant_id, quantity=1):
         """
         Agrega un producto al carrito
         Retorna: (success: bool, message: str)
         """
+        if quantity < 1:
+            return False, "Cantidad inválida"
+
+        variant_id = parse_variant_id(variant_id)
         try:
-            variant = ProductVariant.objects.get(id=variant_id, is_active=True)
+            variant = ProductVariant.objects.for_cart_line().get(id=variant_id, is_active=True)
         except ProductVariant.DoesNotExist:
             return False, "Producto no encontrado"
 
-        # Verificar stock disponible
-        current_quantity = self.cart.get(str(variant_id), {}).get('quantity', 0)
+        # Apartar stock: UPDATE condicional sobre el contador de disponibles
+        current_quantity = self.lines[variant_id].quantity if variant_id in self.lines else 0
         total_quantity = current_quantity + quantity
 
-        if variant.stock < total_quantity:
-            return False, f"Stock insuficiente. Disponible: {variant.stock}"
-
-        # Actualizar o crear reserva
-        reservation, created = CartReservation.objects.get_or_create(
-            session_key=self.session_key,
-            variant=variant,
-            defaults={
-                'quantity': quantity,
-                'expires_at': timezone.now() + timedelta(hours=3)
-            }
-        )
+        reserved, available = CartReservation.reserve(self.session_key, variant_id, total_quantity)
+        if not reserved:
+            return False, f"Stock insuficiente. Disponible: {available}"
 
-        # ✅ SIEMPRE actualizar y guardar (sea creada o existente)
-        reservation.quantity = total_quantity
-        reservation.expires_at = timezone.now() + timedelta(hours=3)
-        reservation.is_active = True
-        reservation.save()
-
-        # ✅ Obtener las opciones de la variante
-        variant_options = []
-        for vo in variant.options.all():
-            variant_options.append({
-                'option': vo.option_value.option.name,
-                'value': vo.option_value.value
-            })
-
-        # Actualizar carrito en memoria
-        if str(variant_id) in self.cart:
-            self.cart[str(variant_id)]['quantity'] = total_quantity
-            # ✅ Actualizar stock también cuando ya existe
-            self.cart[str(variant_id)]['stock'] = variant.stock
-        else:
-            self.cart[str(variant_id)] = {
-                'variant_id': variant_id,
-                'product_id': variant.product.id,
-                'product_slug': variant.product.slug,
-                'product_name': variant.product.name,
-                'sku': variant.sku,
-                'quantity': quantity,
-                'price': float(variant.discount_price or variant.price),
-                'original_price': float(variant.price),
-                'discount_percentage': variant.discount_percentage,
-                'image': variant.main_image.image_url if variant.main_image else None,
-                'options': variant_options,  # ✅ OPCIONES DE LA VARIANTE
-                'stock': variant.stock  # ✅ STOCK DISPONIBLE
-            }
+        # Precio tomado de la base de datos, nunca del cliente
+        self.lines[variant_id] = self._line(variant, total_quantity)
+        self.modified = True
 
         return True, "Producto agregado al carrito"
 
@@ -109,31 +130,23 @@ class Cart:
         if quantity <= 0:
             return self.remove(variant_id)
 
-        try:
-            variant = ProductVariant.objects.get(id=variant_id)
-            reservation = CartReservation.objects.get(
-                session_key=self.session_key,
-                variant=variant,
-                is_active=True
-            )
-        except (ProductVariant.DoesNotExist, CartReservation.DoesNotExist):
+        variant_id = parse_variant_id(variant_id)
+        if variant_id not in self.lines:
             return False, "Producto no encontrado en el carrito"
 
-        # ✅ Solo validar stock si está AUMENTANDO la cantidad
-        if quantity > reservation.quantity:
-            difference = quantity - reservation.quantity
-            if variant.stock < difference:
-                return False, f"Stock insuficiente. Disponible: {variant.stock}"
+        try:
+            variant = ProductVariant.objects.for_cart_line().get(id=variant_id)
+        except ProductVariant.DoesNotExist:
+            return False, "Producto no encontrado en el carrito"
 
-        # Actualizar reserva
-        reservation.quantity = quantity
-        reservation.expires_at = timezone.now() + timedelta(hours=3)
-        reservation.save()
+        # Solo se descuenta (o devuelve) la diferencia con lo que ya está apartado;
+        # si el barrido liberó la reserva, se vuelve a apartar la cantidad completa
+        reserved, available = CartReservation.reserve(self.session_key, variant_id, quantity)
+        if not reserved:
+            return False, f"Stock insuficiente. Disponible: {available}"
 
-        # Actualizar carrito en memoria
-        self.cart[str(variant_id)]['quantity'] = quantity
-        # ✅ Actualizar stock en el carrito
-        self.cart[str(variant_id)]['stock'] = variant.stock
+        self.lines[variant_id] = self._line(variant, quantity)
+        self.modified = True
 
         return True, "Cantidad actualizada"
 
@@ -141,98 +154,115 @@ class Cart:
         """
         Elimina un producto del carrito
         """
-        try:
-            variant = ProductVariant.objects.get(id=variant_id)
-            reservation = CartReservation.objects.get(
-                session_key=self.session_key,
-                variant=variant,
-                is_active=True
-            )
-            
-            # Marcar reserva como inactiva
-            reservation.is_active = False
-            reservation.save()
-            
-            # Eliminar del carrito en memoria
-            if str(variant_id) in self.cart:
-                del self.cart[str(variant_id)]
-            
-            return True, "Producto eliminado del carrito"
-        except (ProductVariant.DoesNotExist, CartReservation.DoesNotExist):
+        variant_id = parse_variant_id(variant_id)
+        if variant_id not in self.lines:
             return False, "Producto no encontrado"
 
+        # Liberar la reserva (si el barrido no la desactivó ya)
+        CartReservation.release(self.session_key, [variant_id])
+
+        del self.lines[variant_id]
+        self.modified = True
+        return True, "Producto eliminado del carrito"
+
     def clear(self):
         """
         Limpia todo el carrito
         """
-        reservations = CartReservation.objects.filter(
-            session_key=self.session_key,
-            is_active=True
-        )
-        
-        for reservation in reservations:
-            reservation.is_active = False
-            reservation.save()
-        
-        self.cart = {}
+        CartReservation.release(self.session_key)
+
+        self.lines = {}
+        self.modified = True
         return True, "Carrito vaciado"
 
     def get_total(self):
         """Calcula el total del carrito (precio final con descuentos)"""
-        return sum(
-            item['price'] * item['quantity'] 
-            for item in self.cart.values()
-        )
+        return float(sum(line.price * line.quantity for line in self.lines.values()))
 
     def get_savings(self):
         """Calcula el ahorro total por descuentos"""
-        savings = 0
-        for item in self.cart.values():
-            # Si hay precio original diferente al precio actual, hay descuento
-            if item.get('original_price') and item['original_price'] > item['price']:
-                # Ahorro por unidad * cantidad
-                savings += (item['original_price'] - item['price']) * item['quantity']
-        return savings
+        return float(sum(
+            (line.original_price - line.price) * line.quantity
+            for line in self.lines.values()
+            if line.original_price > line.price
+        ))
 
     def get_subtotal(self):
         """Calcula el subtotal SIN descuentos (precio original)"""
-        subtotal = 0
-        for item in self.cart.values():
-            # Usar precio original si existe, sino usar precio actual
-            price = item.get('original_price', item['price'])
-            subtotal += price * item['quantity']
-        return subtotal
+        return float(sum(line.original_price * line.quantity for line in self.lines.values()))
 
     def get_items(self):
-        """Retorna los items del carrito"""
-        return list(self.cart.values())
+        """
+        Items con los datos actuales de cada variante: todas se leen juntas
+        (producto, imágenes y opciones precargados). Los precios de las
+        líneas se actualizan con los de la base de datos y las variantes
+        que ya no están activas salen del carrito.
+        """
+        if not self.lines:
+            return []
+
+        variants = ProductVariant.objects.for_cart().in_bulk(list(self.lines))
+        items = []
+        for variant_id, line in list(self.lines.items()):
+            variant = variants.get(variant_id)
+            if variant is None or not variant.is_active:
+                del self.lines[variant_id]
+                self.modified = True
+                continue
+
+            current = self._line(variant, line.quantity)
+            if current != line:
+                self.lines[variant_id] = current
+                self.modified = True
+            items.append(self._item(variant, line.quantity))
+        return items
+
+    @staticmethod
+    def _item(variant, quantity):
+        main_image = variant.main_image
+        return {
+            'variant_id': variant.id,
+            'product_id': variant.product.id,
+            'product_slug': variant.product.slug,
+            'product_name': variant.product.name,
+            'sku': variant.sku,
+            'quantity': quantity,
+            'price': float(variant.discount_price or variant.price),
+            'original_price': float(variant.price),
+            'discount_percentage': variant.discount_percentage,
+            'image': main_image.image_url.url if main_image and main_image.image_url else None,
+            'options': [
+                {'option': vo.option_value.option.name, 'value': vo.option_value.value}
+                for vo in variant.options.all()
+            ],
+            'stock': variant.stock,
+        }
 
     def get_count(self):
         """Retorna la cantidad total de items"""
-        return sum(item['quantity'] for item in self.cart.values())
+        return sum(line.quantity for line in self.lines.values())
 
     def save_to_response(self, response):
         """
-        Guarda el carrito en las cookies de la respuesta
+        Guarda el carrito en el store (si cambió) y deja en la respuesta la
+        cookie con el ID firmado del carrito. Si no cambió, renueva su fecha
+        en el store junto con la cookie para que no venza antes que ella.
         """
-        cart_data = json.dumps(self.cart)
-        
-        # Cookie del carrito (3 horas)
-        response.set_cookie(
-            'cart_data',
-            cart_data,
-            max_age=3 * 60 * 60,  # 3 horas en segundos
-            httponly=True,
-            samesite='Lax'
-        )
-        
-        # Cookie de la sesión
-        response.set_cookie(
-            'cart_session_key',
+        if self.modified:
+            self.store.save(self.session_key, self.lines)
+            self.modified = False
+        elif self.lines:
+            self.store.touch(self.session_key)
+
+        response.set_signed_cookie(
+            CART_COOKIE,
             self.session_key,
-            max_age=3 * 60 * 60,
+            salt=CART_COOKIE_SALT,
+            max_age=int(CartReservation.TTL.total_seconds()),
             httponly=True,
             samesite='Lax'
         )
-        
-        return response
\ No newline at end of file
+        if LEGACY_CART_COOKIE in self.request.COOKIES:
+            response.delete_cookie(LEGACY_CART_COOKIE, samesite='Lax')
+
+        return response
@@ -0,0 +1,103 @@
+# app_orders/utils/cart_store.py
+
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from app_orders.models import CartReservation, CartSession
+from app_products.upsert import upsert
+
+# Una línea del carrito: lo mínimo para contar y sumar sin consultar productos
+CartLine = namedtuple("CartLine", ["quantity", "price", "original_price"])
+
+STORES = {
+    "db": "app_orders.utils.cart_store.DatabaseCartStore",
+    "cache": "app_orders.utils.cart_store.CacheCartStore",
+}
+
+
+# ---------------------------
+#   FORMATO COMPACTO
+# ---------------------------
+# {variant_id: CartLine} en memoria y {"12": [2, "9000.00", "10000.00"]} guardado.
+
+def dump_lines(lines):
+    return {
+        str(variant_id): [line.quantity, str(line.price), str(line.original_price)]
+        for variant_id, line in lines.items()
+    }
+
+
+def load_lines(data):
+    """Lee las líneas guardadas; descarta las que no tengan el formato esperado"""
+    lines = {}
+    for variant_id, values in (data or {}).items():
+        try:
+            quantity, price, original_price = values
+            lines[int(variant_id)] = CartLine(int(quantity), Decimal(price), Decimal(original_price))
+        except (TypeError, ValueError, InvalidOperation):
+            continue
+    return lines
+
+
+# ---------------------------
+#   BACKENDS
+# ---------------------------
+
+class DatabaseCartStore:
+    """Una fila de CartSession por carrito (sobrevive a reinicios y es compartida)"""
+
+    def load(self, session_key):
+        data = CartSession.objects.filter(session_key=session_key).values_list("lines", flat=True).first()
+        return load_lines(data)
+
+    def save(self, session_key, lines):
+        if not lines:
+            self.delete(session_key)
+            return
+        # Un solo INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE
+        upsert(
+            CartSession,
+            [CartSession(session_key=session_key, lines=dump_lines(lines))],
+            unique_fields=["session_key"],
+            update_fields=["lines", "updated_at"],
+        )
+
+    def touch(self, session_key):
+        CartSession.touch(session_key)
+
+    def delete(self, session_key):
+        CartSession.objects.filter(session_key=session_key).delete()
+
+
+class CacheCartStore:
+    """En la caché (Redis en producción); vence solo con la misma duración que las reservas"""
+
+    timeout = int(CartReservation.TTL.total_seconds())
+
+    def key(self, session_key):
+        return f"cart:{session_key}"
+
+    def load(self, session_key):
+        return load_lines(cache.get(self.key(session_key)))
+
+    def save(self, session_key, lines):
+        if not lines:
+            self.delete(session_key)
+            return
+        cache.set(self.key(session_key), dump_lines(lines), self.timeout)
+
+    def touch(self, session_key):
+        cache.touch(self.key(session_key), self.timeout)
+
+    def delete(self, session_key):
+        cache.delete(self.key(session_key))
+
+
+def get_cart_store():
+    """Backend configurado en settings.CART_STORE ("db", "cache" o una ruta de clase)"""
+    name = getattr(settings, "CART_STORE", "db")
+    return import_string(STORES.get(name, name))()
@@ -4,9 +4,9 @@ from django.views import View
 from django.views.generic import TemplateView
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
-from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
 from app_products.models import ProductVariant, Product
-from .utils.cart import Cart
+from .utils.cart import get_cart, parse_quantity
 
 # Carrito Views
 class CarritoView(TemplateView):
@@ -17,7 +17,7 @@ class CarritoView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        cart = Cart(self.request)
+        cart = get_cart(self.request)
         producto = Product.objects.all()
         # Traer el slug y id del producto
         
@@ -30,7 +30,16 @@ class CarritoView(TemplateView):
         })
         
         
-        return context 
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        # get_items pudo quitar variantes inactivas o actualizar precios;
+        # si no, igual se renuevan la cookie y la fecha del carrito
+        cart = get_cart(self.request)
+        if cart.modified or cart.lines:
+            cart.save_to_response(response)
+        return response
 
 # Agregar producto al carrito (AJAX)
 class AddToCartView(View):
@@ -40,7 +49,7 @@ class AddToCartView(View):
     
     def post(self, request, *args, **kwargs):
         variant_id = request.POST.get('variant_id')
-        quantity = int(request.POST.get('quantity', 1))
+        quantity = parse_quantity(request.POST.get('quantity'))
         
         if not variant_id:
             return JsonResponse({
@@ -48,7 +57,13 @@ class AddToCartView(View):
                 'message': 'Producto no especificado'
             }, status=400)
         
-        cart = Cart(request)
+        if quantity is None or quantity < 1:
+            return JsonResponse({
+                'success': False,
+                'message': 'Cantidad inválida'
+            }, status=400)
+        
+        cart = get_cart(request)
         success, message = cart.add(variant_id, quantity)
         
         response = JsonResponse({
@@ -71,9 +86,16 @@ class UpdateCartView(View):
     
     def post(self, request, *args, **kwargs):
         variant_id = request.POST.get('variant_id')
-        quantity = int(request.POST.get('quantity', 1))
+        quantity = parse_quantity(request.POST.get('quantity'))
+        
+        # 0 quita el producto (Cart.update); negativos o texto no se aceptan
+        if quantity is None or quantity < 0:
+            return JsonResponse({
+                'success': False,
+                'message': 'Cantidad inválida'
+            }, status=400)
         
-        cart = Cart(request)
+        cart = get_cart(request)
         success, message = cart.update(variant_id, quantity)
         
         response = JsonResponse({
@@ -97,7 +119,7 @@ class RemoveFromCartView(View):
     def post(self, request, *args, **kwargs):
         variant_id = request.POST.get('variant_id')
         
-        cart = Cart(request)
+        cart = get_cart(request)
         success, message = cart.remove(variant_id)
         
         response = JsonResponse({
@@ -119,7 +141,7 @@ class ClearCartView(View):
     """
     
     def post(self, request, *args, **kwargs):
-        cart = Cart(request)
+        cart = get_cart(request)
         success, message = cart.clear()
         
         response = JsonResponse({
@@ -137,16 +159,23 @@ class ClearCartView(View):
 # Obtener el contador del carrito (AJAX)
 class GetCartCountView(View):
     """
-    Vista para obtener el contador del carrito (para actualizar el header)
+    Vista para obtener el contador del carrito (para actualizar el header).
+    También deja la cookie CSRF: las páginas del catálogo se cachean sin token.
     """
     
+    @method_decorator(ensure_csrf_cookie)
     def get(self, request, *args, **kwargs):
-        cart = Cart(request)
-        
-        return JsonResponse({
+        cart = get_cart(request)
+
+        response = JsonResponse({
             'cart_count': cart.get_count(),
             'cart_total': float(cart.get_total())
         })
+        # Cada página lo pide: renueva la cookie y la fecha del carrito (solo
+        # cambia al importar el carrito de la cookie anterior)
+        if cart.modified or cart.lines:
+            cart.save_to_response(response)
+        return response
     
 # Obtener los items del carrito (AJAX)
 class GetCartItemsView(View):
@@ -154,12 +183,16 @@ class GetCartItemsView(View):
     Vista para obtener los items del carrito en formato JSON
     """
     def get(self, request):
-        cart = Cart(request)
-        
-        return JsonResponse({
-            'items': cart.get_items(),
+        cart = get_cart(request)
+        items = cart.get_items()
+
+        response = JsonResponse({
+            'items': items,
             'cart_count': cart.get_count(),
             'subtotal': cart.get_subtotal(),
             'total': cart.get_total(),
             'savings': cart.get_savings(),
-        })
\ No newline at end of file
+        })
+        if cart.modified or cart.lines:
+            cart.save_to_response(response)
+        return response
\ No newline at end of file
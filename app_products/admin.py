@@ -4,8 +4,10 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.db.models import Count, Sum, Avg
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 
+from app_products.images import thumbnail_url
 from app_products.models import (
     Category,
     Product,
@@ -14,8 +16,12 @@ from app_products.models import (
     Option,
     OptionValue,
     VariantOption,
-    CommentPublic
+    CommentPublic,
+    ProductCardSummary,
+    ProductVariantMatrix,
+    CategoryFacet
 )
+from app_products.versions import CATALOG, CATEGORIES, bump_version, product_key
 
 
 # ===========================
@@ -43,7 +49,7 @@ class CategoryAdmin(admin.ModelAdmin):
         if obj.imagen_category:
             return format_html(
                 '<img src="{}" width="50" height="50" style="object-fit: cover; border-radius: 4px;" />',
-                obj.imagen_category.url
+                thumbnail_url(obj.imagen_category.url, obj.imagen_widths, 100)
             )
         return '—'
     preview_image.short_description = 'Imagen'
@@ -53,17 +59,16 @@ class CategoryAdmin(admin.ModelAdmin):
         if obj.imagen_category:
             return format_html(
                 '<img src="{}" width="300" style="border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);" />',
-                obj.imagen_category.url
+                thumbnail_url(obj.imagen_category.url, obj.imagen_widths, 600)
             )
         return 'Sin imagen'
     preview_image_large.short_description = 'Vista Previa'
     
     def product_count(self, obj):
-        """Contador de productos en la categoría"""
-        count = obj.products.count()
+        """Contador de productos activos en la categoría (columna mantenida)"""
         return format_html(
             '<span style="background: #2196F3; color: white; padding: 3px 8px; border-radius: 12px; font-size: 11px;">{} productos</span>',
-            count
+            obj.active_products_count
         )
     product_count.short_description = 'Productos'
 
@@ -174,7 +179,7 @@ class ProductAdmin(admin.ModelAdmin):
         """Rating promedio con estrellas"""
         rating = obj.avg_rating
         stars = '★' * rating + '☆' * (5 - rating)
-        comments_count = obj.comments.count()
+        comments_count = obj.rating_count
         
         return format_html(
             '<span style="color: #ffc107; font-size: 16px;" title="{} comentarios">{}</span> <small>({} comentarios)</small>',
@@ -202,24 +207,32 @@ class ProductAdmin(admin.ModelAdmin):
         return '—'
     featured_badge.short_description = 'Destacado'
     
-    # Acciones masivas
+    # Acciones masivas (update() no dispara señales: la versión del catálogo se sube a mano)
     def activate_products(self, request, queryset):
-        updated = queryset.update(is_active=True)
+        updated = queryset.update(is_active=True, updated_at=timezone.now())
+        CategoryFacet.rebuild_for_products(queryset.values_list('id', flat=True))
+        Category.refresh_tiles_for_products(queryset.values_list('id', flat=True))
+        bump_version(CATALOG, CATEGORIES)
         self.message_user(request, f'{updated} productos activados.')
     activate_products.short_description = '✓ Activar productos seleccionados'
     
     def deactivate_products(self, request, queryset):
-        updated = queryset.update(is_active=False)
+        updated = queryset.update(is_active=False, updated_at=timezone.now())
+        CategoryFacet.rebuild_for_products(queryset.values_list('id', flat=True))
+        Category.refresh_tiles_for_products(queryset.values_list('id', flat=True))
+        bump_version(CATALOG, CATEGORIES)
         self.message_user(request, f'{updated} productos desactivados.')
     deactivate_products.short_description = '✕ Desactivar productos seleccionados'
     
     def mark_as_featured(self, request, queryset):
-        updated = queryset.update(is_featured=True)
+        updated = queryset.update(is_featured=True, updated_at=timezone.now())
+        bump_version(CATALOG)
         self.message_user(request, f'{updated} productos marcados como destacados.')
     mark_as_featured.short_description = '⭐ Marcar como destacados'
     
     def unmark_as_featured(self, request, queryset):
-        updated = queryset.update(is_featured=False)
+        updated = queryset.update(is_featured=False, updated_at=timezone.now())
+        bump_version(CATALOG)
         self.message_user(request, f'{updated} productos desmarcados como destacados.')
     unmark_as_featured.short_description = '☆ Desmarcar como destacados'
 
@@ -276,7 +289,7 @@ class ProductVariantImageInline(admin.TabularInline):
         if obj.image_url:
             return format_html(
                 '<img src="{}" width="60" height="60" style="object-fit: cover; border-radius: 4px; border: 2px solid #ddd;" />',
-                obj.image_url
+                thumbnail_url(obj.image_url.url, obj.image_widths, 120)
             )
         return 'Sin imagen'
     image_preview.short_description = 'Preview'
@@ -401,18 +414,33 @@ class ProductVariantAdmin(admin.ModelAdmin):
     stock_status_display.short_description = 'Estado Stock'
     
     # Acciones masivas
+    # queryset.update() no dispara señales: se refrescan resúmenes y facetas a mano
+    def _refresh_summaries(self, queryset):
+        product_ids = list(queryset.values_list('product_id', flat=True))
+        Product.refresh_prices(product_ids)
+        ProductCardSummary.rebuild(product_ids)
+        ProductVariantMatrix.rebuild(product_ids)
+        CategoryFacet.rebuild_for_products(product_ids)
+        Category.refresh_tiles_for_products(product_ids)
+        Product.touch(product_ids)
+        bump_version(CATALOG, CATEGORIES, *[product_key(product_id) for product_id in product_ids])
+
     def activate_variants(self, request, queryset):
         updated = queryset.update(is_active=True)
+        self._refresh_summaries(queryset)
         self.message_user(request, f'{updated} variantes activadas.')
     activate_variants.short_description = '✓ Activar variantes'
     
     def deactivate_variants(self, request, queryset):
         updated = queryset.update(is_active=False)
+        self._refresh_summaries(queryset)
         self.message_user(request, f'{updated} variantes desactivadas.')
     deactivate_variants.short_description = '✕ Desactivar variantes'
     
     def set_out_of_stock(self, request, queryset):
         updated = queryset.update(stock=0)
+        ProductVariant.refresh_available(queryset.values_list('id', flat=True))
+        self._refresh_summaries(queryset)
         self.message_user(request, f'{updated} variantes marcadas sin stock.')
     set_out_of_stock.short_description = '📦 Marcar sin stock'
 
@@ -433,7 +461,7 @@ class ProductVariantImageAdmin(admin.ModelAdmin):
         if obj.image_url:
             return format_html(
                 '<img src="{}" width="80" height="80" style="object-fit: cover; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);" />',
-                obj.image_url
+                thumbnail_url(obj.image_url.url, obj.image_widths, 160)
             )
         return 'Sin imagen'
     image_preview.short_description = 'Imagen'
@@ -0,0 +1,212 @@
+# app_products/api.py
+
+from django.core.files.storage import default_storage
+from django.db.models import Exists, OuterRef
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views import View
+
+from app_products.models import Category, Product, ProductVariant, ProductVariantMatrix
+from app_store.conditional import category_versions, conditional_page, product_versions
+from app_store.facets import ORDERINGS, selected_ordering
+from app_store.pagination import PAGE_SIZE, paginate
+
+API_VERSION = 1
+API_MAX_AGE = 60  # Segundos que un cliente o CDN puede reutilizar sin revalidar
+MAX_LIMIT = 100
+
+# Consultas SQL máximas por endpoint (se publican en /api/v1/): la de los
+# validadores (ETag / Last-Modified) y la de los datos. Un 304 solo hace la primera.
+QUERY_BUDGETS = {
+    "categories": 2,
+    "products": 2,
+    "product_detail": 2,
+}
+
+
+# ---------------------------
+#   SERIALIZACIÓN COMPACTA
+# ---------------------------
+
+def api_response(data, status=200):
+    """JSON sin espacios y con tildes sin escapar"""
+    return JsonResponse(
+        data,
+        status=status,
+        json_dumps_params={"separators": (",", ":"), "ensure_ascii": False},
+    )
+
+
+def money(value):
+    """Decimal -> número (entero si no tiene centavos)"""
+    if value is None:
+        return None
+    return int(value) if value == value.to_integral_value() else float(value)
+
+
+def media_url(name):
+    return default_storage.url(name) if name else None
+
+
+def parse_limit(request):
+    try:
+        limit = int(request.GET.get("limite", PAGE_SIZE))
+    except ValueError:
+        limit = PAGE_SIZE
+    return max(1, min(limit, MAX_LIMIT))
+
+
+# ---------------------------
+#   ENDPOINTS
+# ---------------------------
+
+class ApiIndexView(View):
+    """Endpoints disponibles y su presupuesto de consultas"""
+
+    def get(self, request):
+        return api_response({
+            "version": API_VERSION,
+            "endpoints": {
+                "categories": {"url": reverse("api_categories"), "query_budget": QUERY_BUDGETS["categories"]},
+                "products": {
+                    "url": reverse("api_products"),
+                    "query_budget": QUERY_BUDGETS["products"],
+                    "params": ["categoria", "oferta", "stock", "orden", "limite", "after"],
+                    "orderings": list(ORDERINGS),
+                },
+                "product_detail": {
+                    "url": reverse("api_product_detail", args=[0]).replace("/0/", "/{id}/"),
+                    "query_budget": QUERY_BUDGETS["product_detail"],
+                },
+            },
+        })
+
+
+@method_decorator(conditional_page(category_versions, max_age=API_MAX_AGE), name="get")
+class ApiCategoriesView(View):
+    def get(self, request):
+        rows = (
+            Category.objects
+            .filter(active_products_count__gt=0)
+            .order_by("name")
+            .values("id", "name", "slug", "imagen_category", "representative_image", "active_products_count")
+        )
+        return api_response({
+            "results": [
+                {
+                    "id": row["id"],
+                    "name": row["name"],
+                    "slug": row["slug"],
+                    "image": media_url(row["imagen_category"]) or row["representative_image"] or None,
+                    "products": row["active_products_count"],
+                }
+                for row in rows
+            ],
+        })
+
+
+@method_decorator(conditional_page(max_age=API_MAX_AGE), name="get")
+class ApiProductsView(View):
+    """
+    Listado paginado por cursor. Filtros: ?categoria=<slug>, ?oferta=1,
+    ?stock=1 y ?orden= (mismas claves que el orden de las categorías).
+    """
+
+    def get(self, request):
+        in_stock = Exists(
+            ProductVariant.objects.filter(product=OuterRef("pk"), is_active=True, stock__gt=0)
+        )
+        productos = Product.objects.filter(is_active=True).annotate(in_stock=in_stock)
+
+        if request.GET.get("categoria"):
+            productos = productos.filter(category__slug=request.GET["categoria"])
+        if request.GET.get("oferta") == "1":
+            productos = productos.filter(has_active_discount=True)
+        if request.GET.get("stock") == "1":
+            productos = productos.filter(in_stock=True)
+
+        orden = selected_ordering(request)
+        if orden.startswith("precio"):
+            productos = productos.filter(min_price__isnull=False)
+
+        productos = productos.values(
+            "id", "name", "slug", "category_id", "created_at",
+            "min_price", "max_discount_pct", "rating_sum", "rating_count", "in_stock",
+            "card_summary__price", "card_summary__discount_price", "card_summary__image_url",
+        )
+        page = paginate(request, productos, ORDERINGS[orden][1], size=parse_limit(request))
+
+        return api_response({
+            "results": [
+                {
+                    "id": row["id"],
+                    "name": row["name"],
+                    "slug": row["slug"],
+                    "category": row["category_id"],
+                    "price": money(row["card_summary__price"]),
+                    "discount_price": money(row["card_summary__discount_price"]),
+                    "min_price": money(row["min_price"]),
+                    "discount_pct": row["max_discount_pct"],
+                    "in_stock": row["in_stock"],
+                    "image": row["card_summary__image_url"] or None,
+                    "rating": round(row["rating_sum"] / row["rating_count"], 1) if row["rating_count"] else 0,
+                    "reviews": row["rating_count"],
+                }
+                for row in page
+            ],
+            "next": page.next_url,
+        })
+
+
+@method_decorator(conditional_page(product_versions, max_age=API_MAX_AGE), name="get")
+class ApiProductDetailView(View):
+    """Producto con sus variantes activas, opciones e imágenes (de la matriz de variantes)"""
+
+    def get(self, request, id):
+        product = (
+            Product.objects
+            .filter(id=id, is_active=True)
+            .values(
+                "id", "name", "slug", "description_short", "description_long", "warranty",
+                "category_id", "category__name", "category__slug",
+                "min_price", "max_discount_pct", "rating_sum", "rating_count",
+                "variant_matrix__data",
+            )
+            .first()
+        )
+        if product is None:
+            return api_response({"error": "Producto no encontrado"}, status=404)
+
+        # Variantes, opciones e imágenes: matriz precalculada del producto
+        matrix = product["variant_matrix__data"]
+        if matrix is None:
+            ProductVariantMatrix.rebuild([id])
+            matrix = ProductVariantMatrix.objects.get(product_id=id).data
+
+        return api_response({
+            "id": product["id"],
+            "name": product["name"],
+            "slug": product["slug"],
+            "category": {
+                "id": product["category_id"],
+                "name": product["category__name"],
+                "slug": product["category__slug"],
+            } if product["category_id"] else None,
+            "description_short": product["description_short"],
+            "description_long": product["description_long"],
+            "warranty": product["warranty"],
+            "min_price": money(product["min_price"]),
+            "discount_pct": product["max_discount_pct"],
+            "rating": round(product["rating_sum"] / product["rating_count"], 1) if product["rating_count"] else 0,
+            "reviews": product["rating_count"],
+            "options": matrix["axes"],
+            "images": [
+                {"url": image["url"], "alt": image["alt"] or product["name"]}
+                for image in matrix["images"]
+            ],
+            "variants": [
+                {key: variant[key] for key in ("id", "sku", "price", "discount_price", "stock", "options", "images")}
+                for variant in matrix["variants"]
+            ],
+        })
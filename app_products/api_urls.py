@@ -0,0 +1,9 @@
+from django.urls import path
+from app_products import api
+
+urlpatterns = [
+    path("", api.ApiIndexView.as_view(), name="api_index"),
+    path("categorias/", api.ApiCategoriesView.as_view(), name="api_categories"),
+    path("productos/", api.ApiProductsView.as_view(), name="api_products"),
+    path("productos/<int:id>/", api.ApiProductDetailView.as_view(), name="api_product_detail"),
+]
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "app_products"
+
+    def ready(self):
+        from app_products import signals  # noqa: F401
@@ -0,0 +1,118 @@
+# app_products/images.py
+
+import io
+import logging
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (160, 320, 640, 1280)  # Anchos de las copias (tarjetas, galería, zoom)
+DERIVATIVES_DIR = "_w"  # Subcarpeta junto al original: productos/_w/foto.png-320.webp
+
+# Extensión -> (formato de Pillow, opciones de guardado)
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+# ---------------------------
+#   NOMBRES Y URLS
+# ---------------------------
+# El nombre de cada copia se deduce del original, así la URL sale de la del
+# original sin consultar nada (sirve igual con MEDIA_ROOT y con S3).
+# Se conserva la extensión del original para que foto.png y foto.jpg no
+# compartan copias.
+
+def _derivative_path(path, width, extension):
+    folder, filename = posixpath.split(path)
+    return posixpath.join(folder, DERIVATIVES_DIR, f"{filename}-{width}.{extension}")
+
+
+def derivative_name(name, width, extension):
+    """Nombre en el storage de la copia de `name` con ese ancho y formato"""
+    return _derivative_path(name, width, extension)
+
+
+def derivative_url(url, width, extension):
+    """URL de la copia a partir de la URL del original"""
+    path, _, query = url.partition("?")
+    derived = _derivative_path(path, width, extension)
+    return f"{derived}?{query}" if query else derived
+
+
+def srcset(url, widths, extension="jpg"):
+    """Valor del atributo srcset ("url 160w, url 320w, ...") o "" si no hay copias"""
+    if not url or not widths:
+        return ""
+    return ", ".join(f"{derivative_url(url, width, extension)} {width}w" for width in widths)
+
+
+def thumbnail_url(url, widths, width, extension="webp"):
+    """Copia más pequeña que cubre `width` px (miniaturas del admin); si no hay, el original"""
+    for candidate in widths or ():
+        if candidate >= width:
+            return derivative_url(url, candidate, extension)
+    return url
+
+
+# ---------------------------
+#   GENERACIÓN
+# ---------------------------
+
+def _flatten(image):
+    """RGB sobre fondo blanco (las fotos con transparencia van sobre tarjetas blancas)"""
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def generate_derivatives(name, storage=None):
+    """
+    Genera las copias de `name` en todos los anchos menores que el original
+    (nunca se amplía) y en WebP y JPEG. Devuelve la lista de anchos creados;
+    [] si el archivo no existe o no es una imagen válida.
+    """
+    storage = storage or default_storage
+    if not name:
+        return []
+
+    try:
+        with storage.open(name, "rb") as original:
+            image = Image.open(original)
+            image.load()
+    except (OSError, ValueError) as error:
+        logger.warning("No se pudieron generar copias de %s: %s", name, error)
+        return []
+
+    image = _flatten(image)
+    widths = []
+    for width in WIDTHS:
+        if width >= image.width:
+            break
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+
+        saved = True
+        for extension, (image_format, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, **options)
+            target = derivative_name(name, width, extension)
+            # Sin borrar antes, S3 (AWS_S3_FILE_OVERWRITE=False) y el disco
+            # guardarían con otro nombre y la URL deducida no existiría
+            storage.delete(target)
+            if storage.save(target, ContentFile(buffer.getvalue())) != target:
+                logger.warning("El storage renombró la copia %s", target)
+                saved = False
+        if saved:
+            widths.append(width)
+    return widths
+
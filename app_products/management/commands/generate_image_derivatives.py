@@ -0,0 +1,100 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from app_products.images import generate_derivatives
+from app_products.models import (
+    Category,
+    Product,
+    ProductCardSummary,
+    ProductVariantImage,
+    ProductVariantMatrix,
+)
+from app_products.versions import CATALOG, CATEGORIES, bump_version, product_key
+
+
+def _init_worker():
+    # Con "spawn" (macOS/Windows) el proceso hijo arranca sin Django cargado
+    django.setup()
+
+
+def _process(job):
+    """Corre en un proceso del pool: solo toca el storage, nunca la base de datos"""
+    kind, pk, name = job
+    return kind, pk, generate_derivatives(name)
+
+
+class Command(BaseCommand):
+    help = "Genera las copias WebP/JPEG (160/320/640/1280 px) de las imágenes de productos y categorías ya subidas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1)
+        parser.add_argument(
+            "--todas",
+            action="store_true",
+            help="Regenera también las imágenes que ya tienen copias",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        jobs = [
+            ("image", pk, name)
+            for pk, name, widths in ProductVariantImage.objects.exclude(image_url="").values_list(
+                "id", "image_url", "image_widths"
+            )
+            if name and (options["todas"] or not widths)
+        ] + [
+            ("category", pk, name)
+            for pk, name, widths in Category.objects.exclude(imagen_category="").values_list(
+                "id", "imagen_category", "imagen_widths"
+            )
+            if name and (options["todas"] or not widths)
+        ]
+
+        results = self.run_jobs(jobs, max(1, options["procesos"]))
+
+        images = [
+            ProductVariantImage(id=pk, image_widths=widths)
+            for kind, pk, widths in results if kind == "image"
+        ]
+        categories = [
+            Category(id=pk, imagen_widths=widths)
+            for kind, pk, widths in results if kind == "category"
+        ]
+        ProductVariantImage.objects.bulk_update(images, ["image_widths"], batch_size=options["batch_size"])
+        Category.objects.bulk_update(categories, ["imagen_widths"], batch_size=options["batch_size"])
+
+        # Tarjetas, matrices y categorías copian los anchos de las imágenes
+        product_ids = sorted(set(
+            ProductVariantImage.objects
+            .filter(id__in=[image.id for image in images])
+            .values_list("variant__product_id", flat=True)
+        ))
+        batch_size = options["batch_size"]
+        for start in range(0, len(product_ids), batch_size):
+            batch = product_ids[start:start + batch_size]
+            ProductCardSummary.rebuild(batch)
+            ProductVariantMatrix.rebuild(batch)
+            Product.touch(batch)
+            bump_version(*[product_key(product_id) for product_id in batch])
+        Category.refresh_tiles_for_products(product_ids, [category.id for category in categories])
+        Category.touch([category.id for category in categories])
+        bump_version(CATALOG, CATEGORIES)
+
+        total = sum(1 for _, _, widths in results if widths)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Copias generadas para {total} de {len(jobs)} imágenes ({len(product_ids)} productos actualizados)"
+        ))
+
+    def run_jobs(self, jobs, processes):
+        """Redimensiona en paralelo (Pillow usa CPU); con 1 proceso lo hace aquí mismo"""
+        if processes == 1 or len(jobs) < 2:
+            return [_process(job) for job in jobs]
+
+        # Las conexiones abiertas no se pueden compartir con los procesos hijos
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker) as pool:
+            return list(pool.map(_process, jobs, chunksize=8))
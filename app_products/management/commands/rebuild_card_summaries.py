@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app_products.models import ProductCardSummary
+
+
+class Command(BaseCommand):
+    help = "Reconstruye los resúmenes de tarjetas (ProductCardSummary) de todos los productos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = ProductCardSummary.rebuild_all(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} resúmenes reconstruidos"))
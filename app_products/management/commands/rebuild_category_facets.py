@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app_products.models import CategoryFacet
+
+
+class Command(BaseCommand):
+    help = "Reconstruye las facetas (color, medida, precio, stock) de todas las categorías"
+
+    def handle(self, *args, **options):
+        total = CategoryFacet.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} valores de faceta reconstruidos"))
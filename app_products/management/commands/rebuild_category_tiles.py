@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from app_products.models import Category
+from app_products.versions import CATEGORIES, bump_version
+
+
+class Command(BaseCommand):
+    help = "Recalcula el contador de productos activos y la imagen representativa de cada categoría"
+
+    def handle(self, *args, **options):
+        Category.refresh_tiles(Category.objects.values_list("id", flat=True))
+        bump_version(CATEGORIES)
+        self.stdout.write(self.style.SUCCESS(f"✅ {Category.objects.count()} categorías actualizadas"))
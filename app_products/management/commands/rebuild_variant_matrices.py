@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app_products.models import ProductVariantMatrix
+
+
+class Command(BaseCommand):
+    help = "Reconstruye la matriz de variantes (opciones, precios, stock e imágenes) del detalle de cada producto"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = ProductVariantMatrix.rebuild_all(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} matrices de variantes reconstruidas"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from app_products.models import Product, ProductCardSummary
+
+
+class Command(BaseCommand):
+    help = "Recalcula rating_sum, rating_count y el histograma de estrellas desde los comentarios"
+
+    def handle(self, *args, **options):
+        total = Product.rebuild_ratings()
+        ProductCardSummary.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} productos con calificaciones reparadas"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app_products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Rebaraja el orden aleatorio de los productos (programar con cron, p.ej. cada hora)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = Product.reshuffle(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} productos rebarajados"))
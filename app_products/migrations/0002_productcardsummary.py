@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_products", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductCardSummary",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="card_summary",
+                        serialize=False,
+                        to="app_products.product",
+                    ),
+                ),
+                ("variant_id", models.BigIntegerField(blank=True, null=True)),
+                (
+                    "price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                (
+                    "discount_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                ("discount_percentage", models.PositiveSmallIntegerField(default=0)),
+                ("in_stock", models.BooleanField(default=False)),
+                ("image_url", models.CharField(blank=True, max_length=500)),
+                ("avg_rating", models.PositiveSmallIntegerField(default=0)),
+                ("comments_count", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_products", "0002_productcardsummary"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["is_active", "-created_at", "-id"],
+                name="app_product_is_acti_ced029_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["is_active", "-sales_count", "-id"],
+                name="app_product_is_acti_d83630_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "is_active", "-created_at", "-id"],
+                name="app_product_categor_c09acf_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:23
+
+import random
+
+import app_products.models
+from django.db import migrations, models
+
+
+def assign_random_keys(apps, schema_editor):
+    # AddField calcula el default una sola vez: repartir claves distintas
+    Product = apps.get_model("app_products", "Product")
+    products = list(Product.objects.only("id"))
+    for product in products:
+        product.random_key = random.random()
+    Product.objects.bulk_update(products, ["random_key"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_products", "0003_product_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="random_key",
+            field=models.FloatField(
+                default=app_products.models.generate_random_key, editable=False
+            ),
+        ),
+        migrations.RunPython(assign_random_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["is_active", "random_key", "id"],
+                name="app_product_is_acti_447e34_idx",
+            ),
+        ),
+    ]
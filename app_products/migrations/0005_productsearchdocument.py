@@ -0,0 +1,116 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+DOCUMENT_TABLE = "app_products_productsearchdocument"
+FTS_TABLE = "app_products_search_fts"
+
+POSTGRESQL_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"""
+    ALTER TABLE {DOCUMENT_TABLE} ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', title), 'A')
+        || setweight(to_tsvector('spanish', body), 'B')
+    ) STORED
+    """,
+    f"CREATE INDEX product_search_vector_idx ON {DOCUMENT_TABLE} USING GIN (search_vector)",
+    f"CREATE INDEX product_search_title_trgm_idx ON {DOCUMENT_TABLE} USING GIN (title gin_trgm_ops)",
+]
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS product_search_title_trgm_idx",
+    "DROP INDEX IF EXISTS product_search_vector_idx",
+    f"ALTER TABLE {DOCUMENT_TABLE} DROP COLUMN IF EXISTS search_vector",
+]
+
+# Tabla FTS5 de contenido externo, sincronizada con triggers
+SQLITE_FORWARD = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, body,
+        content='{DOCUMENT_TABLE}', content_rowid='product_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.product_id, new.title, new.body);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ('delete', old.product_id, old.title, old.body);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ('delete', old.product_id, old.title, old.body);
+        INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.product_id, new.title, new.body);
+    END
+    """,
+]
+SQLITE_BACKWARD = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+MYSQL_FORWARD = [
+    f"ALTER TABLE {DOCUMENT_TABLE} ADD FULLTEXT INDEX product_search_ft_idx (title, body)",
+]
+MYSQL_BACKWARD = [
+    f"ALTER TABLE {DOCUMENT_TABLE} DROP INDEX product_search_ft_idx",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_products", "0004_product_random_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSearchDocument",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="app_products.product",
+                    ),
+                ),
+                ("title", models.CharField(max_length=255)),
+                ("body", models.TextField(blank=True)),
+            ],
+        ),
+        migrations.RunPython(
+            _run(
+                {
+                    "postgresql": POSTGRESQL_FORWARD,
+                    "sqlite": SQLITE_FORWARD,
+                    "mysql": MYSQL_FORWARD,
+                }
+            ),
+            _run(
+                {
+                    "postgresql": POSTGRESQL_BACKWARD,
+                    "sqlite": SQLITE_BACKWARD,
+                    "mysql": MYSQL_BACKWARD,
+                }
+            ),
+        ),
+    ]
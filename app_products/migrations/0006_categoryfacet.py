@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_products", "0005_productsearchdocument"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryFacet",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("facet", models.CharField(max_length=30)),
+                ("facet_label", models.CharField(blank=True, max_length=50)),
+                ("value_key", models.CharField(max_length=50)),
+                ("value_label", models.CharField(blank=True, max_length=100)),
+                ("position", models.PositiveIntegerField(default=0)),
+                ("product_ids", models.JSONField(default=list)),
+                ("product_count", models.PositiveIntegerField(default=0)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="facets",
+                        to="app_products.category",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["category", "facet", "position", "value_key"],
+                "unique_together": {("category", "facet", "value_key")},
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:34
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    # Acumula los comentarios existentes en las columnas nuevas
+    Product = apps.get_model("app_products", "Product")
+    CommentPublic = apps.get_model("app_products", "CommentPublic")
+    fields = ["rating_sum", "rating_count"] + [f"rating_{n}" for n in range(1, 6)]
+
+    totals = CommentPublic.objects.values("product_id").annotate(
+        rating_sum=Sum("rating"),
+        rating_count=Count("id"),
+        **{f"rating_{n}": Count("id", filter=Q(rating=n)) for n in range(1, 6)},
+    )
+    products = []
+    for row in totals:
+        product = Product(id=row["product_id"])
+        for field in fields:
+            setattr(product, field, row[field])
+        products.append(product)
+    Product.objects.bulk_update(products, fields, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_products", "0006_categoryfacet"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_1",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_2",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_3",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_4",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_5",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
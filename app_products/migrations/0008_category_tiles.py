@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_products", "0007_product_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="active_products_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="representative_image",
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="representative_product",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="app_products.product",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="category",
+            index=models.Index(
+                fields=["active_products_count"], name="app_product_active__122061_idx"
+            ),
+        ),
+    ]
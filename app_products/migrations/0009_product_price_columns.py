@@ -0,0 +1,88 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+def backfill_prices(apps, schema_editor):
+    # Mismo cálculo que Product.refresh_prices sobre las variantes activas
+    Product = apps.get_model("app_products", "Product")
+    ProductVariant = apps.get_model("app_products", "ProductVariant")
+
+    prices = {}
+    for variant in ProductVariant.objects.filter(is_active=True).only(
+        "product_id", "price", "discount_price"
+    ):
+        on_sale = bool(variant.discount_price and variant.discount_price > 0)
+        final_price = variant.discount_price if on_sale else variant.price
+        pct = (
+            round((variant.price - variant.discount_price) / variant.price * 100)
+            if on_sale and variant.price
+            else 0
+        )
+        has_discount, min_price, max_pct = prices.get(
+            variant.product_id, (False, None, 0)
+        )
+        prices[variant.product_id] = (
+            has_discount or on_sale,
+            final_price if min_price is None else min(min_price, final_price),
+            max(max_pct, pct),
+        )
+
+    products = []
+    for product_id, (has_discount, min_price, max_pct) in prices.items():
+        products.append(
+            Product(
+                id=product_id,
+                has_active_discount=has_discount,
+                min_price=min_price,
+                max_discount_pct=max_pct,
+            )
+        )
+    Product.objects.bulk_update(
+        products,
+        ["has_active_discount", "min_price", "max_discount_pct"],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_products", "0008_category_tiles"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="has_active_discount",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="max_discount_pct",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="min_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=10, null=True
+            ),
+        ),
+        migrations.RunPython(backfill_prices, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("has_active_discount", True), ("is_active", True)),
+                fields=["-max_discount_pct", "-id"],
+                name="product_offers_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "is_active", "min_price", "id"],
+                name="app_product_categor_c63e30_idx",
+            ),
+        ),
+    ]
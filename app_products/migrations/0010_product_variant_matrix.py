@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_products", "0009_product_price_columns"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductVariantMatrix",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="variant_matrix",
+                        serialize=False,
+                        to="app_products.product",
+                    ),
+                ),
+                ("data", models.JSONField(default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_products", "0010_product_variant_matrix"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="commentpublic",
+            index=models.Index(
+                fields=["product", "-created_at", "-id"],
+                name="app_product_product_3cbfd2_idx",
+            ),
+        ),
+    ]
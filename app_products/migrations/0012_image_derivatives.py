@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_products", "0011_comment_keyset_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="imagen_widths",
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="representative_widths",
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name="productcardsummary",
+            name="image_widths",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name="productvariantimage",
+            name="image_widths",
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
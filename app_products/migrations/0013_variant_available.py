@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:58
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_available(apps, schema_editor):
+    # Mismo cálculo que ProductVariant.refresh_available
+    ProductVariant = apps.get_model("app_products", "ProductVariant")
+    CartReservation = apps.get_model("app_orders", "CartReservation")
+
+    reserved = (
+        CartReservation.objects.filter(variant=OuterRef("pk"), is_active=True)
+        .values("variant")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    ProductVariant.objects.update(
+        available=F("stock") - Coalesce(Subquery(reserved), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_products", "0012_image_derivatives"),
+        ("app_orders", "0004_cart_session"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productvariant",
+            name="available",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_available, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,20 @@
-from django.db import models
-from django.db.models import Avg
+import operator
+import random
+from functools import reduce
+
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from app_products.images import generate_derivatives
+from app_products.upsert import upsert
+
+
+def generate_random_key():
+    """Valor aleatorio para ordenar productos sin ORDER BY RANDOM()"""
+    return random.random()
 
 # ---------------------------
 #   CATEGORÍAS
@@ -9,20 +24,148 @@ class Category(models.Model):
     slug = models.SlugField(unique=True)  # Slug para URL
     description = models.TextField(blank=True)  # Descripción opcional
     imagen_category = models.ImageField(upload_to="categories/", blank=True, null=True)  # Imagen de la categoría, se guarde en aws s3 bucket
+    imagen_widths = models.JSONField(default=list, blank=True, editable=False)  # Anchos de sus copias (app_products/images.py)
+
+    # Datos de la tarjeta de categoría (se mantienen con señales, ver refresh_tiles)
+    active_products_count = models.PositiveIntegerField(default=0, editable=False)  # Productos activos
+    representative_product = models.ForeignKey(
+        "Product",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+"
+    )  # Producto más vendido de la categoría
+    representative_image = models.CharField(max_length=500, blank=True, editable=False)  # Su imagen principal
+    representative_widths = models.JSONField(default=list, blank=True, editable=False)  # Anchos de sus copias
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Último cambio visible (ETag / Last-Modified)
 
+    TILE_FIELDS = ("active_products_count", "representative_product", "representative_image", "representative_widths")
 
     class Meta:
         ordering = ["name"]
+        indexes = [
+            models.Index(fields=["active_products_count"]),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Los contadores solo los escribe refresh_tiles: el admin no los pisa
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.TILE_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def image_url(self):
+        """Imagen de la categoría o, si no tiene, la de su producto representativo"""
+        return self.imagen_category.url if self.imagen_category else self.representative_image
+
+    @property
+    def image_widths(self):
+        """Anchos disponibles de image_url para el srcset"""
+        return self.imagen_widths if self.imagen_category else self.representative_widths
+
+    def generate_derivatives(self):
+        """Genera las copias WebP/JPEG de la imagen de la categoría y guarda sus anchos"""
+        widths = generate_derivatives(self.imagen_category.name, self.imagen_category.storage) if self.imagen_category else []
+        type(self).objects.filter(pk=self.pk).update(imagen_widths=widths, updated_at=timezone.now())
+        self.imagen_widths = widths
+        return widths
+
+    @classmethod
+    def refresh_tiles(cls, category_ids):
+        """
+        Recalcula el contador de productos activos y el producto/imagen
+        representativo de las categorías indicadas. Devuelve True si algo
+        cambió (para invalidar el menú global).
+        """
+        category_ids = {category_id for category_id in category_ids if category_id}
+        if not category_ids:
+            return False
+
+        counts = dict(
+            Product.objects
+            .filter(category_id__in=category_ids, is_active=True)
+            .values("category_id")
+            .annotate(total=Count("id"))
+            .values_list("category_id", "total")
+        )
+
+        # Más vendido con imagen en su tarjeta
+        representatives = {}
+        candidates = (
+            ProductCardSummary.objects
+            .filter(
+                product__category_id__in=category_ids,
+                product__is_active=True,
+            )
+            .exclude(image_url="")
+            .order_by("product__category_id", "-product__sales_count", "product_id")
+            .values_list("product__category_id", "product_id", "image_url", "image_widths")
+        )
+        for category_id, product_id, image_url, image_widths in candidates:
+            representatives.setdefault(category_id, (product_id, image_url, image_widths))
+
+        changed = []
+        now = timezone.now()
+        for category in cls.objects.filter(id__in=category_ids).only("id", *cls.TILE_FIELDS):
+            product_id, image_url, image_widths = representatives.get(category.id, (None, "", []))
+            values = (counts.get(category.id, 0), product_id, image_url, image_widths)
+            current = (
+                category.active_products_count,
+                category.representative_product_id,
+                category.representative_image,
+                category.representative_widths,
+            )
+            if values != current:
+                (
+                    category.active_products_count,
+                    category.representative_product_id,
+                    category.representative_image,
+                    category.representative_widths,
+                ) = values
+                category.updated_at = now
+                changed.append(category)
+
+        cls.objects.bulk_update(changed, [*cls.TILE_FIELDS, "updated_at"])
+        return bool(changed)
+
+    @classmethod
+    def refresh_tiles_for_products(cls, product_ids, extra_category_ids=()):
+        """Recalcula las categorías de los productos indicados (y las extra)"""
+        category_ids = set(extra_category_ids) | set(
+            Product.objects.filter(id__in=product_ids).values_list("category_id", flat=True)
+        )
+        return cls.refresh_tiles(category_ids)
+
+    @classmethod
+    def touch(cls, category_ids):
+        """Marca las categorías como modificadas (update() no pasa por auto_now)"""
+        return cls.objects.filter(id__in=category_ids).update(updated_at=timezone.now())
+
 
 
 # ---------------------------
 #   PRODUCTOS
 # ---------------------------
 
+def prefetched(instance, name):
+    """Lista ya cargada con prefetch_related(name) o None si no se precargó"""
+    cache = getattr(instance, "_prefetched_objects_cache", {})
+    return list(cache[name]) if name in cache else None
+
+
+class ProductQuerySet(models.QuerySet):
+    def for_cards(self):
+        """Lo que leen las tarjetas (Card.html): el resumen precalculado en el mismo SELECT"""
+        return self.select_related("card_summary")
+
+
 class Product(models.Model):
     category = models.ForeignKey(
         Category,
@@ -41,6 +184,24 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True, choices=((True, "Activo"), (False, "Inactivo")),)  # Producto activo
     is_featured = models.BooleanField(default=False)  # Producto destacado
     created_at = models.DateTimeField(auto_now_add=True)  # Fecha creación
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Último cambio visible (ETag / Last-Modified)
+    random_key = models.FloatField(default=generate_random_key, editable=False)  # Orden aleatorio precalculado
+
+    # Calificaciones acumuladas (se actualizan con F() al crear/borrar comentarios)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)  # Histograma por estrellas
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+
+    # Precios de las variantes activas (se recalculan al guardar variantes)
+    has_active_discount = models.BooleanField(default=False, editable=False)  # Alguna variante en oferta
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)  # Precio final más bajo
+    max_discount_pct = models.PositiveSmallIntegerField(default=0, editable=False)  # Mayor % de descuento
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         ordering = ["-created_at"]
@@ -48,16 +209,154 @@ class Product(models.Model):
             models.Index(fields=["slug"]),
             models.Index(fields=["is_active"]),
             models.Index(fields=["is_featured"]),
+            # Paginación por cursor de los listados (orden + desempate por id)
+            models.Index(fields=["is_active", "-created_at", "-id"]),
+            models.Index(fields=["is_active", "-sales_count", "-id"]),
+            models.Index(fields=["category", "is_active", "-created_at", "-id"]),
+            # Lectura aleatoria por rango (ver reshuffle)
+            models.Index(fields=["is_active", "random_key", "id"]),
+            # Página de ofertas: solo productos en oferta, por % de descuento
+            models.Index(
+                fields=["-max_discount_pct", "-id"],
+                condition=Q(is_active=True, has_active_discount=True),
+                name="product_offers_idx",
+            ),
+            # Orden por precio dentro de la categoría
+            models.Index(fields=["category", "is_active", "min_price", "id"]),
         ]
 
+    RATING_FIELDS = ("rating_sum", "rating_count", "rating_1", "rating_2", "rating_3", "rating_4", "rating_5")
+    PRICE_FIELDS = ("has_active_discount", "min_price", "max_discount_pct")
+
     def __str__(self):
         return self.name
-    
+
+    def save(self, *args, **kwargs):
+        # Las calificaciones solo cambian con apply_rating (F()) y los precios
+        # con refresh_prices: al editar el producto no se reescriben para no
+        # pisar comentarios o variantes recién guardados
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.RATING_FIELDS + self.PRICE_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
     @property
     def avg_rating(self):
-        avg = self.comments.aggregate(avg=Avg("rating"))["avg"]
-        return round(avg) if avg else 0
+        """
+        Promedio redondeado (0-5). Usa las columnas acumuladas si se cargaron
+        o el resumen de tarjeta si vino con select_related; solo consulta si
+        no hay nada.
+        """
+        if "rating_sum" not in self.__dict__ and "card_summary" in self._state.fields_cache:
+            summary = self._state.fields_cache["card_summary"]
+            return summary.avg_rating if summary else 0
+        if not self.rating_count:
+            return 0
+        return round(self.rating_sum / self.rating_count)
+
+    @property
+    def rating_breakdown(self):
+        """[{"stars": 5, "count": 12, "percent": 60}, ...] de 5 a 1 estrellas"""
+        return [
+            {
+                "stars": stars,
+                "count": getattr(self, f"rating_{stars}"),
+                "percent": round(getattr(self, f"rating_{stars}") * 100 / self.rating_count) if self.rating_count else 0,
+            }
+            for stars in range(5, 0, -1)
+        ]
+
+    @classmethod
+    def apply_rating(cls, product_id, rating, delta):
+        """
+        Suma (delta=1) o resta (delta=-1) una calificación en una sola
+        sentencia UPDATE con F(), sin leer el producto.
+        """
+        if rating not in range(1, 6):
+            return
+        cls.objects.filter(id=product_id).update(**{
+            "rating_sum": F("rating_sum") + rating * delta,
+            "rating_count": F("rating_count") + delta,
+            f"rating_{rating}": F(f"rating_{rating}") + delta,
+        })
+
+    @classmethod
+    def rebuild_ratings(cls, product_ids=None):
+        """Recalcula las calificaciones desde los comentarios (reparación)"""
+        products = cls.objects.all() if product_ids is None else cls.objects.filter(id__in=product_ids)
+        totals = {
+            row.pop("product_id"): row
+            for row in (
+                CommentPublic.objects
+                .filter(product__in=products)
+                .values("product_id")
+                .annotate(
+                    rating_sum=Sum("rating"),
+                    rating_count=Count("id"),
+                    **{f"rating_{n}": Count("id", filter=Q(rating=n)) for n in range(1, 6)},
+                )
+            )
+        }
+
+        fields = ["rating_sum", "rating_count"] + [f"rating_{n}" for n in range(1, 6)]
+        updated = []
+        for product in products.only("id", *fields):
+            row = totals.get(product.id, {})
+            for field in fields:
+                setattr(product, field, row.get(field, 0))
+            updated.append(product)
+
+        cls.objects.bulk_update(updated, fields, batch_size=500)
+        return len(updated)
+
+    @classmethod
+    def touch(cls, product_ids):
+        """Marca los productos como modificados: variantes, imágenes o comentarios no pasan por su save"""
+        return cls.objects.filter(id__in=product_ids).update(updated_at=timezone.now())
+
+    @classmethod
+    def refresh_prices(cls, product_ids):
+        """Recalcula oferta, precio mínimo y mayor descuento desde las variantes activas"""
+        product_ids = set(product_ids)
+        prices = {}
+        variants = (
+            ProductVariant.objects
+            .filter(product_id__in=product_ids, is_active=True)
+            .only("product_id", "price", "discount_price")
+        )
+        for variant in variants:
+            on_sale = bool(variant.discount_price and variant.discount_price > 0)
+            final_price = variant.discount_price if on_sale else variant.price
+            has_discount, min_price, max_pct = prices.get(variant.product_id, (False, None, 0))
+            prices[variant.product_id] = (
+                has_discount or on_sale,
+                final_price if min_price is None else min(min_price, final_price),
+                max(max_pct, variant.discount_percentage if on_sale else 0),
+            )
+
+        updated = []
+        for product in cls.objects.filter(id__in=product_ids).only("id", *cls.PRICE_FIELDS):
+            values = prices.get(product.id, (False, None, 0))
+            if (product.has_active_discount, product.min_price, product.max_discount_pct) != values:
+                product.has_active_discount, product.min_price, product.max_discount_pct = values
+                updated.append(product)
+        cls.objects.bulk_update(updated, cls.PRICE_FIELDS, batch_size=500)
+        return len(updated)
+
+    @classmethod
+    def reshuffle(cls, batch_size=1000):
+        """
+        Reasigna random_key a todos los productos. Se ejecuta de forma periódica
+        (`python manage.py reshuffle_products`) para rotar el orden aleatorio
+        sin usar ORDER BY RANDOM() en cada visita.
+        """
+        ids = list(cls.objects.order_by("id").values_list("id", flat=True))
+        for start in range(0, len(ids), batch_size):
+            batch = [cls(id=pk, random_key=generate_random_key()) for pk in ids[start:start + batch_size]]
+            cls.objects.bulk_update(batch, ["random_key"])
+        return len(ids)
 
         
 
@@ -116,6 +415,22 @@ class OptionValue(models.Model):
 
 
 
+class ProductVariantQuerySet(models.QuerySet):
+    def for_cart_line(self):
+        """Solo lo que guarda una línea del carrito (precios): agregar o cambiar cantidades"""
+        return self.only("id", "price", "discount_price", "is_active")
+
+    def for_cart(self):
+        """Producto, imágenes y opciones de cada variante en 3 consultas fijas"""
+        return self.select_related("product").prefetch_related(
+            "images",
+            models.Prefetch(
+                "options",
+                queryset=VariantOption.objects.select_related("option_value__option"),
+            ),
+        )
+
+
 class ProductVariant(models.Model):
     product = models.ForeignKey(
         Product,
@@ -133,6 +448,10 @@ class ProductVariant(models.Model):
     )
 
     stock = models.PositiveIntegerField(default=0)
+    # stock - reservas activas del carrito. Solo lo cambian UPDATE condicionales
+    # (CartReservation.reserve/release) y refresh_available; puede quedar
+    # negativo si se baja el stock por debajo de lo reservado
+    available = models.IntegerField(default=0, editable=False)
     is_active = models.BooleanField(default=True)
 
     provider_variant_id = models.CharField(
@@ -143,15 +462,54 @@ class ProductVariant(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ProductVariantQuerySet.as_manager()
+
     class Meta:
         ordering = ["sku"]
 
     def __str__(self):
         return f"{self.product.name} - {self.sku}"
 
+    def save(self, *args, **kwargs):
+        # `available` solo cambia con las reservas: el admin no lo pisa y,
+        # si cambió el stock, se recalcula después de guardar
+        adding = self._state.adding
+        if adding:
+            self.available = self.stock
+        elif kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "available"
+            ]
+        super().save(*args, **kwargs)
+        if not adding and "stock" in (kwargs.get("update_fields") or ()):
+            ProductVariant.refresh_available([self.pk])
+
+    @classmethod
+    def refresh_available(cls, variant_ids):
+        """
+        Recalcula available = stock - reservas activas en un solo UPDATE
+        (después de cambiar el stock a mano o con acciones del admin).
+        """
+        reservations = apps.get_model("app_orders", "CartReservation").objects
+        reserved = (
+            reservations
+            .filter(variant=OuterRef("pk"), is_active=True)
+            .values("variant")
+            .annotate(total=Sum("quantity"))
+            .values("total")
+        )
+        return cls.objects.filter(id__in=list(variant_ids)).update(
+            available=F("stock") - Coalesce(Subquery(reserved), 0)
+        )
+
     @property
     def main_image(self):
-        return self.images.filter(is_main=True).first() or self.images.first()
+        """Imagen principal (o la primera); en memoria si se hizo prefetch_related("images")"""
+        images = prefetched(self, "images")
+        if images is None:
+            return self.images.order_by("-is_main", "id").first()
+        return min(images, key=lambda image: (not image.is_main, image.id), default=None)
 
     @property
     def discount_percentage(self):
@@ -182,6 +540,7 @@ class ProductVariantImage(models.Model):
     )  # Variante asociada
 
     image_url = models.ImageField(upload_to="productos/", blank=True, null=True)
+    image_widths = models.JSONField(default=list, blank=True, editable=False)  # Anchos de sus copias (app_products/images.py)
     alt_text = models.CharField(max_length=200, blank=True)  # SEO / accesibilidad
     is_main = models.BooleanField(default=False)  # Imagen principal
 
@@ -190,10 +549,20 @@ class ProductVariantImage(models.Model):
 
     def __str__(self):
         return f"Imagen de {self.variant.sku}"
-    
+
+    def generate_derivatives(self):
+        """Genera las copias WebP/JPEG de la imagen y guarda sus anchos"""
+        widths = generate_derivatives(self.image_url.name, self.image_url.storage) if self.image_url else []
+        type(self).objects.filter(pk=self.pk).update(image_widths=widths)
+        self.image_widths = widths
+        return widths
+
     @property
     def main_image(self):
-        return self.images.order_by("-is_main").first()
+        """Imagen principal de la misma variante (puede ser esta misma)"""
+        if self.is_main:
+            return self
+        return self.variant.main_image
 
 
 
@@ -244,7 +613,467 @@ class CommentPublic(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Páginas de comentarios por cursor (más recientes primero)
+            models.Index(fields=["product", "-created_at", "-id"]),
+        ]
 
     def __str__(self):
         return f"{self.rating}★ - {self.name}"
 
+
+
+# ---------------------------
+#   RESUMEN PARA TARJETAS
+# ---------------------------
+
+class ProductCardSummary(models.Model):
+    """
+    Datos desnormalizados que pinta la tarjeta de producto (Card.html).
+    Se mantiene con señales (app_products/signals.py) y se reconstruye con
+    `python manage.py rebuild_card_summaries`.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="card_summary"
+    )
+
+    variant_id = models.BigIntegerField(null=True, blank=True)  # Primera variante activa
+    price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    discount_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    discount_percentage = models.PositiveSmallIntegerField(default=0)
+    in_stock = models.BooleanField(default=False)  # La variante tiene stock
+    image_url = models.CharField(max_length=500, blank=True)  # URL de la imagen principal
+    image_widths = models.JSONField(default=list, blank=True)  # Anchos de sus copias para el srcset
+
+    avg_rating = models.PositiveSmallIntegerField(default=0)  # Promedio redondeado (0-5)
+    comments_count = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Resumen de {self.product_id}"
+
+    @classmethod
+    def rebuild(cls, product_ids):
+        """Recalcula los resúmenes de los productos indicados"""
+        product_ids = set(product_ids)
+        # Rating ya acumulado en el producto (rating_sum / rating_count)
+        ratings = {
+            product_id: (rating_sum, rating_count)
+            for product_id, rating_sum, rating_count in (
+                Product.objects
+                .filter(id__in=product_ids)
+                .values_list("id", "rating_sum", "rating_count")
+            )
+        }
+        existing = set(ratings)
+        if not existing:
+            return 0
+
+        # Primera variante activa de cada producto (mismo orden que variants.first)
+        first_variants = {}
+        variants = (
+            ProductVariant.objects
+            .filter(product_id__in=existing, is_active=True)
+            .order_by("product_id", "sku")
+        )
+        for variant in variants:
+            first_variants.setdefault(variant.product_id, variant)
+
+        # Imagen principal de cada variante elegida
+        images = {}
+        variant_images = (
+            ProductVariantImage.objects
+            .filter(variant_id__in=[v.id for v in first_variants.values()])
+            .order_by("variant_id", "-is_main", "id")
+        )
+        for img in variant_images:
+            if img.image_url:
+                images.setdefault(img.variant_id, (img.image_url.url, img.image_widths))
+
+        summaries = []
+        for product_id in existing:
+            variant = first_variants.get(product_id)
+            rating_sum, rating_count = ratings[product_id]
+
+            summaries.append(cls(
+                product_id=product_id,
+                variant_id=variant.id if variant else None,
+                price=variant.price if variant else None,
+                discount_price=variant.discount_price if variant else None,
+                discount_percentage=variant.discount_percentage if variant else 0,
+                in_stock=bool(variant and variant.stock > 0),
+                image_url=images.get(variant.id, ("", []))[0] if variant else "",
+                image_widths=images.get(variant.id, ("", []))[1] if variant else [],
+                avg_rating=round(rating_sum / rating_count) if rating_count else 0,
+                comments_count=rating_count,
+            ))
+
+        upsert(
+            cls,
+            summaries,
+            unique_fields=["product"],
+            update_fields=[
+                "variant_id", "price", "discount_price", "discount_percentage",
+                "in_stock", "image_url", "image_widths", "avg_rating", "comments_count", "updated_at",
+            ],
+        )
+        return len(summaries)
+
+    @classmethod
+    def rebuild_all(cls, batch_size=500):
+        """Reconstruye todos los resúmenes por lotes"""
+        total = 0
+        ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+        for start in range(0, len(ids), batch_size):
+            # Los precios del producto salen de las mismas variantes
+            Product.refresh_prices(ids[start:start + batch_size])
+            total += cls.rebuild(ids[start:start + batch_size])
+        return total
+
+
+
+# ---------------------------
+#   MATRIZ DE VARIANTES (detalle)
+# ---------------------------
+
+def _json_number(value):
+    """Decimal -> número para JSON (entero si no tiene centavos)"""
+    if value is None:
+        return None
+    return int(value) if value == value.to_integral_value() else float(value)
+
+
+class ProductVariantMatrix(models.Model):
+    """
+    Documento JSON con todo lo que necesita el selector de variantes del
+    detalle: ejes de opciones, variantes (precio, stock, opciones e
+    imágenes), la combinación de opciones -> variante y la lista de
+    imágenes sin repetir. Se recalcula con señales al cambiar variantes,
+    imágenes u opciones (`python manage.py rebuild_variant_matrices`).
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="variant_matrix"
+    )
+    data = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Matriz de variantes de {self.product_id}"
+
+    @staticmethod
+    def combination_key(options):
+        """{"Color": "Rojo", "Medida": "M"} -> "Color=Rojo|Medida=M" (ordenado por eje)"""
+        return "|".join(f"{name}={value}" for name, value in sorted(options.items()))
+
+    @classmethod
+    def build(cls, product_ids):
+        """{product_id: documento} con 3 consultas para todos los productos"""
+        product_ids = set(product_ids)
+        variants = {}
+        for variant in (
+            ProductVariant.objects
+            .filter(product_id__in=product_ids, is_active=True)
+            .order_by("product_id", "sku")
+            .values("id", "product_id", "sku", "price", "discount_price", "stock")
+        ):
+            on_sale = bool(variant["discount_price"] and variant["price"])
+            variants[variant["id"]] = {
+                "product_id": variant["product_id"],
+                "id": variant["id"],
+                "sku": variant["sku"],
+                "price": _json_number(variant["price"]),
+                "discount_price": _json_number(variant["discount_price"]),
+                "discount_pct": (
+                    round((variant["price"] - variant["discount_price"]) / variant["price"] * 100)
+                    if on_sale else 0
+                ),
+                "stock": variant["stock"],
+                "options": {},
+                "images": [],
+            }
+
+        options = (
+            VariantOption.objects
+            .filter(variant_id__in=variants)
+            .order_by("option_value__option__name", "option_value_id")
+            .values("variant_id", "option_value__option__name", "option_value__value")
+        )
+        for row in options:
+            variants[row["variant_id"]]["options"][row["option_value__option__name"]] = row["option_value__value"]
+
+        images = (
+            ProductVariantImage.objects
+            .filter(variant_id__in=variants)
+            .exclude(image_url="")
+            .exclude(image_url__isnull=True)
+            .order_by("variant_id", "-is_main", "id")
+            .values("variant_id", "image_url", "image_widths", "alt_text", "is_main")
+        )
+        image_rows = {}
+        for row in images:
+            image_rows.setdefault(variants[row["variant_id"]]["product_id"], []).append(row)
+
+        storage = ProductVariantImage._meta.get_field("image_url").storage
+        documents = {product_id: {"axes": {}, "images": [], "variants": [], "combinations": {}} for product_id in product_ids}
+        for variant in variants.values():
+            document = documents[variant.pop("product_id")]
+            document["variants"].append(variant)
+            for name, value in variant["options"].items():
+                if value not in document["axes"].setdefault(name, []):
+                    document["axes"][name].append(value)
+            document["combinations"].setdefault(cls.combination_key(variant["options"]), variant["id"])
+
+        for product_id, rows in image_rows.items():
+            document = documents[product_id]
+            by_id = {variant["id"]: variant for variant in document["variants"]}
+            # Mismo orden que la galería: primero las principales, luego por URL
+            rows.sort(key=lambda row: (not row["is_main"], row["image_url"]))
+            positions = {}
+            for row in rows:
+                if row["image_url"] not in positions:
+                    positions[row["image_url"]] = len(document["images"])
+                    document["images"].append({
+                        "url": storage.url(row["image_url"]),
+                        "widths": row["image_widths"],
+                        "alt": row["alt_text"],
+                        "variant_id": row["variant_id"],
+                        "is_main": row["is_main"],
+                    })
+            # Imágenes de cada variante en su propio orden (principal primero)
+            for row in sorted(rows, key=lambda row: (row["variant_id"], not row["is_main"])):
+                position = positions[row["image_url"]]
+                if position not in by_id[row["variant_id"]]["images"]:
+                    by_id[row["variant_id"]]["images"].append(position)
+
+        for document in documents.values():
+            document["main_variant"] = document["variants"][0]["id"] if document["variants"] else None
+        return documents
+
+    @classmethod
+    def rebuild(cls, product_ids):
+        """Recalcula y guarda la matriz de los productos indicados"""
+        existing = set(Product.objects.filter(id__in=set(product_ids)).values_list("id", flat=True))
+        if not existing:
+            return 0
+        documents = cls.build(existing)
+        upsert(
+            cls,
+            [cls(product_id=product_id, data=data) for product_id, data in documents.items()],
+            unique_fields=["product"],
+            update_fields=["data", "updated_at"],
+        )
+        return len(documents)
+
+    @classmethod
+    def rebuild_all(cls, batch_size=500):
+        """Reconstruye todas las matrices por lotes"""
+        total = 0
+        ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+        for start in range(0, len(ids), batch_size):
+            total += cls.rebuild(ids[start:start + batch_size])
+        return total
+
+    @classmethod
+    def for_product(cls, product):
+        """Documento guardado, o calculado en el momento si todavía no existe"""
+        try:
+            return product.variant_matrix.data
+        except cls.DoesNotExist:
+            cls.rebuild([product.id])
+            return cls.objects.get(product=product).data
+
+
+
+
+# ---------------------------
+#   ÍNDICE DE BÚSQUEDA
+# ---------------------------
+
+class ProductSearchDocument(models.Model):
+    """
+    Texto normalizado (minúsculas, sin tildes) de cada producto para el
+    buscador. Según el motor la migración agrega encima un tsvector con
+    configuración 'spanish' + trigramas (PostgreSQL), una tabla FTS5
+    (SQLite) o un índice FULLTEXT (MySQL). Ver app_products/search.py.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document"
+    )
+
+    title = models.CharField(max_length=255)  # Nombre normalizado
+    body = models.TextField(blank=True)  # Descripciones, SKUs y valores de opciones
+
+    def __str__(self):
+        return self.title
+
+
+# ---------------------------
+#   FACETAS POR CATEGORÍA
+# ---------------------------
+
+class CategoryFacet(models.Model):
+    """
+    Lista de productos de una categoría que tienen un valor de faceta
+    (p.ej. Color: Rojo, rango de precio, con stock). Filtrar es intersectar
+    estas listas y el conteo "Rojo (12)" es el tamaño de la intersección.
+    Se mantiene con señales y con `python manage.py rebuild_category_facets`.
+    """
+    ALL = "all"  # Todos los productos listables de la categoría (no se muestra)
+    PRICE = "price"
+    STOCK = "stock"
+    OPTION_PREFIX = "option-"
+
+    # (clave, etiqueta, desde, hasta) en pesos; hasta=None es "o más"
+    PRICE_BUCKETS = [
+        ("0-50000", "Menos de $50.000", 0, 50000),
+        ("50000-100000", "$50.000 - $100.000", 50000, 100000),
+        ("100000-200000", "$100.000 - $200.000", 100000, 200000),
+        ("200000-", "Más de $200.000", 200000, None),
+    ]
+
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="facets"
+    )
+
+    facet = models.CharField(max_length=30)  # "all", "price", "stock" u "option-<id>"
+    facet_label = models.CharField(max_length=50, blank=True)  # Color, Precio...
+    value_key = models.CharField(max_length=50)  # Id del valor, rango o "1"
+    value_label = models.CharField(max_length=100, blank=True)  # Rojo, Con stock...
+    position = models.PositiveIntegerField(default=0)  # Orden visual
+
+    product_ids = models.JSONField(default=list)  # Ids ordenados
+    product_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("category", "facet", "value_key")
+        ordering = ["category", "facet", "position", "value_key"]
+
+    def __str__(self):
+        return f"{self.category_id} {self.facet}={self.value_label} ({self.product_count})"
+
+    @classmethod
+    def build(cls, category_ids):
+        """Facetas (sin guardar) de las categorías indicadas"""
+        products = dict(
+            Product.objects
+            .filter(category_id__in=category_ids, is_active=True, variants__is_active=True)
+            .distinct()
+            .values_list("id", "category_id")
+        )
+
+        postings = {}  # (category_id, facet, value_key) -> set(product_ids)
+        labels = {}  # (facet, value_key) -> (facet_label, value_label, position)
+
+        def add(product_id, facet, value_key, facet_label, value_label, position):
+            key = (products[product_id], facet, value_key)
+            postings.setdefault(key, set()).add(product_id)
+            labels[(facet, value_key)] = (facet_label, value_label, position)
+
+        for product_id in products:
+            add(product_id, cls.ALL, "", "", "", 0)
+
+        # Precio efectivo y stock de cada variante activa
+        variants = (
+            ProductVariant.objects
+            .filter(product_id__in=products, is_active=True)
+            .values_list("product_id", "price", "discount_price", "stock")
+        )
+        for product_id, price, discount_price, stock in variants:
+            effective = discount_price if discount_price else price
+            for position, (key, label, low, high) in enumerate(cls.PRICE_BUCKETS):
+                if effective >= low and (high is None or effective < high):
+                    add(product_id, cls.PRICE, key, "Precio", label, position)
+            if stock > 0:
+                add(product_id, cls.STOCK, "1", "Disponibilidad", "Con stock", 0)
+
+        # Valores de opción de las variantes activas (Color, Medida...)
+        options = (
+            VariantOption.objects
+            .filter(variant__product_id__in=products, variant__is_active=True)
+            .values_list(
+                "variant__product_id",
+                "option_value__option_id",
+                "option_value__option__name",
+                "option_value_id",
+                "option_value__value",
+                "option_value__order",
+            )
+            .distinct()
+        )
+        for product_id, option_id, option_name, value_id, value, order in options:
+            add(product_id, f"{cls.OPTION_PREFIX}{option_id}", str(value_id), option_name, value, order)
+
+        facets = []
+        for (category_id, facet, value_key), ids in postings.items():
+            facet_label, value_label, position = labels[(facet, value_key)]
+            facets.append(cls(
+                category_id=category_id,
+                facet=facet,
+                facet_label=facet_label,
+                value_key=value_key,
+                value_label=value_label,
+                position=position,
+                product_ids=sorted(ids),
+                product_count=len(ids),
+            ))
+        return facets
+
+    @classmethod
+    def rebuild(cls, category_ids):
+        """
+        Recalcula las facetas de las categorías indicadas. Las filas de las
+        categorías se bloquean para que dos recálculos simultáneos de la
+        misma categoría no se pisen; las facetas se actualizan con un upsert
+        y solo se borran las que ya no existen.
+        """
+        category_ids = sorted(set(category_ids))
+        if not category_ids:
+            return 0
+
+        with transaction.atomic():
+            list(Category.objects.select_for_update().filter(id__in=category_ids).order_by("id").values_list("id"))
+            facets = cls.build(category_ids)
+            upsert(
+                cls,
+                facets,
+                unique_fields=["category", "facet", "value_key"],
+                update_fields=["facet_label", "value_label", "position", "product_ids", "product_count"],
+                batch_size=500,
+            )
+
+            current = {}
+            for facet in facets:
+                current.setdefault(facet.category_id, []).append(Q(facet=facet.facet, value_key=facet.value_key))
+            for category_id in category_ids:
+                stale = cls.objects.filter(category_id=category_id)
+                if current.get(category_id):
+                    stale = stale.exclude(reduce(operator.or_, current[category_id]))
+                stale.delete()
+        return len(facets)
+
+    @classmethod
+    def rebuild_for_products(cls, product_ids):
+        """Recalcula las categorías de los productos indicados"""
+        category_ids = (
+            Product.objects
+            .filter(id__in=product_ids)
+            .values_list("category_id", flat=True)
+            .distinct()
+        )
+        return cls.rebuild(category_ids)
+
+    @classmethod
+    def rebuild_all(cls):
+        return cls.rebuild(Category.objects.values_list("id", flat=True))
@@ -0,0 +1,241 @@
+# app_products/search.py
+
+import math
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import strip_tags
+
+from app_products.models import (
+    Product,
+    ProductVariant,
+    VariantOption,
+    ProductSearchDocument,
+)
+from app_products.upsert import upsert
+
+MAX_CANDIDATES = 200  # Productos activos que se traen del índice antes de mezclar
+PRODUCT_TABLE = "app_products_product"
+
+# Peso de cada señal en el puntaje final (suman 1)
+RELEVANCE_WEIGHT = 0.7
+SALES_WEIGHT = 0.2
+RATING_WEIGHT = 0.1
+
+FTS_TABLE = "app_products_search_fts"  # Tabla FTS5 (solo SQLite)
+
+
+# ---------------------------
+#   NORMALIZACIÓN
+# ---------------------------
+
+def normalize_text(text):
+    """
+    Minúsculas y sin tildes ("Café" -> "cafe"), sin HTML y con espacios
+    simples. Se aplica igual al indexar y al buscar.
+    """
+    text = strip_tags(text or "")
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.lower().split())
+
+
+def query_terms(query):
+    """Palabras de la búsqueda, solo letras y números"""
+    return re.findall(r"\w+", normalize_text(query))
+
+
+# ---------------------------
+#   INDEXACIÓN
+# ---------------------------
+
+def index_products(product_ids):
+    """
+    Actualiza el documento de búsqueda de los productos indicados.
+    El índice del motor (tsvector, FTS5 o FULLTEXT) se mantiene solo en la
+    base de datos a partir de esta tabla.
+    """
+    product_ids = set(product_ids)
+    products = Product.objects.filter(id__in=product_ids).only(
+        "id", "name", "description_short", "description_long"
+    )
+
+    skus = {}
+    for product_id, sku in (
+        ProductVariant.objects
+        .filter(product_id__in=product_ids, is_active=True)
+        .values_list("product_id", "sku")
+    ):
+        skus.setdefault(product_id, []).append(sku)
+
+    option_values = {}
+    for product_id, value in (
+        VariantOption.objects
+        .filter(variant__product_id__in=product_ids, variant__is_active=True)
+        .values_list("variant__product_id", "option_value__value")
+        .distinct()
+    ):
+        option_values.setdefault(product_id, []).append(value)
+
+    documents = [
+        ProductSearchDocument(
+            product_id=product.id,
+            title=normalize_text(product.name),
+            body=normalize_text(" ".join([
+                product.description_short,
+                product.description_long,
+                " ".join(skus.get(product.id, [])),
+                " ".join(option_values.get(product.id, [])),
+            ])),
+        )
+        for product in products
+    ]
+
+    upsert(
+        ProductSearchDocument,
+        documents,
+        unique_fields=["product"],
+        update_fields=["title", "body"],
+    )
+    return len(documents)
+
+
+def rebuild_index(batch_size=500):
+    """Reindexa todo el catálogo por lotes"""
+    total = 0
+    ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(ids), batch_size):
+        total += index_products(ids[start:start + batch_size])
+    return total
+
+
+# ---------------------------
+#   CONSULTA POR MOTOR
+# ---------------------------
+
+# Cada motor filtra is_active con un JOIN antes del LIMIT: si el corte se
+# hiciera primero, los inactivos ocuparían cupos y se perderían resultados.
+
+def _match_postgresql(terms, raw_query, limit):
+    # Prefijos con la configuración 'spanish' + similitud de trigramas
+    # sobre el nombre para tolerar errores de tipeo
+    tsquery = " & ".join(f"{term}:*" for term in terms)
+    sql = f"""
+        SELECT doc.product_id,
+               ts_rank(doc.search_vector, to_tsquery('spanish', %s))
+               + similarity(doc.title, %s) AS rank
+        FROM app_products_productsearchdocument doc
+        JOIN {PRODUCT_TABLE} p ON p.id = doc.product_id
+        WHERE p.is_active
+          AND (doc.search_vector @@ to_tsquery('spanish', %s)
+               OR doc.title %% %s)
+        ORDER BY rank DESC, doc.product_id
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [tsquery, raw_query, tsquery, raw_query, limit])
+        return cursor.fetchall()
+
+
+def _match_sqlite(terms, raw_query, limit):
+    # bm25 devuelve valores negativos: más negativo = más relevante.
+    # El nombre pesa 10 veces más que el cuerpo.
+    match = " ".join(f'"{term}"*' for term in terms)
+    sql = f"""
+        SELECT {FTS_TABLE}.rowid, -bm25({FTS_TABLE}, 10.0, 1.0) AS rank
+        FROM {FTS_TABLE}
+        JOIN {PRODUCT_TABLE} p ON p.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s
+          AND p.is_active
+        ORDER BY rank DESC, {FTS_TABLE}.rowid
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, limit])
+        return cursor.fetchall()
+
+
+def _match_mysql(terms, raw_query, limit):
+    against = " ".join(f"+{term}*" for term in terms)
+    sql = f"""
+        SELECT doc.product_id,
+               MATCH(doc.title, doc.body) AGAINST (%s IN BOOLEAN MODE) AS rank_score
+        FROM app_products_productsearchdocument doc
+        JOIN {PRODUCT_TABLE} p ON p.id = doc.product_id
+        WHERE MATCH(doc.title, doc.body) AGAINST (%s IN BOOLEAN MODE)
+          AND p.is_active
+        ORDER BY rank_score DESC, doc.product_id
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [against, against, limit])
+        return cursor.fetchall()
+
+
+def _match_fallback(terms, raw_query, limit):
+    # Otros motores: coincidencia simple sobre el texto ya normalizado
+    condition = Q(product__is_active=True)
+    for term in terms:
+        condition &= Q(title__contains=term) | Q(body__contains=term)
+    rows = (
+        ProductSearchDocument.objects
+        .filter(condition)
+        .order_by("product_id")
+        .values_list("product_id", "title")[:limit]
+    )
+    return [
+        (product_id, 2.0 if all(term in title for term in terms) else 1.0)
+        for product_id, title in rows
+    ]
+
+
+MATCHERS = {
+    "postgresql": _match_postgresql,
+    "sqlite": _match_sqlite,
+    "mysql": _match_mysql,
+}
+
+
+# ---------------------------
+#   RANKING
+# ---------------------------
+
+def rank_products(query, limit=MAX_CANDIDATES):
+    """
+    Devuelve [(puntaje, product_id), ...] de productos activos, de mayor a
+    menor. El puntaje mezcla la relevancia del motor con las ventas y el
+    rating del producto.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+
+    matcher = MATCHERS.get(connection.vendor, _match_fallback)
+    matches = {product_id: float(rank or 0) for product_id, rank in matcher(terms, normalize_text(query), limit)}
+    if not matches:
+        return []
+
+    stats = list(
+        Product.objects
+        .filter(id__in=matches, is_active=True)
+        .values_list("id", "sales_count", "card_summary__avg_rating")
+    )
+    if not stats:
+        return []
+
+    max_relevance = max(matches.values()) or 1.0
+    max_sales = math.log1p(max(sales for _, sales, _ in stats)) or 1.0
+
+    ranking = []
+    for product_id, sales, rating in stats:
+        score = (
+            RELEVANCE_WEIGHT * matches[product_id] / max_relevance
+            + SALES_WEIGHT * math.log1p(sales) / max_sales
+            + RATING_WEIGHT * (rating or 0) / 5
+        )
+        ranking.append((round(score, 6), product_id))
+
+    ranking.sort(key=lambda item: (-item[0], item[1]))
+    return ranking
@@ -0,0 +1,360 @@
+# app_products/signals.py
+
+from asgiref.local import Local
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from app_products.models import (
+    Category,
+    Product,
+    ProductVariant,
+    ProductVariantImage,
+    VariantOption,
+    OptionValue,
+    CommentPublic,
+    ProductCardSummary,
+    ProductVariantMatrix,
+    CategoryFacet,
+)
+from app_products.search import index_products
+from app_products.versions import CATALOG, CATEGORIES, bump_version, product_key
+
+
+# ---------------------------
+#   RECÁLCULOS AL CONFIRMAR
+# ---------------------------
+# Cada señal solo anota ids; al confirmar corre un recálculo por tipo con
+# todos los ids de la transacción (un guardado del admin con N inlines hace
+# un resumen, una matriz, un reindexado... no N). Se ejecutan en este orden:
+# las copias de imágenes primero (los resúmenes leen sus anchos), las
+# tarjetas de categoría después del resumen (de ahí sale la imagen) y las
+# versiones al final, cuando todo lo desnormalizado ya está al día.
+STEP_ORDER = ("derivatives", "prices", "summaries", "matrices", "index", "facets", "tiles", "versions")
+
+# Recálculos pendientes de la transacción en curso de este hilo:
+# {nombre: (callback, {parámetro: set(ids)})}. Los vacía el primer callback
+# que corre al confirmar.
+_pending = Local()
+
+
+def on_commit_once(name, callback, **ids):
+    """
+    Programa `callback(**ids)` al confirmar, una sola vez por transacción:
+    las llamadas siguientes con el mismo nombre solo suman sus ids (un
+    guardado masivo en el admin hace un único recálculo).
+    """
+    pending = getattr(_pending, "steps", None)
+    if pending is None:
+        pending = _pending.steps = {}
+    _, values = pending.setdefault(name, (callback, {}))
+    for key, new_ids in ids.items():
+        values.setdefault(key, set()).update(new_ids)
+    # Cada llamada registra _run_pending: si un savepoint se deshace se pierde
+    # solo su registro y las demás siguen vaciando la lista al confirmar.
+    # Los ids de lo deshecho se recalculan igual (ya no cambian nada).
+    transaction.on_commit(_run_pending)
+
+
+def _run_pending():
+    """Ejecuta y vacía los recálculos acumulados (los siguientes registros no hacen nada)"""
+    pending = getattr(_pending, "steps", None) or {}
+    _pending.steps = {}
+    position = {name: index for index, name in enumerate(STEP_ORDER)}
+    for name in sorted(pending, key=lambda name: position.get(name, len(STEP_ORDER))):
+        callback, values = pending[name]
+        callback(**values)
+
+
+def _present(ids):
+    return [value for value in ids if value]
+
+
+def _generate_derivatives(image_ids=(), category_ids=()):
+    for image in ProductVariantImage.objects.filter(id__in=image_ids):
+        image.generate_derivatives()
+    for category in Category.objects.filter(id__in=category_ids):
+        category.generate_derivatives()
+
+
+def _refresh_prices(product_ids=()):
+    Product.refresh_prices(product_ids)
+
+
+def _rebuild_summaries(product_ids=()):
+    ProductCardSummary.rebuild(product_ids)
+
+
+def _rebuild_matrices(product_ids=()):
+    ProductVariantMatrix.rebuild(product_ids)
+
+
+def _reindex(product_ids=()):
+    index_products(product_ids)
+
+
+def _rebuild_facets(product_ids=(), category_ids=()):
+    category_ids = set(category_ids)
+    if product_ids:
+        category_ids.update(
+            Product.objects.filter(id__in=product_ids).values_list("category_id", flat=True)
+        )
+    CategoryFacet.rebuild(category_id for category_id in category_ids if category_id)
+
+
+def _refresh_tiles(product_ids=(), category_ids=()):
+    if Category.refresh_tiles_for_products(product_ids, category_ids):
+        bump_version(CATEGORIES)
+
+
+def _bump_versions(names=()):
+    # updated_at de cada producto: de ahí salen su ETag y Last-Modified (app_store/conditional.py)
+    prefix = product_key("")
+    Product.touch(name[len(prefix):] for name in names if name.startswith(prefix))
+    bump_version(*sorted(names))
+
+
+def bump_versions(*names):
+    """Sube las versiones indicadas al confirmar (una vez cada una)"""
+    on_commit_once("versions", _bump_versions, names=names)
+
+
+def bump_catalog():
+    """Invalida las cachés que dependen de la versión del catálogo"""
+    bump_versions(CATALOG)
+
+
+def refresh_product(product_id):
+    """
+    Programa el recálculo de los datos desnormalizados del producto.
+    Se ejecuta al confirmar la transacción para no leer datos a medias
+    (por ejemplo, mientras el admin guarda los inlines).
+    """
+    if product_id:
+        on_commit_once("summaries", _rebuild_summaries, product_ids=[product_id])
+        bump_versions(product_key(product_id))
+    bump_catalog()
+
+
+def refresh_facets(product_ids=(), category_ids=()):
+    """Recalcula las facetas de las categorías afectadas al confirmar"""
+    product_ids = _present(product_ids)
+    category_ids = _present(category_ids)
+    if product_ids or category_ids:
+        on_commit_once("facets", _rebuild_facets, product_ids=product_ids, category_ids=category_ids)
+
+
+def refresh_category_tiles(product_ids=(), category_ids=()):
+    """Recalcula contador e imagen de las tarjetas de categoría al confirmar"""
+    product_ids = _present(product_ids)
+    category_ids = _present(category_ids)
+    if product_ids or category_ids:
+        on_commit_once("tiles", _refresh_tiles, product_ids=product_ids, category_ids=category_ids)
+
+
+def refresh_prices(product_ids):
+    """Recalcula las columnas de precio y oferta del producto al confirmar"""
+    product_ids = _present(product_ids)
+    if product_ids:
+        on_commit_once("prices", _refresh_prices, product_ids=product_ids)
+
+
+def refresh_variant_matrix(product_ids):
+    """Recalcula la matriz de variantes del detalle y sube la versión del producto"""
+    product_ids = _present(product_ids)
+    if product_ids:
+        on_commit_once("matrices", _rebuild_matrices, product_ids=product_ids)
+        bump_versions(*[product_key(product_id) for product_id in product_ids])
+
+
+def reindex_products(product_ids):
+    """Actualiza el documento de búsqueda al confirmar la transacción"""
+    product_ids = _present(product_ids)
+    if product_ids:
+        on_commit_once("index", _reindex, product_ids=product_ids)
+
+
+def generate_derivatives(image_ids=(), category_ids=()):
+    """Genera las copias WebP/JPEG al confirmar, antes de los demás recálculos (tarda)"""
+    on_commit_once("derivatives", _generate_derivatives, image_ids=image_ids, category_ids=category_ids)
+
+
+def previous_file(sender, instance, field_name):
+    """Nombre del archivo guardado antes de este save (None si es nuevo)"""
+    if not instance.pk:
+        return None
+    return sender.objects.filter(pk=instance.pk).values_list(field_name, flat=True).first()
+
+
+def file_changed(instance, field_name, created):
+    """True si este save subió, cambió o quitó el archivo del campo"""
+    name = getattr(instance, field_name).name or None
+    previous = getattr(instance, "_previous_file", None)
+    return (created and name is not None) or (not created and name != previous)
+
+
+# ---------------------------
+#   CATEGORÍAS
+# ---------------------------
+
+# Redimensionar tarda: las copias se generan al confirmar, fuera de la
+# transacción (ver STEP_ORDER)
+@receiver(pre_save, sender=Category)
+def category_saving(sender, instance, **kwargs):
+    instance._previous_file = previous_file(sender, instance, "imagen_category")
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    if file_changed(instance, "imagen_category", created):
+        generate_derivatives(category_ids=[instance.id])
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    bump_versions(CATEGORIES, CATALOG)
+
+
+# ---------------------------
+#   PRODUCTOS
+# ---------------------------
+
+@receiver(pre_save, sender=Product)
+def product_saving(sender, instance, **kwargs):
+    # Si cambia de categoría también hay que recalcular la anterior
+    instance._previous_category_id = (
+        Product.objects
+        .filter(id=instance.id)
+        .values_list("category_id", flat=True)
+        .first()
+    ) if instance.id else None
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    refresh_product(instance.id)
+    reindex_products([instance.id])
+    refresh_facets(
+        category_ids={instance.category_id, getattr(instance, "_previous_category_id", None)}
+    )
+    refresh_category_tiles(
+        [instance.id], category_ids=[getattr(instance, "_previous_category_id", None)]
+    )
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    # Que la última modificación del catálogo avance aunque el borrado fuera lo más nuevo
+    Category.touch([instance.category_id])
+    refresh_facets(category_ids=[instance.category_id])
+    refresh_category_tiles(category_ids=[instance.category_id])
+    bump_catalog()
+
+
+# ---------------------------
+#   VARIANTES E IMÁGENES
+# ---------------------------
+
+@receiver([post_save, post_delete], sender=ProductVariant)
+def variant_changed(sender, instance, **kwargs):
+    refresh_prices([instance.product_id])
+    refresh_variant_matrix([instance.product_id])
+    refresh_product(instance.product_id)
+    reindex_products([instance.product_id])
+    refresh_facets([instance.product_id])
+    refresh_category_tiles([instance.product_id])
+
+
+@receiver(pre_save, sender=ProductVariantImage)
+def variant_image_saving(sender, instance, **kwargs):
+    instance._previous_file = previous_file(sender, instance, "image_url")
+
+
+@receiver(post_save, sender=ProductVariantImage)
+def variant_image_saved(sender, instance, created, **kwargs):
+    if file_changed(instance, "image_url", created):
+        generate_derivatives(image_ids=[instance.id])
+
+
+@receiver([post_save, post_delete], sender=ProductVariantImage)
+def variant_image_changed(sender, instance, **kwargs):
+    product_id = (
+        ProductVariant.objects
+        .filter(id=instance.variant_id)
+        .values_list("product_id", flat=True)
+        .first()
+    )
+    refresh_variant_matrix([product_id])
+    refresh_product(product_id)
+    refresh_category_tiles([product_id])
+
+
+# ---------------------------
+#   OPCIONES (búsqueda y facetas por color, talla...)
+# ---------------------------
+
+@receiver([post_save, post_delete], sender=VariantOption)
+def variant_option_changed(sender, instance, **kwargs):
+    product_id = (
+        ProductVariant.objects
+        .filter(id=instance.variant_id)
+        .values_list("product_id", flat=True)
+        .first()
+    )
+    reindex_products([product_id])
+    refresh_facets([product_id])
+    refresh_variant_matrix([product_id])
+    bump_catalog()
+
+
+@receiver(post_save, sender=OptionValue)
+def option_value_saved(sender, instance, **kwargs):
+    product_ids = list(
+        VariantOption.objects
+        .filter(option_value=instance)
+        .values_list("variant__product_id", flat=True)
+        .distinct()
+    )
+    reindex_products(product_ids)
+    refresh_facets(product_ids)
+    refresh_variant_matrix(product_ids)
+    bump_catalog()
+
+
+@receiver(post_delete, sender=OptionValue)
+def option_value_deleted(sender, instance, **kwargs):
+    bump_catalog()
+
+
+# ---------------------------
+#   COMENTARIOS
+# ---------------------------
+
+@receiver(pre_save, sender=CommentPublic)
+def comment_saving(sender, instance, **kwargs):
+    # Calificación anterior, por si el admin la edita
+    instance._previous_rating = (
+        CommentPublic.objects
+        .filter(id=instance.id)
+        .values_list("product_id", "rating")
+        .first()
+    ) if instance.id else None
+
+
+@receiver(post_save, sender=CommentPublic)
+def comment_saved(sender, instance, created, **kwargs):
+    # Mismo UPDATE dentro de la transacción del comentario (F(), sin carreras)
+    previous = getattr(instance, "_previous_rating", None)
+    if created or previous is None:
+        Product.apply_rating(instance.product_id, instance.rating, 1)
+    elif previous != (instance.product_id, instance.rating):
+        Product.apply_rating(previous[0], previous[1], -1)
+        Product.apply_rating(instance.product_id, instance.rating, 1)
+        refresh_product(previous[0])
+    refresh_product(instance.product_id)
+
+
+@receiver(post_delete, sender=CommentPublic)
+def comment_deleted(sender, instance, **kwargs):
+    Product.apply_rating(instance.product_id, instance.rating, -1)
+    refresh_product(instance.product_id)
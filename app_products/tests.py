@@ -1,3 +1,750 @@
-from django.test import TestCase
+import io
+import re
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from app_products.models import (
+    Category,
+    CategoryFacet,
+    CommentPublic,
+    Option,
+    OptionValue,
+    Product,
+    ProductCardSummary,
+    ProductSearchDocument,
+    ProductVariant,
+    ProductVariantImage,
+    ProductVariantMatrix,
+    VariantOption,
+)
+from app_products.api import QUERY_BUDGETS
+from app_products.images import derivative_name, derivative_url, generate_derivatives, srcset, thumbnail_url
+from app_products.search import index_products
+from app_products.signals import on_commit_once
+from app_products.typeahead import MAX_SCAN, PrefixIndex
+
+
+class CategoryFacetSignalTests(TestCase):
+    """Los conteos de las facetas siguen a los cambios de variantes y opciones"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Tazas", slug="tazas")
+        color = Option.objects.create(name="Color")
+        self.rojo = OptionValue.objects.create(option=color, value="Rojo")
+        self.azul = OptionValue.objects.create(option=color, value="Azul")
+        self.color_facet = f"{CategoryFacet.OPTION_PREFIX}{color.id}"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.variants = []
+            for i in range(3):
+                product = Product.objects.create(name=f"Taza {i}", slug=f"taza-{i}", category=self.category)
+                variant = ProductVariant.objects.create(product=product, sku=f"TAZA-{i}", price=40000, stock=5)
+                VariantOption.objects.create(variant=variant, option_value=self.rojo)
+                self.variants.append(variant)
+
+    def counts(self):
+        return {
+            (facet, value_key): count
+            for facet, value_key, count in CategoryFacet.objects
+            .filter(category=self.category)
+            .values_list("facet", "value_key", "product_count")
+        }
+
+    def test_conteos_iniciales(self):
+        counts = self.counts()
+        self.assertEqual(counts[(CategoryFacet.ALL, "")], 3)
+        self.assertEqual(counts[(self.color_facet, str(self.rojo.id))], 3)
+        self.assertEqual(counts[(CategoryFacet.PRICE, "0-50000")], 3)
+        self.assertEqual(counts[(CategoryFacet.STOCK, "1")], 3)
+
+    def test_cambiar_opcion_de_una_variante(self):
+        variant_option = VariantOption.objects.get(variant=self.variants[0])
+        variant_option.option_value = self.azul
+        with self.captureOnCommitCallbacks(execute=True):
+            variant_option.save()
+        counts = self.counts()
+        self.assertEqual(counts[(self.color_facet, str(self.rojo.id))], 2)
+        self.assertEqual(counts[(self.color_facet, str(self.azul.id))], 1)
+
+    def test_precio_y_stock_de_una_variante(self):
+        variant = self.variants[1]
+        variant.price, variant.stock = 120000, 0
+        with self.captureOnCommitCallbacks(execute=True):
+            variant.save()
+        counts = self.counts()
+        self.assertEqual(counts[(CategoryFacet.PRICE, "0-50000")], 2)
+        self.assertEqual(counts[(CategoryFacet.PRICE, "100000-200000")], 1)
+        self.assertEqual(counts[(CategoryFacet.STOCK, "1")], 2)
+
+    def test_valor_sin_productos_se_borra(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for variant in self.variants:
+                variant.is_active = False
+                variant.save()
+        self.assertEqual(self.counts(), {})
+
+    def test_un_solo_recalculo_por_transaccion(self):
+        with mock.patch.object(CategoryFacet, "rebuild") as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                for variant in self.variants:
+                    variant.stock = 0
+                    variant.save()
+        rebuild.assert_called_once()
+        self.assertIn(self.category.id, set(rebuild.call_args.args[0]))
+
+
+
+class OnCommitOnceTests(TestCase):
+    """Un recálculo por transacción con los ids de todas las llamadas"""
+
+    def setUp(self):
+        self.calls = []
+
+    def schedule(self, *ids):
+        on_commit_once("prueba", lambda ids: self.calls.append(ids), ids=ids)
+
+    def test_suma_los_ids(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.schedule(1)
+            self.schedule(2, 3)
+        self.assertEqual(self.calls, [{1, 2, 3}])
+
+    def test_sigue_funcionando_despues_de_un_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.schedule(1)
+                    raise ValueError
+            except ValueError:
+                pass
+            self.schedule(2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.schedule(3)
+        # Lo deshecho se recalcula de más, nunca de menos
+        self.assertEqual(self.calls, [{1, 2}, {3}])
+
+
+
+class AdminInlineSaveTests(TestCase):
+    """Guardar un producto con N variantes en el admin recalcula una vez por tipo, no N"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "clave"))
+        self.category = Category.objects.create(name="Tazas", slug="tazas")
+
+    def save_product(self, slug, variants):
+        data = {
+            "name": slug, "slug": slug, "category": self.category.id,
+            "description_short": "", "description_long": "", "warranty": "",
+            "is_active": "True", "sales_count": 0,
+            "variants-TOTAL_FORMS": variants, "variants-INITIAL_FORMS": 0,
+            "variants-MIN_NUM_FORMS": 0, "variants-MAX_NUM_FORMS": 1000,
+        }
+        for i in range(variants):
+            data.update({
+                f"variants-{i}-sku": f"{slug}-{i}", f"variants-{i}-price": 10000 + i,
+                f"variants-{i}-stock": 5, f"variants-{i}-is_active": "on",
+            })
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse("admin:app_products_product_add"), data)
+        self.assertEqual(response.status_code, 302)
+        return callbacks
+
+    def run_callbacks(self, callbacks):
+        with CaptureQueriesContext(connection) as queries:
+            for callback in callbacks:
+                callback()
+        return len(queries)
+
+    def test_mismas_consultas_con_mas_variantes(self):
+        few = self.run_callbacks(self.save_product("taza", 2))
+        many = self.save_product("plato", 8)
+        with self.assertNumQueries(few):
+            for callback in many:
+                callback()
+        product = Product.objects.get(slug="plato")
+        self.assertEqual(ProductCardSummary.objects.get(product=product).price, 10000)
+        self.assertEqual(len(ProductVariantMatrix.objects.get(product=product).data["variants"]), 8)
+
+
+class ProductRatingTests(TestCase):
+    """Las calificaciones acumuladas se ajustan con F() al crear, editar y borrar comentarios"""
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Taza", slug="taza")
+        self.other = Product.objects.create(name="Plato", slug="plato")
+
+    def comment(self, rating, product=None):
+        return CommentPublic.objects.create(product=product or self.product, name="Ana", comment="Bien", rating=rating)
+
+    def ratings(self, product=None):
+        return Product.objects.filter(id=(product or self.product).id).values(*Product.RATING_FIELDS).get()
+
+    def assertMatchesRebuild(self):
+        expected = {product.id: self.ratings(product) for product in (self.product, self.other)}
+        Product.rebuild_ratings()
+        self.assertEqual({product.id: self.ratings(product) for product in (self.product, self.other)}, expected)
+
+    def test_crear(self):
+        self.comment(5)
+        self.comment(3)
+        ratings = self.ratings()
+        self.assertEqual((ratings["rating_sum"], ratings["rating_count"]), (8, 2))
+        self.assertEqual((ratings["rating_5"], ratings["rating_3"]), (1, 1))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.avg_rating, 4)
+
+    def test_editar_calificacion(self):
+        comment = self.comment(2)
+        comment.rating = 4
+        comment.save()
+        ratings = self.ratings()
+        self.assertEqual((ratings["rating_sum"], ratings["rating_count"]), (4, 1))
+        self.assertEqual((ratings["rating_2"], ratings["rating_4"]), (0, 1))
+        self.assertMatchesRebuild()
+
+    def test_editar_sin_cambiar_calificacion(self):
+        comment = self.comment(4)
+        comment.comment = "Muy bien"
+        comment.save()
+        self.assertEqual(self.ratings()["rating_count"], 1)
+
+    def test_mover_a_otro_producto(self):
+        comment = self.comment(5)
+        comment.product = self.other
+        comment.save()
+        self.assertEqual(self.ratings()["rating_count"], 0)
+        self.assertEqual(self.ratings(self.other)["rating_sum"], 5)
+        self.assertMatchesRebuild()
+
+    def test_borrar(self):
+        self.comment(5)
+        self.comment(1).delete()
+        ratings = self.ratings()
+        self.assertEqual((ratings["rating_sum"], ratings["rating_count"], ratings["rating_1"]), (5, 1, 0))
+        self.assertMatchesRebuild()
+
+    def test_guardar_producto_desactualizado_no_pisa_calificaciones(self):
+        stale = Product.objects.get(id=self.product.id)
+        self.comment(5)
+        stale.name = "Taza grande"
+        stale.save()
+        self.assertEqual(self.ratings()["rating_count"], 1)
+
+
+class MySQLUpsertTests(TestCase):
+    """
+    Sin ON CONFLICT (columnas), como en MySQL: las tablas desnormalizadas se
+    crean y se actualizan igual.
+    """
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Tazas", slug="tazas")
+        self.product = Product.objects.create(name="Taza", slug="taza", category=self.category)
+        self.variant = ProductVariant.objects.create(product=self.product, sku="TAZA-1", price=40000, stock=5)
+        patcher = mock.patch.object(connection.features, "supports_update_conflicts_with_target", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_resumen_de_tarjeta(self):
+        ProductCardSummary.rebuild([self.product.id])
+        ProductVariant.objects.filter(id=self.variant.id).update(price=45000, stock=0)
+        ProductCardSummary.rebuild([self.product.id])
+        summary = ProductCardSummary.objects.get(product=self.product)
+        self.assertEqual((summary.price, summary.in_stock), (45000, False))
+
+    def test_documento_de_busqueda(self):
+        index_products([self.product.id])
+        Product.objects.filter(id=self.product.id).update(name="Taza Café")
+        index_products([self.product.id])
+        self.assertEqual(ProductSearchDocument.objects.get(product=self.product).title, "taza cafe")
+
+    def test_matriz_de_variantes(self):
+        ProductVariantMatrix.rebuild([self.product.id])
+        ProductVariant.objects.create(product=self.product, sku="TAZA-2", price=42000, stock=1)
+        ProductVariantMatrix.rebuild([self.product.id])
+        data = ProductVariantMatrix.objects.get(product=self.product).data
+        self.assertEqual(len(data["variants"]), 2)
+
+    def test_facetas(self):
+        CategoryFacet.rebuild([self.category.id])
+        ProductVariant.objects.filter(id=self.variant.id).update(stock=0)
+        CategoryFacet.rebuild([self.category.id])
+        facets = set(CategoryFacet.objects.filter(category=self.category).values_list("facet", "product_count"))
+        self.assertEqual(facets, {(CategoryFacet.ALL, 1), (CategoryFacet.PRICE, 1)})
+
+
+class CatalogApiTests(TestCase):
+    """Cada endpoint cumple el presupuesto de consultas publicado en /api/v1/"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Tazas", slug="tazas")
+        other = Category.objects.create(name="Platos", slug="platos")
+        cls.products = []
+        for i in range(5):
+            product = Product.objects.create(name=f"Taza {i}", slug=f"taza-{i}", category=cls.category)
+            ProductVariant.objects.create(product=product, sku=f"TAZA-{i}", price=10000 + i, stock=0 if i == 4 else 5)
+            cls.products.append(product)
+        plato = Product.objects.create(name="Plato", slug="plato", category=other)
+        ProductVariant.objects.create(product=plato, sku="PLATO-1", price=9000, stock=5)
+        cls.inactive = Product.objects.create(name="Vieja", slug="vieja", category=cls.category, is_active=False)
+
+    def setUp(self):
+        # Resúmenes, matrices y tarjetas de categoría como quedan tras confirmar
+        ids = [product.id for product in Product.objects.all()]
+        ProductCardSummary.rebuild(ids)
+        ProductVariantMatrix.rebuild(ids)
+        Category.refresh_tiles_for_products(ids, [])
+
+    def get(self, name, budget, *args, **params):
+        with self.assertNumQueries(QUERY_BUDGETS[budget]):
+            response = self.client.get(reverse(name, args=args), params)
+        return response
+
+    def test_indice_publica_los_presupuestos(self):
+        endpoints = self.client.get(reverse("api_index")).json()["endpoints"]
+        self.assertEqual({name: endpoint["query_budget"] for name, endpoint in endpoints.items()}, QUERY_BUDGETS)
+
+    def test_categorias(self):
+        response = self.get("api_categories", "categories")
+        counts = {row["slug"]: row["products"] for row in response.json()["results"]}
+        self.assertEqual(counts, {"platos": 1, "tazas": 5})
+
+    def test_productos_por_cursor_con_filtros(self):
+        ids = []
+        response = self.get("api_products", "products", categoria="tazas", stock="1", limite=3)
+        while True:
+            data = response.json()
+            ids += [row["id"] for row in data["results"]]
+            if not data["next"]:
+                break
+            with self.assertNumQueries(QUERY_BUDGETS["products"]):
+                response = self.client.get(data["next"])
+        expected = [product.id for product in reversed(self.products[:4])]
+        self.assertEqual(ids, expected)
+
+    def test_productos_con_cursor_invalido(self):
+        first = self.get("api_products", "products", limite=2).json()["results"]
+        response = self.get("api_products", "products", limite=2, after="no-es-un-cursor")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], first)
+
+    def test_detalle(self):
+        product = self.products[0]
+        data = self.get("api_product_detail", "product_detail", product.id).json()
+        self.assertEqual((data["id"], data["category"]["slug"]), (product.id, "tazas"))
+        self.assertEqual([variant["sku"] for variant in data["variants"]], ["TAZA-0"])
+
+    def test_304_con_el_mismo_etag(self):
+        url = reverse("api_product_detail", args=[self.products[0].id])
+        etag = self.get("api_product_detail", "product_detail", self.products[0].id)["ETag"]
+        # Solo la consulta de los validadores, con o sin caché compartida
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_200_tras_editar_en_el_admin(self):
+        product = self.products[0]
+        variant = product.variants.get()
+        Product.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        url = reverse("api_product_detail", args=[product.id])
+        etag = self.client.get(url)["ETag"]
+
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "clave"))
+        data = {
+            "name": product.name, "slug": product.slug, "category": self.category.id,
+            "description_short": "", "description_long": "", "warranty": "",
+            "is_active": "True", "sales_count": 0,
+            "variants-TOTAL_FORMS": 1, "variants-INITIAL_FORMS": 1,
+            "variants-MIN_NUM_FORMS": 0, "variants-MAX_NUM_FORMS": 1000,
+            "variants-0-id": variant.id, "variants-0-product": product.id,
+            "variants-0-sku": variant.sku, "variants-0-price": 15000,
+            "variants-0-stock": 5, "variants-0-is_active": "on",
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("admin:app_products_product_change", args=[product.id]), data)
+        self.assertEqual(response.status_code, 302)
+        self.client.logout()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["variants"][0]["price"], 15000)
+
+    def test_detalle_inexistente_o_inactivo(self):
+        for product_id in (self.inactive.id, 999999):
+            response = self.client.get(reverse("api_product_detail", args=[product_id]))
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.json(), {"error": "Producto no encontrado"})
+
+
+class TypeaheadTests(SimpleTestCase):
+    """Con más de MAX_SCAN coincidencias las sugerencias siguen siendo las más vendidas"""
+
+    def setUp(self):
+        entries = [(f"Taza modelo {i:04d}", "producto", f"/taza-{i}/", 0) for i in range(MAX_SCAN + 100)]
+        entries += [
+            ("Taza zafiro", "producto", "/taza-zafiro/", 50),
+            ("Tapete", "producto", "/tapete/", 10),
+            ("Tazas", "categoria", "/tazas/", 0),
+        ]
+        self.index = PrefixIndex(entries, version=1)
+
+    def labels(self, query, limit=3):
+        return [row["label"] for row in self.index.search(query, limit)]
+
+    def test_prefijo_con_muchas_coincidencias(self):
+        self.assertEqual(self.labels("taz"), ["Tazas", "Taza zafiro", "Taza modelo 0000"])
+        self.assertEqual(self.labels("ta"), ["Tazas", "Taza zafiro", "Tapete"])
+
+    def test_otras_palabras_fuera_del_top(self):
+        self.assertEqual(self.labels("modelo 0399"), ["Taza modelo 0399"])
+        self.assertEqual(self.labels("taza zaf"), ["Taza zafiro"])
+
+    def test_prefijo_con_pocas_coincidencias(self):
+        self.assertEqual(self.labels("tap"), ["Tapete"])
+        self.assertEqual(self.labels("xyz"), [])
+
+
+class CommentFormCsrfTests(TestCase):
+    """El formulario de comentarios se envía con o sin la caché de páginas"""
+
+    def setUp(self):
+        category = Category.objects.create(name="Tazas", slug="tazas")
+        self.product = Product.objects.create(name="Taza", slug="taza", category=category)
+        self.url = reverse("product_detail", args=[self.product.slug, self.product.id])
+        self.client = Client(enforce_csrf_checks=True)
+        cache.clear()
+
+    def post_comment(self, token):
+        return self.client.post(self.url, {"name": "Ana", "comment": "Muy buena", "rating": 5, "csrfmiddlewaretoken": token})
+
+    @override_settings(
+        SHARED_CACHE=False,
+        MIDDLEWARE=[name for name in settings.MIDDLEWARE if name != "app_store.middleware.PageCacheMiddleware"],
+    )
+    def test_sin_cache_compartida_lleva_el_token(self):
+        html = self.client.get(self.url).content.decode()
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', html).group(1)
+        self.assertEqual(self.post_comment(token).status_code, 302)
+        self.assertEqual(self.product.comments.count(), 1)
+
+    @override_settings(SHARED_CACHE=True, MIDDLEWARE=[*settings.MIDDLEWARE, "app_store.middleware.PageCacheMiddleware"])
+    def test_pagina_cacheada_toma_el_token_de_la_cookie(self):
+        self.assertEqual(self.client.get(self.url)["X-Page-Cache"], "MISS")
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Page-Cache"], "HIT")
+        self.assertIn(b'value="" data-csrf-cookie', response.content)
+
+        # Lo que hace el navegador: el contador del carrito deja la cookie y el JS la copia al enviar
+        self.client.get(reverse("orders:cart_count"))
+        self.assertEqual(self.post_comment(self.client.cookies[settings.CSRF_COOKIE_NAME].value).status_code, 302)
+        self.assertEqual(self.product.comments.count(), 1)
+
+
+class CategoryTileTests(TestCase):
+    """Contador e imagen de las tarjetas de categoría siguen a los productos"""
+
+    def setUp(self):
+        # Sin archivos reales: las copias WebP/JPEG no se generan
+        patcher = mock.patch("app_products.models.generate_derivatives", return_value=[])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tazas = Category.objects.create(name="Tazas", slug="tazas")
+        self.platos = Category.objects.create(name="Platos", slug="platos")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.popular = self.create_product("popular", sales=5)
+            self.otra = self.create_product("otra", sales=1)
+
+    def create_product(self, slug, sales):
+        product = Product.objects.create(name=slug, slug=slug, category=self.tazas, sales_count=sales)
+        variant = ProductVariant.objects.create(product=product, sku=slug, price=10000, stock=5)
+        ProductVariantImage.objects.create(variant=variant, image_url=f"productos/{slug}.jpg", is_main=True)
+        return product
+
+    def tile(self, category):
+        category.refresh_from_db()
+        return category.active_products_count, category.representative_product_id, category.representative_image
+
+    def test_tarjetas_iniciales(self):
+        count, product_id, image = self.tile(self.tazas)
+        self.assertEqual((count, product_id), (2, self.popular.id))
+        self.assertTrue(image.endswith("productos/popular.jpg"))
+        self.assertEqual(self.tile(self.platos), (0, None, ""))
+
+    def test_mover_producto_de_categoria(self):
+        self.popular.category = self.platos
+        with self.captureOnCommitCallbacks(execute=True):
+            self.popular.save()
+
+        count, product_id, image = self.tile(self.tazas)
+        self.assertEqual((count, product_id), (1, self.otra.id))
+        self.assertTrue(image.endswith("productos/otra.jpg"))
+        count, product_id, image = self.tile(self.platos)
+        self.assertEqual((count, product_id), (1, self.popular.id))
+        self.assertTrue(image.endswith("productos/popular.jpg"))
+
+    def test_desactivar_y_borrar(self):
+        self.otra.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.otra.save()
+        self.assertEqual(self.tile(self.tazas)[:2], (1, self.popular.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.popular.delete()
+        self.assertEqual(self.tile(self.tazas), (0, None, ""))
+
+
+class ProductPriceColumnsTests(TestCase):
+    """Oferta, precio mínimo y mayor descuento del producto siguen a sus variantes activas"""
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Taza", slug="taza")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grande = ProductVariant.objects.create(product=self.product, sku="G", price=20000, stock=5)
+            self.chica = ProductVariant.objects.create(product=self.product, sku="C", price=10000, stock=5)
+
+    def save(self, variant, **values):
+        for field, value in values.items():
+            setattr(variant, field, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            variant.save()
+        self.product.refresh_from_db()
+        return self.product.has_active_discount, self.product.min_price, self.product.max_discount_pct
+
+    def test_sin_ofertas(self):
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.has_active_discount, self.product.min_price, self.product.max_discount_pct), (False, 10000, 0))
+
+    def test_poner_y_quitar_oferta(self):
+        self.assertEqual(self.save(self.grande, discount_price=5000), (True, 5000, 75))
+        self.assertEqual(self.save(self.chica, discount_price=9000), (True, 5000, 75))
+        self.assertEqual(self.save(self.grande, discount_price=None), (True, 9000, 10))
+        self.assertEqual(self.save(self.chica, discount_price=None), (False, 10000, 0))
+
+    def test_variantes_inactivas_no_cuentan(self):
+        self.save(self.grande, discount_price=5000)
+        self.assertEqual(self.save(self.grande, is_active=False), (False, 10000, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chica.delete()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.has_active_discount, self.product.min_price), (False, None))
+
+    def test_pagina_de_ofertas(self):
+        otro = Product.objects.create(name="Plato", slug="plato")
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductVariant.objects.create(product=otro, sku="P", price=10000, discount_price=8000, stock=5)
+        self.save(self.grande, discount_price=5000)
+        response = self.client.get(reverse("discounted_products"))
+        self.assertEqual([product.id for product in response.context["productos"]], [self.product.id, otro.id])
+
+
+class VariantMatrixTests(TestCase):
+    """Contenido de la matriz de variantes del detalle y su recálculo con señales"""
+
+    def setUp(self):
+        patcher = mock.patch("app_products.models.generate_derivatives", return_value=[])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        color = Option.objects.create(name="Color")
+        medida = Option.objects.create(name="Medida")
+        rojo = OptionValue.objects.create(option=color, value="Rojo")
+        azul = OptionValue.objects.create(option=color, value="Azul")
+        m = OptionValue.objects.create(option=medida, value="M")
+        self.product = Product.objects.create(name="Taza", slug="taza")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.a = ProductVariant.objects.create(product=self.product, sku="A", price=10000, discount_price=8000, stock=5)
+            self.b = ProductVariant.objects.create(product=self.product, sku="B", price=12000, stock=0)
+            for variant, value in ((self.a, rojo), (self.b, azul)):
+                VariantOption.objects.create(variant=variant, option_value=value)
+                VariantOption.objects.create(variant=variant, option_value=m)
+            ProductVariantImage.objects.create(variant=self.a, image_url="productos/a.jpg", is_main=True)
+            ProductVariantImage.objects.create(variant=self.b, image_url="productos/a.jpg")
+            ProductVariantImage.objects.create(variant=self.b, image_url="productos/b.jpg", is_main=True)
+
+    def data(self):
+        return ProductVariantMatrix.objects.get(product=self.product).data
+
+    def test_ejes_combinaciones_y_variantes(self):
+        data = self.data()
+        self.assertEqual(data["axes"], {"Color": ["Rojo", "Azul"], "Medida": ["M"]})
+        self.assertEqual(data["combinations"], {"Color=Rojo|Medida=M": self.a.id, "Color=Azul|Medida=M": self.b.id})
+        self.assertEqual(data["main_variant"], self.a.id)
+        a, b = data["variants"]
+        self.assertEqual((a["sku"], a["price"], a["discount_price"], a["discount_pct"], a["stock"]), ("A", 10000, 8000, 20, 5))
+        self.assertEqual((b["sku"], b["discount_price"], b["discount_pct"], b["stock"]), ("B", None, 0, 0))
+
+    def test_imagenes_sin_repetir(self):
+        data = self.data()
+        self.assertEqual([image["url"].rsplit("/", 1)[-1] for image in data["images"]], ["a.jpg", "b.jpg"])
+        self.assertEqual([variant["images"] for variant in data["variants"]], [[0], [1, 0]])
+
+    def test_editar_y_desactivar_variante(self):
+        self.b.stock = 3
+        with self.captureOnCommitCallbacks(execute=True):
+            self.b.save()
+        self.assertEqual(self.data()["variants"][1]["stock"], 3)
+
+        self.a.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.a.save()
+        data = self.data()
+        self.assertEqual([variant["sku"] for variant in data["variants"]], ["B"])
+        self.assertEqual(data["axes"]["Color"], ["Azul"])
+        self.assertEqual(data["main_variant"], self.b.id)
+
+
+class CommentPaginationTests(TestCase):
+    """Los comentarios se recorren por cursor, más recientes primero, sin repetir ni saltar"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="Taza", slug="taza")
+        other = Product.objects.create(name="Plato", slug="plato")
+        CommentPublic.objects.create(product=other, name="x", comment="otro", rating=3)
+        for i in range(12):
+            CommentPublic.objects.create(product=cls.product, name=f"Cliente {i}", comment=f"Comentario {i}", rating=1 + i % 5)
+        # Mismo created_at en la mitad: desempata el id
+        now = timezone.now()
+        CommentPublic.objects.filter(product=cls.product, id__in=[c.id for c in cls.product.comments.all()[:6]]).update(created_at=now)
+        cls.expected = list(cls.product.comments.order_by("-created_at", "-id").values_list("id", flat=True))
+
+    def test_recorrer_todas_las_paginas(self):
+        ids, pages = [], 0
+        url = reverse("product_comments", args=[self.product.id])
+        while url:
+            data = self.client.get(url).json()
+            ids += [comment["id"] for comment in data["results"]]
+            pages += 1
+            url = data["next"]
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(pages, 3)
+
+    def test_html_parcial_con_la_siguiente_url(self):
+        data = self.client.get(reverse("product_comments", args=[self.product.id]), {"parcial": 1}).json()
+        self.assertEqual(data["html"].count("Comentario "), 5)
+        self.assertIn("after=", data["next_url"])
+
+    def test_producto_inexistente(self):
+        # custom_404 lleva al inicio
+        response = self.client.get(reverse("product_comments", args=[999999]))
+        self.assertRedirects(response, reverse("store_page"), fetch_redirect_response=False)
+
+
+class ImageDerivativeTests(SimpleTestCase):
+    """Nombres de las copias deducidos del original y generación en cada ancho"""
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.storage = FileSystemStorage(location=folder.name)
+
+    def save_image(self, name, size, mode="RGB"):
+        buffer = io.BytesIO()
+        Image.new(mode, size).save(buffer, "PNG")
+        return self.storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_nombres_conservan_la_extension_del_original(self):
+        self.assertEqual(derivative_name("productos/foo.png", 320, "webp"), "productos/_w/foo.png-320.webp")
+        self.assertEqual(derivative_name("productos/foo.jpg", 320, "webp"), "productos/_w/foo.jpg-320.webp")
+        self.assertEqual(
+            derivative_url("https://s3.example.com/productos/foo.png?X-Amz=1", 160, "jpg"),
+            "https://s3.example.com/productos/_w/foo.png-160.jpg?X-Amz=1",
+        )
+
+    def test_srcset_y_miniatura(self):
+        self.assertEqual(
+            srcset("/media/foo.jpg", [160, 320]),
+            "/media/_w/foo.jpg-160.jpg 160w, /media/_w/foo.jpg-320.jpg 320w",
+        )
+        self.assertEqual(srcset("/media/foo.jpg", []), "")
+        self.assertEqual(thumbnail_url("/media/foo.jpg", [160, 320], 200), "/media/_w/foo.jpg-320.webp")
+        self.assertEqual(thumbnail_url("/media/foo.jpg", [160], 200), "/media/foo.jpg")
+
+    def test_genera_cada_ancho_sin_ampliar(self):
+        png = self.save_image("productos/foo.png", (700, 350), mode="RGBA")
+        jpg = self.save_image("productos/foo.jpg", (200, 100))
+
+        self.assertEqual(generate_derivatives(png, self.storage), [160, 320, 640])
+        self.assertEqual(generate_derivatives(jpg, self.storage), [160])
+        for extension in ("webp", "jpg"):
+            self.assertTrue(self.storage.exists(derivative_name(png, 640, extension)))
+            self.assertTrue(self.storage.exists(derivative_name(jpg, 160, extension)))
+        self.assertFalse(self.storage.exists(derivative_name(jpg, 320, "webp")))
+        with self.storage.open(derivative_name(png, 320, "jpg")) as copy:
+            self.assertEqual(Image.open(copy).size, (320, 160))
+
+    def test_regenerar_no_renombra(self):
+        png = self.save_image("productos/foo.png", (400, 400))
+        generate_derivatives(png, self.storage)
+        self.assertEqual(generate_derivatives(png, self.storage), [160, 320])
+
+    def test_archivo_invalido_o_inexistente(self):
+        self.storage.save("productos/roto.png", ContentFile(b"no es una imagen"))
+        with self.assertLogs("app_products.images", "WARNING"):
+            self.assertEqual(generate_derivatives("productos/roto.png", self.storage), [])
+        with self.assertLogs("app_products.images", "WARNING"):
+            self.assertEqual(generate_derivatives("productos/nada.png", self.storage), [])
+
+
+class PrefetchAwareQueryTests(TestCase):
+    """for_cards() y for_cart() leen todo con un número fijo de consultas"""
+
+    def setUp(self):
+        patcher = mock.patch("app_products.models.generate_derivatives", return_value=[])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        color = Option.objects.create(name="Color")
+        rojo = OptionValue.objects.create(option=color, value="Rojo")
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(3):
+                product = Product.objects.create(name=f"Taza {i}", slug=f"taza-{i}")
+                variant = ProductVariant.objects.create(product=product, sku=f"TAZA-{i}", price=10000, stock=5)
+                VariantOption.objects.create(variant=variant, option_value=rojo)
+                ProductVariantImage.objects.create(variant=variant, image_url=f"productos/{i}-b.jpg")
+                ProductVariantImage.objects.create(variant=variant, image_url=f"productos/{i}-a.jpg", is_main=True)
+                CommentPublic.objects.create(product=product, name="x", comment="bien", rating=4)
+
+    def test_for_cart_en_tres_consultas(self):
+        with self.assertNumQueries(3):
+            variants = list(ProductVariant.objects.for_cart().order_by("sku"))
+            lines = [
+                (variant.product.name, variant.main_image.image_url.name, [vo.option_value.value for vo in variant.options.all()])
+                for variant in variants
+            ]
+        self.assertEqual(lines[0], ("Taza 0", "productos/0-a.jpg", ["Rojo"]))
+        self.assertEqual(len(lines), 3)
+
+    def test_main_image_sin_prefetch_es_una_consulta(self):
+        variant = ProductVariant.objects.get(sku="TAZA-1")
+        with self.assertNumQueries(1):
+            self.assertEqual(variant.main_image.image_url.name, "productos/1-a.jpg")
+
+    def test_for_cards_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            cards = [
+                (product.avg_rating, product.card_summary.image_url)
+                for product in Product.objects.for_cards().order_by("id")
+            ]
+        self.assertEqual([rating for rating, _ in cards], [4, 4, 4])
+        self.assertTrue(all(image.endswith("-a.jpg") for _, image in cards))
+
+    def test_avg_rating_desde_el_resumen(self):
+        with self.assertNumQueries(1):
+            product = Product.objects.for_cards().defer("rating_sum").get(slug="taza-0")
+            self.assertEqual(product.avg_rating, 4)
@@ -0,0 +1,158 @@
+# app_products/typeahead.py
+
+import bisect
+import threading
+
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from app_products.models import Product, Category, OptionValue
+from app_products.search import normalize_text, query_terms
+from app_products.versions import CATALOG, get_version
+
+MAX_SUGGESTIONS = 8
+MAX_SCAN = 300  # Más claves que esto bajo un prefijo: se usa su top precalculado
+TOP_K = 100     # Mejores entradas guardadas por cada prefijo con muchas claves
+
+# Orden en que se muestran los tipos de sugerencia
+KIND_ORDER = {"categoria": 0, "producto": 1, "opcion": 2}
+
+
+# ---------------------------
+#   ÍNDICE DE PREFIJOS
+# ---------------------------
+
+class PrefixIndex:
+    """
+    Arreglo ordenado de claves normalizadas. Cada nombre se indexa desde
+    cada una de sus palabras ("cafe molido" -> "cafe molido", "molido"),
+    así "mol" también encuentra "Café molido". La búsqueda es un bisect
+    que delimita las claves que empiezan por el prefijo.
+
+    Si son pocas (hasta MAX_SCAN) se revisan todas. Si son más, se usan
+    las TOP_K mejores de ese prefijo (tipo y ventas), calculadas al armar
+    el índice: así "ta" no se queda con las primeras en orden alfabético.
+    Solo si las demás palabras dejan menos de `limit` se revisa todo.
+    """
+
+    def __init__(self, entries, version):
+        self.version = version
+        rows = []
+        for position, (label, kind, url, weight) in enumerate(entries):
+            words = normalize_text(label).split()
+            for start in range(len(words)):
+                rows.append((" ".join(words[start:]), position))
+        rows.sort()
+        self.keys = [key for key, _ in rows]
+        self.positions = [position for _, position in rows]
+        self.entries = entries
+        self.normalized = [normalize_text(label) for label, _, _, _ in entries]
+
+        order = sorted(
+            range(len(entries)),
+            key=lambda p: (KIND_ORDER[entries[p][1]], -entries[p][3], self.normalized[p]),
+        )
+        self.rank = [0] * len(entries)
+        for rank, position in enumerate(order):
+            self.rank[position] = rank
+        self.top = self._build_top()
+
+    def _build_top(self):
+        """{prefijo: mejores posiciones} solo para los prefijos con más de MAX_SCAN claves"""
+        top = {}
+        pending = [(0, len(self.keys), 0)]
+        while pending:
+            lo, hi, depth = pending.pop()
+            if hi - lo <= MAX_SCAN:
+                continue
+            if depth:
+                top[self.keys[lo][:depth]] = sorted(set(self.positions[lo:hi]), key=self.rank.__getitem__)[:TOP_K]
+            # Las claves que terminan justo aquí van primero; el resto se agrupa por el siguiente carácter
+            while lo < hi and len(self.keys[lo]) == depth:
+                lo += 1
+            while lo < hi:
+                char = self.keys[lo][depth]
+                end = bisect.bisect_left(self.keys, self.keys[lo][:depth] + chr(ord(char) + 1), lo, hi)
+                pending.append((lo, end, depth + 1))
+                lo = end
+        return top
+
+    def search(self, query, limit=MAX_SUGGESTIONS):
+        terms = query_terms(query)
+        if not terms:
+            return []
+
+        prefix = terms[0]
+        rest = terms[1:]
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + "\U0010ffff", start)
+
+        def matching(candidates):
+            return [position for position in candidates if all(term in self.normalized[position] for term in rest)]
+
+        found = matching(self.top[prefix]) if end - start > MAX_SCAN else []
+        if len(found) < limit:
+            # Prefijo con pocas claves, o las demás palabras descartaron casi todo el top
+            found = matching(set(self.positions[start:end]))
+
+        matches = sorted(found, key=self.rank.__getitem__)
+        return [
+            {"type": kind, "label": label, "url": url}
+            for label, kind, url, _ in (self.entries[p] for p in matches[:limit])
+        ]
+
+
+def build_entries():
+    """(texto, tipo, url, peso) de categorías, productos y valores de opción"""
+    entries = []
+
+    for name, slug in Category.objects.values_list("name", "slug"):
+        entries.append((name, "categoria", reverse("category_products", args=[slug]), 0))
+
+    for product_id, name, slug, sales in (
+        Product.objects
+        .filter(is_active=True)
+        .values_list("id", "name", "slug", "sales_count")
+    ):
+        entries.append((name, "producto", reverse("product_detail", args=[slug, product_id]), sales))
+
+    values = (
+        OptionValue.objects
+        .filter(variant_values__variant__is_active=True, variant_values__variant__product__is_active=True)
+        .values_list("value", flat=True)
+        .distinct()
+    )
+    search_url = reverse("search_products")
+    for value in values:
+        entries.append((value, "opcion", f"{search_url}?{urlencode({'q': value})}", 0))
+
+    return entries
+
+
+# ---------------------------
+#   ÍNDICE POR PROCESO
+# ---------------------------
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Índice del proceso actual. Solo se reconstruye (consultando la base de
+    datos) cuando cambia la versión del catálogo.
+    """
+    global _index
+    version = get_version(CATALOG)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = PrefixIndex(build_entries(), version)
+        return _index
+
+
+def suggest(query, limit=MAX_SUGGESTIONS):
+    return get_index().search(query, limit)
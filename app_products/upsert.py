@@ -0,0 +1,60 @@
+# app_products/upsert.py
+
+from django.db import IntegrityError, connections, router, transaction
+
+
+# ---------------------------
+#   INSERT O UPDATE SEGÚN EL MOTOR
+# ---------------------------
+# PostgreSQL y SQLite: INSERT ... ON CONFLICT (columnas) DO UPDATE.
+# MySQL/MariaDB: INSERT ... ON DUPLICATE KEY UPDATE, que no acepta columnas
+# (Django da NotSupportedError si se pasan unique_fields).
+# Otros motores: UPDATE y, si no había fila, INSERT.
+
+def upsert(model, objs, unique_fields, update_fields, batch_size=None):
+    """
+    Crea o actualiza las filas `objs` de `model` identificadas por
+    `unique_fields` (deben formar una restricción única), reescribiendo
+    solo `update_fields`. Sin señales, igual que bulk_create.
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+
+    connection = connections[router.db_for_write(model)]
+    if connection.features.supports_update_conflicts_with_target:
+        return model.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=update_fields,
+            batch_size=batch_size,
+        )
+    if connection.vendor == "mysql" and connection.features.supports_update_conflicts:
+        return model.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            update_fields=update_fields,
+            batch_size=batch_size,
+        )
+    return _update_then_insert(model, objs, unique_fields, update_fields, connection.alias)
+
+
+def _update_then_insert(model, objs, unique_fields, update_fields, using):
+    unique = [model._meta.get_field(name) for name in unique_fields]
+    updated = [model._meta.get_field(name) for name in update_fields]
+
+    with transaction.atomic(using=using):
+        for obj in objs:
+            rows = model.objects.using(using).filter(**{field.attname: getattr(obj, field.attname) for field in unique})
+            # pre_save completa los auto_now (updated_at) igual que bulk_create
+            values = {field.attname: field.pre_save(obj, False) for field in updated}
+            if rows.update(**values):
+                continue
+            try:
+                with transaction.atomic(using=using):
+                    model.objects.using(using).bulk_create([obj])
+            except IntegrityError:
+                # Otra transacción insertó la misma fila entre medias
+                rows.update(**values)
+    return objs
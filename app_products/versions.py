@@ -0,0 +1,98 @@
+# app_products/versions.py
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG = "catalog"  # Cambia con cualquier modificación visible del catálogo
+CATEGORIES = "categories"  # Solo cambia al guardar o borrar una categoría
+SALES = "sales"  # Cambia con cada orden creada o cancelada (rankings de ventas)
+
+KEY_PREFIX = "kalyzo:version"
+LOCAL_TIMEOUT = 60  # Sin caché compartida las versiones duran poco (ver is_shared_cache)
+# Las de cada producto vencen solas: cualquier id que aparezca en una URL crea
+# una, y al recrearse toma la hora actual (más nueva), así que no da copias viejas
+PRODUCT_TIMEOUT = 60 * 60 * 24
+
+
+# ---------------------------
+#   VERSIONES DEL CATÁLOGO
+# ---------------------------
+# Cada versión es un timestamp en milisegundos que solo crece, así sirve
+# tanto para invalidar cachés como de fecha de "última modificación".
+
+def is_shared_cache():
+    """
+    True si todos los procesos ven la misma caché (REDIS_URL). Si no, cada
+    proceso tiene sus propias versiones: no se cachean páginas ni tarjetas,
+    y las versiones vencen en LOCAL_TIMEOUT segundos para que el menú, el
+    autocompletado y los rankings se renueven igual. Los ETag no dependen
+    de esto: salen de la base de datos (app_store/conditional.py).
+    """
+    return getattr(settings, "SHARED_CACHE", False)
+
+
+def _timeout(name):
+    if not is_shared_cache():
+        return LOCAL_TIMEOUT
+    return PRODUCT_TIMEOUT if name.startswith(product_key("")) else None
+
+
+def _key(name):
+    return f"{KEY_PREFIX}:{name}"
+
+
+def product_key(product_id):
+    """Versión propia de un producto (tarjetas, detalle...)"""
+    return f"product:{product_id}"
+
+
+def _set_many(versions):
+    """Guarda {nombre: versión} con un set_many por duración (globales y de producto)"""
+    groups = {}
+    for name, version in versions.items():
+        groups.setdefault(_timeout(name), {})[_key(name)] = version
+    for timeout, values in groups.items():
+        cache.set_many(values, timeout=timeout)
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def get_version(name=CATALOG):
+    """Versión actual; si no existe todavía se crea con la hora actual"""
+    version = cache.get(_key(name))
+    if version is None:
+        cache.add(_key(name), _now_ms(), timeout=_timeout(name))
+        version = cache.get(_key(name), _now_ms())
+    return version
+
+
+def get_versions(names):
+    """Versiones de varias claves con un solo viaje a la caché: {nombre: versión}"""
+    names = list(names)
+    found = cache.get_many([_key(name) for name in names])
+    versions = {}
+    missing = {}
+    now = _now_ms()
+    for name in names:
+        version = found.get(_key(name))
+        if version is None:
+            version = missing[name] = now
+        versions[name] = version
+    if missing:
+        _set_many(missing)
+    return versions
+
+
+def bump_version(*names):
+    """Invalida todo lo que dependa de estas versiones"""
+    names = names or (CATALOG,)
+    now = _now_ms()
+    current = cache.get_many([_key(name) for name in names])
+    _set_many({
+        name: max(now, current.get(_key(name), 0) + 1)
+        for name in names
+    })
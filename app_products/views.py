@@ -1,98 +1,145 @@
 from django.views.generic import DetailView
-from .models import Product, CommentPublic
-from django.shortcuts import redirect, render
+from .models import Product, CommentPublic, ProductVariantMatrix
+from app_orders.models import ProductRecommendation
+from django.shortcuts import get_object_or_404, redirect, render
 from django.views import View
+from django.utils.decorators import method_decorator
+from app_store.conditional import conditional_page, product_versions
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+from app_store.pagination import is_partial, load_more_response, paginate
+from app_store.shuffle import get_visitor_seed, remember_seed, shuffled_page
 
+COMMENTS_PAGE_SIZE = 5
+COMMENTS_ORDERING = ["-created_at", "-id"]  # Índice (product, -created_at, -id)
+COMMENT_TEMPLATE = "app_products/componentes/Comment_item.html"
 
 
+def comments_page(request, product_id, path=None):
+    """Una página de comentarios del producto, por cursor (más recientes primero)"""
+    comments = (
+        CommentPublic.objects
+        .filter(product_id=product_id)
+        .only("id", "name", "comment", "rating", "created_at")
+    )
+    return paginate(request, comments, COMMENTS_ORDERING, size=COMMENTS_PAGE_SIZE, path=path)
+
 
 # Mostrar todos los productos
+@method_decorator(conditional_page(seeded=True), name="get")
 class AllProductDetailView(View):
     def get(self, request):
-        productos = Product.objects.filter(is_active=True).order_by("?")
-        return render(
-            request,
-            "All_Products.html",
-            {"productos": productos}
+        productos = (
+            Product.objects
+            .filter(is_active=True)
+            .for_cards()
         )
+        # Orden aleatorio estable durante la sesión del visitante
+        page = shuffled_page(request, productos, get_visitor_seed(request))
+
+        if is_partial(request):
+            response = load_more_response(request, page)
+        else:
+            response = render(
+                request,
+                "All_Products.html",
+                {"productos": page}
+            )
+        return remember_seed(request, response)
 
-    
+
+# Detalle: el más visitado por buscadores; con 304 no se consulta nada
+@method_decorator(conditional_page(product_versions), name="get")
 class ProductDetailView(DetailView):
     model = Product
     template_name = "Product_detail.html"
     context_object_name = "product"
     slug_field = "slug"
     slug_url_kwarg = "slug"
+    # Se busca por id y slug: el ETag (product_versions) sale del id, así que
+    # una URL con un slug de otro producto debe dar 404 y no su página
+    pk_url_kwarg = "id"
+    query_pk_and_slug = True
+
+    def get_queryset(self):
+        # La matriz de variantes llega en el mismo SELECT del producto
+        return super().get_queryset().select_related("variant_matrix", "recommendations")
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         product = self.object
 
-        # Obtener todas las variantes activas con sus relaciones
-        variants = (
-            product.variants
-            .filter(is_active=True)
-            .prefetch_related(
-                "options__option_value__option",
-                "images"
-            )
-            .order_by("sku")
-        )
-
-        # Variante principal (primera activa)
-        main_variant = variants.first()
-
-        # Recopilar TODAS las imágenes de TODAS las variantes activas
-        all_variant_images = []
-        seen_urls = set()
-        
-        for variant in variants:
-            for img in variant.images.all():
-                # ✅ CAMBIO: usar .url del ImageField
-                image_url = img.image_url.url if img.image_url else None
-                
-                if image_url and image_url not in seen_urls:
-                    all_variant_images.append({
-                        'url': image_url,
-                        'alt': img.alt_text or f"{product.name} - {variant.sku}",
-                        'variant_id': variant.id,
-                        'is_main': img.is_main
-                    })
-                    seen_urls.add(image_url)
-
-        # Ordenar: primero las imágenes principales
-        all_variant_images.sort(key=lambda x: (not x['is_main'], x['url']))
-
-        # ✅ DETECTAR QUÉ OPCIONES TIENE EL PRODUCTO
-        available_options = {}
-        for variant in variants:
-            for variant_option in variant.options.all():
-                option_name = variant_option.option_value.option.name
-                if option_name not in available_options:
-                    available_options[option_name] = True
+        # Ejes, variantes e imágenes salen de un documento precalculado
+        # (ProductVariantMatrix): sin consultas por variante
+        matrix = ProductVariantMatrix.for_product(product)
+        variants = matrix["variants"]
+        images = matrix["images"]
+        axes = matrix["axes"]
+
+        # Botones del selector: variantes con imagen (la principal primero)
+        variant_chips = [
+            {
+                "id": variant["id"],
+                "stock": variant["stock"],
+                "color": variant["options"].get("Color", ""),
+                "image": images[variant["images"][0]],
+            }
+            for variant in variants
+            if variant["images"]
+        ]
 
         context.update({
-            "variants": variants,
-            "main_variant": main_variant,
-            "all_variant_images": all_variant_images,
-            "main_image": all_variant_images[0] if all_variant_images else None,
+            "variant_matrix": matrix,
+            "variant_chips": variant_chips,
+            "main_variant": variants[0] if variants else None,
+            "all_variant_images": images,
+            "main_image": images[0] if images else None,
             
             # ✅ OPCIONES DISPONIBLES
-            "has_color": "Color" in available_options,
-            "has_medida": "Medida" in available_options,
-            "has_peso": "Peso" in available_options,
-            "has_material": "Material" in available_options,
+            "has_color": "Color" in axes,
+            "has_medida": "Medida" in axes,
+            "has_peso": "Peso" in axes,
+            "has_material": "Material" in axes,
             
-            "productos": (
-                Product.objects
-                .filter(category=product.category, is_active=True)
-                .exclude(id=product.id)[:4]
+            "productos": self.related_products(product),
+            # Solo la primera página; el resto se pide a ProductCommentsView
+            "comments": comments_page(
+                self.request, product.id, path=reverse("product_comments", args=[product.id])
             ),
-            "comments": product.comments.all().order_by("-created_at"),
         })
 
         return context
 
+    def related_products(self, product, limit=4):
+        """
+        "Comprados juntos" precalculados (ProductRecommendation); si no hay
+        suficientes se completa con productos de la misma categoría.
+        """
+        try:
+            related_ids = product.recommendations.related_ids
+        except ProductRecommendation.DoesNotExist:
+            related_ids = []
+
+        productos = []
+        if related_ids:
+            found = (
+                Product.objects
+                .filter(id__in=related_ids, is_active=True)
+                .for_cards()
+                .in_bulk()
+            )
+            productos = [found[product_id] for product_id in related_ids if product_id in found][:limit]
+
+        if len(productos) < limit:
+            productos += list(
+                Product.objects
+                .filter(category_id=product.category_id, is_active=True)
+                .exclude(id__in=[product.id] + [p.id for p in productos])
+                .for_cards()[:limit - len(productos)]
+            )
+        return productos
+
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()
         product = self.object
@@ -113,4 +160,38 @@ class ProductDetailView(DetailView):
             "product_detail",
             slug=product.slug,
             id=product.id
-        )
\ No newline at end of file
+        )
+
+
+# Comentarios de un producto, página a página (botón "Ver más comentarios")
+@method_decorator(conditional_page(product_versions), name="get")
+class ProductCommentsView(View):
+    """
+    ?parcial=1 devuelve el HTML de los comentarios para agregarlos a la
+    lista; sin él, los comentarios en JSON. Ambos con la URL siguiente.
+    """
+
+    def get(self, request, id):
+        get_object_or_404(Product.objects.only("id"), id=id)
+        page = comments_page(request, id)
+
+        if is_partial(request):
+            html = "".join(
+                render_to_string(COMMENT_TEMPLATE, {"comentario": comentario})
+                for comentario in page
+            )
+            return JsonResponse({"html": html, "next_url": page.next_url})
+
+        return JsonResponse({
+            "results": [
+                {
+                    "id": comentario.id,
+                    "name": comentario.name,
+                    "comment": comentario.comment,
+                    "rating": comentario.rating,
+                    "created_at": comentario.created_at.isoformat(),
+                }
+                for comentario in page
+            ],
+            "next": page.next_url,
+        }, json_dumps_params={"ensure_ascii": False})
@@ -0,0 +1,151 @@
+# app_store/conditional.py
+
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Count, F, IntegerField, Max, Value
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from app_orders.models import ProductSalesDaily
+from app_products.models import Category, Product
+from app_products.versions import CATALOG, CATEGORIES, SALES, product_key
+from app_store.shuffle import seed_bucket
+
+
+# ---------------------------
+#   VERSIONES DE CADA PÁGINA
+# ---------------------------
+# Los nombres son los de app_products/versions.py, pero los validadores salen
+# de la base de datos (updated_at que mantienen las señales), no de la caché:
+# funcionan igual con o sin caché compartida y no se pierden si una clave vence.
+
+def catalog_versions(kwargs):
+    """Listados: cualquier cambio del catálogo o de las categorías (menú)"""
+    return (CATALOG, CATEGORIES)
+
+
+def sales_versions(kwargs):
+    """Más vendidos: el catálogo y además cada venta o cancelación (ranking)"""
+    return (CATALOG, CATEGORIES, SALES)
+
+
+def category_versions(kwargs):
+    """Página de categorías: solo las tarjetas de categoría"""
+    return (CATEGORIES,)
+
+
+def product_versions(kwargs):
+    """
+    Detalle: versión propia del producto (variantes, imágenes, comentarios)
+    y la de las categorías del menú. Los productos similares no cuentan
+    para no invalidar todos los detalles con cada cambio del catálogo.
+    """
+    return (product_key(kwargs.get("id")), CATEGORIES)
+
+
+# Tabla de la que sale cada versión global (las de producto, de su fila)
+VERSION_MODELS = {
+    CATALOG: Product,
+    CATEGORIES: Category,
+    SALES: ProductSalesDaily,
+}
+
+
+def _version_query(name):
+    """SELECT nombre, última modificación, filas (las filas cambian también al borrar)"""
+    prefix = product_key("")
+    if name.startswith(prefix):
+        product_id = name[len(prefix):]
+        rows = Product.objects.order_by().filter(id=int(product_id) if product_id.isdigit() else None)
+        return rows.annotate(
+            version=Value(name),
+            last=F("updated_at"),
+            rows=Value(1, output_field=IntegerField()),
+        ).values_list("version", "last", "rows")
+    return (
+        VERSION_MODELS[name].objects.order_by()
+        .annotate(version=Value(name))
+        .values("version")
+        .annotate(last=Max("updated_at"), rows=Count("id"))
+        .values_list("version", "last", "rows")
+    )
+
+
+def last_changes(names):
+    """{nombre: (última modificación o None, filas)} con una sola consulta (UNION ALL)"""
+    queries = [_version_query(name) for name in names]
+    rows = queries[0].union(*queries[1:], all=True)
+    changes = {name: (None, 0) for name in names}
+    changes.update({name: (last, count) for name, last, count in rows})
+    return changes
+
+
+# ---------------------------
+#   VALIDADORES
+# ---------------------------
+
+def _validators(request, get_names, kwargs, seeded, daily):
+    """(etag, last_modified) de la petición, o (None, None) si no aplica"""
+    cached = getattr(request, "_validators", None)
+    if cached is not None:
+        return cached
+
+    validators = (None, None)
+    # Las páginas de usuarios con sesión iniciada no se comparten (menú de cuenta)
+    logged_in = settings.SESSION_COOKIE_NAME in request.COOKIES and request.user.is_authenticated
+    bucket = seed_bucket(request) if seeded else None
+    if not logged_in and not (seeded and bucket is None):
+        changes = last_changes(get_names(kwargs))
+        parts = [
+            f"{int(last.timestamp() * 1000) if last else 0}.{count}"
+            for last, count in changes.values()
+        ]
+        if seeded:
+            parts.append(f"s{bucket}")
+        if daily:
+            parts.append(timezone.localdate().isoformat())
+        last_modified = max((last for last, _ in changes.values() if last), default=None)
+        # ETag débil: el mismo cuerpo puede ir comprimido o no
+        validators = (f'W/"{"-".join(parts)}"', last_modified)
+
+    request._validators = validators
+    return validators
+
+
+def conditional_page(get_names=catalog_versions, seeded=False, daily=False, max_age=None):
+    """
+    Decorador de vistas: agrega ETag y Last-Modified y responde 304 a
+    If-None-Match / If-Modified-Since antes de ejecutar la vista.
+    - seeded: el orden depende de la semilla del visitante (va en el ETag).
+      Last-Modified no la refleja, así que en esas páginas solo se usa el ETag.
+    - daily: el contenido cambia también con el día (rankings de ventas).
+    - max_age: segundos que cualquier caché puede reutilizar la respuesta
+      sin preguntar (API); por defecto siempre se revalida.
+    """
+    def etag(request, *args, **kwargs):
+        return _validators(request, get_names, kwargs, seeded, daily)[0]
+
+    def last_modified(request, *args, **kwargs):
+        if seeded or daily:
+            return None
+        return _validators(request, get_names, kwargs, seeded, daily)[1]
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # Con validadores el navegador siempre pregunta antes de reutilizar
+            if response.status_code == 200 and response.has_header("ETag"):
+                if max_age is None:
+                    patch_cache_control(response, no_cache=True)
+                else:
+                    patch_cache_control(response, public=True, max_age=max_age)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,6 +1,51 @@
+import threading
+from collections import namedtuple
+
 from app_products.models import Category
+from app_products.versions import CATEGORIES, get_version, is_shared_cache
+
+# Lo que el menú necesita de cada categoría (inmutable, se comparte entre peticiones)
+CategoriaGlobal = namedtuple(
+    "CategoriaGlobal", ["id", "name", "slug", "image_url", "image_widths", "active_products_count"]
+)
+
+_snapshot = (None, ())  # (versión, tupla de categorías) del proceso
+_lock = threading.Lock()
+
+
+def get_categorias():
+    """
+    Categorías materializadas una vez por proceso. Solo se vuelven a leer
+    de la base de datos cuando cambia la versión "categories" (señales).
+    """
+    global _snapshot
+    version = get_version(CATEGORIES)
+    if _snapshot[0] == version:
+        return _snapshot[1]
+
+    with _lock:
+        if _snapshot[0] != version:
+            categorias = tuple(
+                CategoriaGlobal(
+                    categoria.id,
+                    categoria.name,
+                    categoria.slug,
+                    categoria.image_url,
+                    categoria.image_widths,
+                    categoria.active_products_count,
+                )
+                for categoria in Category.objects.only(
+                    "id", "name", "slug", "imagen_category", "imagen_widths",
+                    "representative_image", "representative_widths", "active_products_count",
+                )
+            )
+            _snapshot = (version, categorias)
+        return _snapshot[1]
+
 
 def categorias_globales(request):
     return {
-        "categorias": Category.objects.all()
+        "categorias": get_categorias(),
+        # Con caché compartida las páginas del catálogo se guardan sin token CSRF
+        "cache_compartida": is_shared_cache(),
     }
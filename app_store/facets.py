@@ -0,0 +1,137 @@
+# app_store/facets.py
+
+from app_products.models import CategoryFacet
+
+FILTER_PARAM = "f"  # ?f=option-1.5&f=price.0-50000&f=stock.1
+ORDER_PARAM = "orden"  # ?orden=precio-asc
+
+# Orden de los listados: (etiqueta, columnas del cursor)
+ORDERINGS = {
+    "recientes": ("Más recientes", ["-created_at", "-id"]),
+    "precio-asc": ("Menor precio", ["min_price", "id"]),
+    "precio-desc": ("Mayor precio", ["-min_price", "-id"]),
+    "descuento": ("Mayor descuento", ["-max_discount_pct", "-id"]),
+}
+DEFAULT_ORDERING = "recientes"
+
+
+# ---------------------------
+#   SELECCIÓN DESDE LA URL
+# ---------------------------
+
+def selected_filters(request):
+    """{faceta: {valor, ...}} a partir de los ?f=faceta.valor de la URL"""
+    selected = {}
+    for raw in request.GET.getlist(FILTER_PARAM):
+        facet, _, value_key = raw.partition(".")
+        if facet and value_key and facet != CategoryFacet.ALL:
+            selected.setdefault(facet, set()).add(value_key)
+    return selected
+
+
+def toggle_url(request, facet, value_key):
+    """URL que agrega o quita un valor de filtro (vuelve a la primera página)"""
+    params = request.GET.copy()
+    params.pop("after", None)
+    params.pop("parcial", None)
+    token = f"{facet}.{value_key}"
+    current = params.getlist(FILTER_PARAM)
+    if token in current:
+        current.remove(token)
+    else:
+        current.append(token)
+    params.setlist(FILTER_PARAM, current)
+    query = params.urlencode()
+    return f"{request.path}?{query}" if query else request.path
+
+
+# ---------------------------
+#   INTERSECCIÓN Y CONTEO
+# ---------------------------
+
+def facet_filter(request, category):
+    """
+    Lee las facetas precalculadas de la categoría (una consulta) y devuelve
+    (ids, grupos):
+    - ids: productos que cumplen los filtros, o None si no hay filtros.
+      Dentro de una faceta los valores se suman (OR) y entre facetas se
+      intersectan (AND).
+    - grupos: facetas para la plantilla con el conteo de cada valor,
+      calculado con los filtros de las demás facetas.
+    """
+    rows = list(CategoryFacet.objects.filter(category=category))
+    selected = selected_filters(request)
+
+    universe = set()
+    postings = {}
+    for row in rows:
+        if row.facet == CategoryFacet.ALL:
+            universe = set(row.product_ids)
+        else:
+            postings.setdefault(row.facet, {})[row.value_key] = set(row.product_ids)
+
+    # Productos que cumplen cada faceta seleccionada (unión de sus valores)
+    matching = {
+        facet: set().union(*(postings.get(facet, {}).get(key, set()) for key in keys))
+        for facet, keys in selected.items()
+    }
+
+    def intersect(exclude=None):
+        result = universe
+        for facet, ids in matching.items():
+            if facet != exclude:
+                result = result & ids
+        return result
+
+    groups = {}
+    for row in rows:
+        if row.facet == CategoryFacet.ALL:
+            continue
+        base = intersect(exclude=row.facet)
+        is_selected = row.value_key in selected.get(row.facet, ())
+        group = groups.setdefault(row.facet, {
+            "key": row.facet,
+            "label": row.facet_label,
+            "values": [],
+            "active": False,
+        })
+        group["active"] = group["active"] or is_selected
+        group["values"].append({
+            "label": row.value_label,
+            "count": len(postings[row.facet][row.value_key] & base),
+            "selected": is_selected,
+            "url": toggle_url(request, row.facet, row.value_key),
+        })
+
+    # Opciones primero (Color, Medida...), luego precio y stock
+    order = {CategoryFacet.PRICE: 1, CategoryFacet.STOCK: 2}
+    facets = sorted(groups.values(), key=lambda g: (order.get(g["key"], 0), g["label"]))
+
+    ids = intersect() if matching else None
+    return ids, facets
+
+
+# ---------------------------
+#   ORDEN
+# ---------------------------
+
+def selected_ordering(request):
+    """Clave del orden pedido en ?orden= (o el predeterminado)"""
+    key = request.GET.get(ORDER_PARAM)
+    return key if key in ORDERINGS else DEFAULT_ORDERING
+
+
+def ordering_choices(request, current):
+    """Opciones de orden para la plantilla (conservan los filtros)"""
+    choices = []
+    for key, (label, _) in ORDERINGS.items():
+        params = request.GET.copy()
+        params.pop("after", None)
+        params.pop("parcial", None)
+        params[ORDER_PARAM] = key
+        choices.append({
+            "label": label,
+            "url": f"{request.path}?{params.urlencode()}",
+            "selected": key == current,
+        })
+    return choices
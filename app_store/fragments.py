@@ -0,0 +1,56 @@
+# app_store/fragments.py
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from app_products.versions import get_versions, is_shared_cache, product_key
+
+CARD_TEMPLATE = "app_store/componentes/Card.html"
+FEATURED_CARD_TEMPLATE = "app_store/componentes/CardDestacado.html"
+
+# Súbelo al cambiar el HTML de Card.html / CardDestacado.html
+FRAGMENTS_RELEASE = 2
+FRAGMENT_TIMEOUT = 60 * 60 * 24  # Un día; la versión del producto invalida antes
+
+
+# ---------------------------
+#   TARJETAS CACHEADAS
+# ---------------------------
+
+def fragment_key(template, product_id, version):
+    return f"card:{FRAGMENTS_RELEASE}:{template}:{product_id}:{version}"
+
+
+def render_cards(products, template=CARD_TEMPLATE):
+    """
+    HTML de la tarjeta de cada producto, en el mismo orden.
+    La clave es (producto, versión del producto): se leen todas las
+    versiones y todos los fragmentos con un get_many cada uno y solo se
+    renderizan las tarjetas que faltan. Las señales suben la versión del
+    producto cuando cambia algo que se ve en la tarjeta.
+    """
+    products = list(products)
+    if not products:
+        return []
+    if not is_shared_cache():
+        return [mark_safe(render_to_string(template, {"producto": producto})) for producto in products]
+
+    versions = get_versions(product_key(producto.id) for producto in products)
+    keys = [
+        fragment_key(template, producto.id, versions[product_key(producto.id)])
+        for producto in products
+    ]
+    cached = cache.get_many(keys)
+
+    missing = {}
+    fragments = []
+    for producto, key in zip(products, keys):
+        html = cached.get(key)
+        if html is None:
+            html = missing[key] = render_to_string(template, {"producto": producto})
+        fragments.append(mark_safe(html))
+
+    if missing:
+        cache.set_many(missing, FRAGMENT_TIMEOUT)
+    return fragments
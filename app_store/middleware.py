@@ -0,0 +1,177 @@
+# app_store/middleware.py
+
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+
+from app_products.versions import CATALOG, SALES, get_versions
+from app_store.shuffle import assign_seed, seed_bucket, set_seed_cookie
+
+# Páginas públicas del catálogo que se pueden cachear para anónimos
+CACHEABLE_URL_NAMES = {
+    "store_page",
+    "categorys",
+    "category_products",
+    "news_products",
+    "search_products",
+    "top_selling_products",
+    "discounted_products",
+    "sobre_nosotros",
+    "contacto",
+    "all_products",
+    "product_detail",
+    "product_comments",
+}
+
+# Versiones de las que depende cada copia; por defecto solo la del catálogo.
+# Las ventas no suben CATALOG: solo invalidan el ranking de más vendidos.
+PAGE_VERSIONS = {
+    "top_selling_products": (CATALOG, SALES),
+}
+
+REBUILD_LOCK_TIMEOUT = 30  # Segundos que un worker puede tardar en regenerar
+
+# Se guardan con la copia; ConditionalGetMiddleware contesta 304 con ellos
+VALIDATOR_HEADERS = ("ETag", "Last-Modified", "Cache-Control")
+
+
+# ---------------------------
+#   CACHÉ DE PÁGINAS COMPLETAS
+# ---------------------------
+
+class PageCacheMiddleware:
+    """
+    Caché de páginas completas para visitantes anónimos.
+
+    - La copia depende solo de la ruta, el query string y la versión del
+      catálogo (más la semilla en las páginas con orden aleatorio y la de
+      ventas en los más vendidos, ver PAGE_VERSIONS).
+    - El cuerpo se guarda comprimido con gzip y se envía así si el
+      navegador lo acepta.
+    - Cualquier cambio del catálogo sube la versión (señales) y la copia
+      deja de ser válida. Con stale-while-revalidate un solo worker
+      regenera la página mientras los demás siguen sirviendo la anterior.
+    - No se guardan respuestas que usen el token CSRF o pongan cookies.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.timeout = getattr(settings, "PAGE_CACHE_TIMEOUT", 60 * 60)
+        self.stale_while_revalidate = getattr(settings, "PAGE_CACHE_STALE_WHILE_REVALIDATE", True)
+
+    def __call__(self, request):
+        url_name = self.cacheable_url_name(request)
+        if url_name is None:
+            return self.get_response(request)
+
+        # La semilla se elige aquí (y no en la vista) para que la primera
+        # visita también pueda servirse desde la caché
+        new_bucket = None
+        bucket = seed_bucket(request)
+        if bucket is None:
+            bucket = new_bucket = assign_seed(request)
+
+        version = self.page_version(url_name)
+        base_key, seeded_key = self.cache_keys(request, bucket)
+        entries = cache.get_many([base_key, seeded_key])
+        entry = entries.get(seeded_key) or entries.get(base_key)
+
+        if entry and entry["version"] == version:
+            response = self.cached_response(request, entry, "HIT")
+        elif entry and self.stale_while_revalidate and not self.acquire_rebuild(entry["key"]):
+            # Otro worker ya la está regenerando
+            response = self.cached_response(request, entry, "STALE")
+        else:
+            response = self.get_response(request)
+            key = seeded_key if getattr(request, "_uses_seed", False) else base_key
+            if self.is_cacheable_response(request, response):
+                self.store(key, response, version)
+                response["X-Page-Cache"] = "MISS"
+            if entry:
+                cache.delete(self.lock_key(entry["key"]))
+
+        if new_bucket is not None:
+            set_seed_cookie(response, new_bucket)
+        return response
+
+    # Reglas ---------------------------------------------------------
+
+    def cacheable_url_name(self, request):
+        """Nombre de la URL si la petición se puede servir desde la caché; si no, None"""
+        if request.method != "GET":
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if match.url_name not in CACHEABLE_URL_NAMES:
+            return None
+        # Solo se mira la sesión si hay cookie (los anónimos no la cargan)
+        if settings.SESSION_COOKIE_NAME in request.COOKIES and request.user.is_authenticated:
+            return None
+        return match.url_name
+
+    def page_version(self, url_name):
+        """Versión de la copia: las versiones de las que depende la página, unidas"""
+        versions = get_versions(PAGE_VERSIONS.get(url_name, (CATALOG,)))
+        return "-".join(str(version) for version in versions.values())
+
+    def is_cacheable_response(self, request, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+            and "private" not in response.get("Cache-Control", "")
+        )
+
+    # Almacenamiento -------------------------------------------------
+
+    def cache_keys(self, request, bucket):
+        raw = f"{request.path}?{request.META.get('QUERY_STRING', '')}"
+        digest = hashlib.md5(raw.encode()).hexdigest()
+        return f"page:{digest}", f"page:{digest}:seed-{bucket}"
+
+    def lock_key(self, key):
+        return f"{key}:rebuild"
+
+    def acquire_rebuild(self, key):
+        """True si este worker se queda con la regeneración de la página"""
+        return cache.add(self.lock_key(key), 1, timeout=REBUILD_LOCK_TIMEOUT)
+
+    def store(self, key, response, version):
+        cache.set(
+            key,
+            {
+                "key": key,
+                "version": version,
+                "content_type": response["Content-Type"],
+                # Validadores de la vista (app_store/conditional.py) para responder 304
+                "headers": {
+                    header: response[header]
+                    for header in VALIDATOR_HEADERS
+                    if response.has_header(header)
+                },
+                "body": gzip.compress(response.content, compresslevel=6),
+            },
+            self.timeout,
+        )
+
+    def cached_response(self, request, entry, status):
+        accepts_gzip = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if accepts_gzip:
+            response = HttpResponse(entry["body"], content_type=entry["content_type"])
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(gzip.decompress(entry["body"]), content_type=entry["content_type"])
+        response["Content-Length"] = str(len(response.content))
+        for header, value in entry.get("headers", {}).items():
+            response[header] = value
+        response["X-Page-Cache"] = status
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
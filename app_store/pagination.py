@@ -0,0 +1,158 @@
+# app_store/pagination.py
+
+import base64
+import binascii
+import bisect
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import JsonResponse
+
+from app_store.fragments import CARD_TEMPLATE, render_cards
+
+PAGE_SIZE = 24  # 4 filas de tarjetas en escritorio
+
+
+# ---------------------------
+#   CURSORES
+# ---------------------------
+
+def encode_cursor(values):
+    """Convierte los valores de la última fila en un cursor opaco para la URL"""
+    raw = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Devuelve la lista de valores del cursor o None si no es válido"""
+    if not cursor:
+        return None
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def keyset_filter(ordering, values):
+    """
+    Construye el WHERE equivalente a "(a, b) < (x, y)" respetando la
+    dirección de cada columna, p.ej. para ["-created_at", "-id"]:
+    created_at < x OR (created_at = x AND id < y)
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+# ---------------------------
+#   PÁGINAS
+# ---------------------------
+
+class KeysetPage:
+    """Una página de resultados y la URL para pedir la siguiente"""
+
+    def __init__(self, object_list, next_url=None):
+        self.object_list = object_list
+        self.next_url = next_url
+
+    @property
+    def has_next(self):
+        return self.next_url is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+def build_next_url(request, cursor, path=None):
+    """Conserva los parámetros actuales (q, filtros...) y cambia solo ?after="""
+    params = request.GET.copy()
+    params.pop("parcial", None)
+    params["after"] = cursor
+    return f"{path or request.path}?{params.urlencode()}"
+
+
+def paginate(request, queryset, ordering, size=PAGE_SIZE, path=None):
+    """
+    Paginación por cursor (keyset): en vez de OFFSET, cada página arranca
+    donde terminó la anterior, así la base de datos hace un range scan
+    sobre el índice de `ordering`. La última columna debe ser única (id)
+    para que el orden sea estable. `path` cambia la URL de la siguiente
+    página (p.ej. la primera página de comentarios va embebida en el detalle).
+    """
+    model = queryset.model
+    fields = [field.lstrip("-") for field in ordering]
+    queryset = queryset.order_by(*ordering)
+
+    values = decode_cursor(request.GET.get("after"))
+    if values is not None and len(values) == len(fields):
+        try:
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(fields, values)
+            ]
+        except ValidationError:
+            values = None
+        if values is not None:
+            queryset = queryset.filter(keyset_filter(ordering, values))
+
+    rows = list(queryset[:size + 1])
+    next_url = None
+    if len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        # Las filas pueden ser instancias o diccionarios de .values() (API)
+        values = [last[name] if isinstance(last, dict) else getattr(last, name) for name in fields]
+        next_url = build_next_url(request, encode_cursor(values), path)
+
+    return KeysetPage(rows, next_url)
+
+
+def ranked_page(request, ranking, queryset, size=PAGE_SIZE):
+    """
+    Pagina una lista ya ordenada de (puntaje, id), p.ej. la de la búsqueda.
+    El cursor guarda el último (puntaje, id) y solo se consultan los
+    productos de la página.
+    """
+    keys = [(-score, product_id) for score, product_id in ranking]
+    start = 0
+    values = decode_cursor(request.GET.get("after"))
+    if values is not None and len(values) == 2:
+        try:
+            start = bisect.bisect_right(keys, (-float(values[0]), int(values[1])))
+        except (TypeError, ValueError):
+            start = 0
+
+    chunk = ranking[start:start + size]
+    objects = queryset.in_bulk([product_id for _, product_id in chunk])
+    rows = [objects[product_id] for _, product_id in chunk if product_id in objects]
+
+    next_url = None
+    if chunk and start + size < len(ranking):
+        next_url = build_next_url(request, encode_cursor(list(chunk[-1])))
+
+    return KeysetPage(rows, next_url)
+
+
+def is_partial(request):
+    """El botón "Ver más" pide solo las tarjetas con ?parcial=1"""
+    return request.GET.get("parcial") == "1"
+
+
+def load_more_response(request, page, template=CARD_TEMPLATE):
+    """Respuesta JSON del botón "Ver más": HTML de las tarjetas + siguiente URL"""
+    html = "".join(render_cards(page, template))
+    return JsonResponse({"html": html, "next_url": page.next_url})
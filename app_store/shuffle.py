@@ -0,0 +1,109 @@
+# app_store/shuffle.py
+
+import random
+
+from app_store.pagination import (
+    PAGE_SIZE,
+    KeysetPage,
+    build_next_url,
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+)
+
+SEED_COOKIE = "kalyzo_seed"
+SEED_BUCKETS = 32  # Pocas semillas distintas: el orden se puede cachear por semilla
+
+ORDERING = ["random_key", "id"]
+
+
+# ---------------------------
+#   SEMILLA POR VISITANTE
+# ---------------------------
+
+def seed_bucket(request):
+    """Número de semilla (0..SEED_BUCKETS-1) de la cookie, o None si no es válida"""
+    try:
+        bucket = int(request.COOKIES.get(SEED_COOKIE, ""))
+    except ValueError:
+        return None
+    return bucket if 0 <= bucket < SEED_BUCKETS else None
+
+
+def assign_seed(request):
+    """Elige una semilla nueva y la deja en la petición como si viniera en la cookie"""
+    bucket = random.randrange(SEED_BUCKETS)
+    request.COOKIES[SEED_COOKIE] = str(bucket)
+    return bucket
+
+
+def get_visitor_seed(request):
+    """
+    Semilla del visitante guardada en cookie de sesión del navegador.
+    Mientras dure la sesión el orden aleatorio es el mismo en todas las páginas.
+    """
+    request._uses_seed = True  # La caché de páginas guarda una copia por semilla
+    bucket = seed_bucket(request)
+    if bucket is None:
+        bucket = assign_seed(request)
+        request._new_seed_bucket = bucket
+
+    return bucket / SEED_BUCKETS
+
+
+def set_seed_cookie(response, bucket):
+    response.set_cookie(SEED_COOKIE, str(bucket), httponly=True, samesite="Lax")
+    return response
+
+
+def remember_seed(request, response):
+    """Guarda la semilla nueva (si se generó en esta petición)"""
+    bucket = getattr(request, "_new_seed_bucket", None)
+    if bucket is not None:
+        set_seed_cookie(response, bucket)
+    return response
+
+
+# ---------------------------
+#   LECTURA ALEATORIA POR RANGO
+# ---------------------------
+
+def shuffled_page(request, queryset, seed, size=PAGE_SIZE):
+    """
+    Recorre los productos en orden de random_key empezando en la semilla y
+    dando la vuelta al llegar a 1.0: primero random_key >= seed y luego
+    random_key < seed. Cada tramo es un range scan sobre el índice
+    (is_active, random_key, id). El cursor guarda [tramo, random_key, id].
+    """
+    phase, values = 0, None
+    cursor = decode_cursor(request.GET.get("after"))
+    if cursor and len(cursor) == 3 and cursor[0] in (0, 1):
+        try:
+            phase, values = cursor[0], [float(cursor[1]), int(cursor[2])]
+        except (TypeError, ValueError):
+            phase, values = 0, None
+
+    rows = []
+    while phase < 2 and len(rows) <= size:
+        if phase == 0:
+            tramo = queryset.filter(random_key__gte=seed)
+        else:
+            tramo = queryset.filter(random_key__lt=seed)
+        if values is not None:
+            tramo = tramo.filter(keyset_filter(ORDERING, values))
+
+        batch = list(tramo.order_by(*ORDERING)[:size + 1 - len(rows)])
+        rows.extend((phase, producto) for producto in batch)
+        if len(rows) > size:
+            break
+        phase, values = phase + 1, None
+
+    next_url = None
+    if len(rows) > size:
+        rows = rows[:size]
+        last_phase, last = rows[-1]
+        next_url = build_next_url(
+            request, encode_cursor([last_phase, last.random_key, last.id])
+        )
+
+    return KeysetPage([producto for _, producto in rows], next_url)
@@ -0,0 +1,18 @@
+from django import template
+
+from app_products.images import srcset
+
+register = template.Library()
+
+
+# Copias de las imágenes subidas (app_products/images.py):
+# <source type="image/webp" srcset="{{ url|srcset_webp:anchos }}">
+# <img src="{{ url }}" srcset="{{ url|srcset_jpg:anchos }}">
+@register.filter
+def srcset_webp(url, widths):
+    return srcset(url, widths, "webp")
+
+
+@register.filter
+def srcset_jpg(url, widths):
+    return srcset(url, widths, "jpg")
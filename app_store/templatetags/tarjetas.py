@@ -0,0 +1,13 @@
+from django import template
+
+from app_store.fragments import CARD_TEMPLATE, render_cards
+
+register = template.Library()
+
+@register.simple_tag
+def tarjetas(productos, plantilla=CARD_TEMPLATE):
+    """
+    Uso: {% tarjetas productos as cards %}{% for card in cards %}{{ card }}{% endfor %}
+    Devuelve el HTML cacheado de cada tarjeta (ver app_store/fragments.py).
+    """
+    return render_cards(productos, plantilla)
@@ -1,3 +1,189 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from app_products.models import Category, Product, ProductCardSummary
+from app_products.versions import bump_version, product_key
+from app_store import context_processors, fragments
+from app_store.pagination import decode_cursor, encode_cursor, paginate, ranked_page
+from app_store.shuffle import SEED_BUCKETS, SEED_COOKIE, seed_bucket, shuffled_page
+
+ORDERING = ["-sales_count", "-id"]
+
+
+class KeysetPaginationTests(TestCase):
+    """Recorrer todas las páginas siguiendo next_url trae cada producto una sola vez"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Ventas repetidas: el id desempata dentro de cada grupo
+        for i in range(10):
+            Product.objects.create(name=f"Taza {i}", slug=f"taza-{i}", sales_count=i // 3)
+        cls.expected = list(Product.objects.order_by(*ORDERING).values_list("id", flat=True))
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def walk(self, page_of, url="/productos/"):
+        """ids de todas las páginas y cuántas páginas se pidieron"""
+        ids, pages = [], 0
+        while url:
+            page = page_of(self.factory.get(url))
+            ids += [product.id for product in page]
+            pages += 1
+            url = page.next_url
+        return ids, pages
+
+    def test_cursor_ida_y_vuelta(self):
+        values = ["2026-10-18 12:00:00+00:00", 42]
+        self.assertEqual(decode_cursor(encode_cursor(values)), values)
+
+    def test_empates_en_la_columna_de_orden(self):
+        ids, pages = self.walk(lambda request: paginate(request, Product.objects.all(), ORDERING, size=4))
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(pages, 3)
+
+    def test_la_siguiente_pagina_conserva_los_filtros(self):
+        page = paginate(self.factory.get("/productos/?orden=ventas&parcial=1"), Product.objects.all(), ORDERING, size=4)
+        self.assertIn("orden=ventas", page.next_url)
+        self.assertNotIn("parcial", page.next_url)
+
+    def test_cursor_alterado_vuelve_a_la_primera_pagina(self):
+        first = [product.id for product in paginate(self.factory.get("/productos/"), Product.objects.all(), ORDERING, size=4)]
+        for cursor in ("no-es-base64!", encode_cursor({"id": 1}), encode_cursor(["muchas", "x"]), encode_cursor([1])):
+            request = self.factory.get("/productos/", {"after": cursor})
+            page = paginate(request, Product.objects.all(), ORDERING, size=4)
+            self.assertEqual([product.id for product in page], first)
+
+    def test_ranking_con_puntajes_empatados(self):
+        ranking = sorted(((float(i % 2), product_id) for i, product_id in enumerate(self.expected)), key=lambda item: (-item[0], item[1]))
+        ids, pages = self.walk(lambda request: ranked_page(request, ranking, Product.objects.all(), size=3))
+        self.assertEqual(ids, [product_id for _, product_id in ranking])
+        self.assertEqual(pages, 4)
+
+    def test_ranking_con_cursor_alterado(self):
+        ranking = [(1.0, product_id) for product_id in self.expected]
+        request = self.factory.get("/productos/", {"after": encode_cursor(["x", None])})
+        page = ranked_page(request, ranking, Product.objects.all(), size=3)
+        self.assertEqual([product.id for product in page], self.expected[:3])
+
+
+class ShuffledPageTests(TestCase):
+    """El orden aleatorio es estable con la misma semilla y cubre todo el catálogo una vez"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # random_key fijo: el orden esperado se puede calcular
+        for i in range(11):
+            Product.objects.create(name=f"Taza {i}", slug=f"taza-{i}", random_key=((i * 7) % 11) / 11)
+        cls.all_ids = set(Product.objects.values_list("id", flat=True))
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def walk(self, seed, size=4):
+        ids, url = [], "/"
+        while url:
+            page = shuffled_page(self.factory.get(url), Product.objects.all(), seed, size=size)
+            ids += [product.id for product in page]
+            url = page.next_url
+        return ids
+
+    def test_misma_semilla_mismo_orden(self):
+        self.assertEqual(self.walk(0.5), self.walk(0.5))
+
+    def test_todas_las_paginas_cubren_el_catalogo_una_vez(self):
+        for seed in (0.0, 0.3, 0.99):
+            ids = self.walk(seed)
+            self.assertEqual(len(ids), len(self.all_ids))
+            self.assertEqual(set(ids), self.all_ids)
+
+    def test_empieza_en_la_semilla_y_da_la_vuelta(self):
+        expected = [
+            product_id for _, product_id in sorted(
+                ((key - 0.5) % 1, product_id)
+                for product_id, key in Product.objects.values_list("id", "random_key")
+            )
+        ]
+        self.assertEqual(self.walk(0.5, size=3), expected)
+        self.assertNotEqual(self.walk(0.0)[0], self.walk(0.5)[0])
+
+    def test_semilla_de_la_cookie(self):
+        for value, expected in (("3", 3), (str(SEED_BUCKETS), None), ("-1", None), ("x", None)):
+            request = self.factory.get("/")
+            request.COOKIES[SEED_COOKIE] = value
+            self.assertEqual(seed_bucket(request), expected)
+
+
+@override_settings(SHARED_CACHE=True)
+class CardFragmentTests(TestCase):
+    """Las tarjetas se sirven de la caché hasta que sube la versión de su producto"""
+
+    def setUp(self):
+        cache.clear()
+        self.taza = Product.objects.create(name="Taza", slug="taza")
+        self.plato = Product.objects.create(name="Plato", slug="plato")
+        ProductCardSummary.rebuild([self.taza.id, self.plato.id])
+
+    def render(self):
+        products = Product.objects.for_cards().filter(id__in=[self.taza.id, self.plato.id]).order_by("id")
+        with mock.patch.object(fragments, "render_to_string", wraps=fragments.render_to_string) as render:
+            html = fragments.render_cards(products)
+        return html, render.call_count
+
+    def test_segunda_vez_sin_renderizar(self):
+        first, rendered = self.render()
+        self.assertEqual(rendered, 2)
+        second, rendered = self.render()
+        self.assertEqual((second, rendered), (first, 0))
+
+    def test_subir_la_version_renderiza_solo_ese_producto(self):
+        self.render()
+        Product.objects.filter(id=self.taza.id).update(name="Taza grande")
+        html, rendered = self.render()
+        self.assertEqual(rendered, 0)
+        self.assertNotIn("Taza grande", html[0])
+
+        bump_version(product_key(self.taza.id))
+        html, rendered = self.render()
+        self.assertEqual(rendered, 1)
+        self.assertIn("Taza grande", html[0])
+
+    def test_sin_cache_compartida_siempre_renderiza(self):
+        with override_settings(SHARED_CACHE=False):
+            self.render()
+            _, rendered = self.render()
+        self.assertEqual(rendered, 2)
+
+
+class CategorySnapshotTests(TestCase):
+    """El menú de categorías se lee una vez por proceso y se renueva al guardar una categoría"""
+
+    def setUp(self):
+        cache.clear()
+        context_processors._snapshot = (None, ())
+        self.tazas = Category.objects.create(name="Tazas", slug="tazas")
+
+    def names(self):
+        return [categoria.name for categoria in context_processors.get_categorias()]
+
+    def test_sin_cambios_no_consulta(self):
+        self.assertEqual(self.names(), ["Tazas"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(), ["Tazas"])
+
+    def test_guardar_categoria_renueva_el_menu(self):
+        self.names()
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Platos", slug="platos")
+            self.tazas.name = "Tazones"
+            self.tazas.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.names(), ["Platos", "Tazones"])
+
+    def test_borrar_categoria_renueva_el_menu(self):
+        self.names()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tazas.delete()
+        self.assertEqual(self.names(), [])
@@ -7,6 +7,7 @@ urlpatterns = [
     path("productos/categorias/<slug:slug>/", views.CategoriaProductosView.as_view(),name="category_products"),
     path("productos/nuevos productos/", views.NewsProductsView.as_view(), name="news_products"),
     path("productos/buscar/", views.SearchProductsView.as_view(), name="search_products"),
+    path("productos/buscar/sugerencias/", views.SearchSuggestionsView.as_view(), name="search_suggestions"),
     path("productos/top ventas/", views.TopSellingProductsView.as_view(), name="top_selling_products"),
     path("productos/productos oferta/", views.DiscountedProductsView.as_view(), name="discounted_products"),
     
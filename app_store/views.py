@@ -1,41 +1,47 @@
 from django.shortcuts import render
 from django.views import View
-from django.db.models import Prefetch
-from app_products.models import Product, Category, ProductVariant
+from app_products.models import Product, Category
+from app_orders.models import ProductSalesDaily
 from django.shortcuts import get_object_or_404
 from django.db.models import Count
 from django.db.models import Avg
 from django.shortcuts import redirect
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from app_products.search import query_terms, rank_products
+from app_products.typeahead import suggest
+from app_store.conditional import category_versions, conditional_page, sales_versions
+from app_store.facets import ORDERINGS, facet_filter, ordering_choices, selected_ordering
+from app_store.pagination import paginate, ranked_page, is_partial, load_more_response
+from app_store.shuffle import get_visitor_seed, remember_seed, shuffled_page
 
 
 def custom_404(request, exception):
     return redirect("/") 
 
 # Pagina principal de la tienda
+@method_decorator(conditional_page(seeded=True), name="get")
 class StoreView(View):
     def get(self, request):
 
-        variants_prefetch = Prefetch(
-            "variants",
-            queryset=ProductVariant.objects
-                .filter(is_active=True)
-                .prefetch_related("images")
-        )
-
+        # Las tarjetas se pintan desde ProductCardSummary (un solo JOIN)
         featured_products = (
             Product.objects
             .filter(is_active=True, is_featured=True)
-            .prefetch_related(variants_prefetch)
+            .for_cards()
         )
 
-        productos = (
-            Product.objects
-            .filter(is_active=True)
-            .prefetch_related(variants_prefetch)
-            .order_by("?")
+        # 8 productos al azar: lectura por rango sobre random_key desde la
+        # semilla del visitante (mismo orden que /productos/ en su sesión)
+        productos = shuffled_page(
+            request,
+            Product.objects.filter(is_active=True).for_cards(),
+            get_visitor_seed(request),
+            size=8,
         )
 
-        return render(
+        response = render(
             request,
             "Store_page.html",
             {
@@ -43,17 +49,21 @@ class StoreView(View):
                 "productos": productos,
             }
         )
+        return remember_seed(request, response)
 
 
 # Vista para mostrar las categorías con sus productos
+@method_decorator(conditional_page(category_versions), name="get")
 class CategoriaView(View):
     def get(self, request):
+        # Contador e imagen ya calculados en la categoría (Category.refresh_tiles)
         categorias = (
             Category.objects
-            .filter(products__is_active=True)
-            .annotate(total_products=Count('products', distinct=True))
-            .prefetch_related('products')
-            .distinct()
+            .filter(active_products_count__gt=0)
+            .only(
+                "name", "slug", "imagen_category", "imagen_widths",
+                "representative_image", "representative_widths", "active_products_count",
+            )
         )
 
         context = {
@@ -64,102 +74,169 @@ class CategoriaView(View):
 
 
 # Vista para mostrar productos de una categoría específica
+@method_decorator(conditional_page(), name="get")
 class CategoriaProductosView(View):
     def get(self, request, slug):
         # Categoría seleccionada
         categoria = get_object_or_404(Category, slug=slug)
 
-        # Productos activos de esa categoría
+        # Productos activos de esa categoría con al menos una variante activa
         productos = (
             Product.objects
             .filter(
                 is_active=True,
                 category=categoria,
-                variants__is_active=True
-            )
-            .distinct()
-            .prefetch_related(
-                Prefetch(
-                    "variants",
-                    queryset=ProductVariant.objects.filter(is_active=True).prefetch_related("images")
-                )
+                card_summary__variant_id__isnull=False
             )
+            .for_cards()
         )
 
+        # Filtros por color, medida, precio y stock (facetas precalculadas)
+        ids, facetas = facet_filter(request, categoria)
+        if ids is not None:
+            productos = productos.filter(id__in=ids)
+
+        # Orden por fecha, precio o descuento (columnas mantenidas en Product)
+        orden = selected_ordering(request)
+        if orden.startswith("precio"):
+            productos = productos.filter(min_price__isnull=False)
+
+        page = paginate(request, productos, ORDERINGS[orden][1])
+
+        if is_partial(request):
+            return load_more_response(request, page)
+
         context = {
             "categoria": categoria,
-            "productos": productos,
+            "productos": page,
+            "facetas": facetas,
+            "filtros_activos": ids is not None,
+            "ordenes": ordering_choices(request, orden),
         }
 
         return render(request, "Categoria_products.html", context)
 
 
 # Vista para mostrar los productos más nuevos
+@method_decorator(conditional_page(), name="get")
 class NewsProductsView(View):
     def get(self, request):
         # Traer los productos ordenados por fecha de creación (más nuevos primero)
-        productos_nuevos = Product.objects.order_by('-created_at').filter(is_active=True)
+        productos_nuevos = (
+            Product.objects
+            .filter(is_active=True)
+            .for_cards()
+        )
+        page = paginate(request, productos_nuevos, ["-created_at", "-id"])
+
+        if is_partial(request):
+            return load_more_response(request, page)
 
         return render(request, "news_products.html", {
-            "productos": productos_nuevos
+            "productos": page
         })
     
 
 # Busqueda de productos
+@method_decorator(conditional_page(), name="get")
 class SearchProductsView(View):
     def get(self, request):
         query = request.GET.get("q", "")
+        productos = Product.objects.filter(is_active=True).for_cards()
 
-        productos = Product.objects.filter(
-            name__icontains=query,
-            is_active=True
-        ).prefetch_related("variants__images", "variants")
+        if query_terms(query):
+            # Índice de texto completo + ventas y rating
+            page = ranked_page(request, rank_products(query), productos)
+        else:
+            page = paginate(request, productos, ["-created_at", "-id"])
+
+        if is_partial(request):
+            return load_more_response(request, page)
 
         return render(request, "search_results.html", {
             "query": query,
-            "productos": productos
+            "productos": page
         })
 
 
+# Sugerencias del buscador mientras se escribe (sin consultar la base de datos)
+class SearchSuggestionsView(View):
+    def get(self, request):
+        query = request.GET.get("q", "")[:100]
+        response = JsonResponse({"query": query, "results": suggest(query)})
+        patch_cache_control(response, public=True, max_age=60)
+        return response
+
+
 # Vista para mostrar los productos más vendidos
+@method_decorator(conditional_page(sales_versions, daily=True), name="get")
 class TopSellingProductsView(View):
+    PERIODS = {"7": 7, "30": 30, "90": 90}  # ?periodo= -> días del ranking
+    DEFAULT_PERIOD = "30"
+
     def get(self, request):
-        # Traer los productos ordenados por ventas (más vendidos primero)
-        productos_top_ventas = Product.objects.order_by('-sales_count').filter(is_active=True)
+        productos_top_ventas = (
+            Product.objects
+            .filter(is_active=True)
+            .for_cards()
+        )
+
+        # Ranking precalculado de la ventana (caché) y solo los productos
+        # de la página por id; "todo" usa las ventas históricas
+        periodo = request.GET.get("periodo", self.DEFAULT_PERIOD)
+        ranking = None
+        if periodo in self.PERIODS:
+            ranking = ProductSalesDaily.top_products(self.PERIODS[periodo])
+            if not ranking and "periodo" not in request.GET:
+                periodo = "todo"  # Tienda sin ventas recientes
+
+        if periodo in self.PERIODS:
+            page = ranked_page(request, ranking, productos_top_ventas)
+        else:
+            periodo = "todo"
+            page = paginate(request, productos_top_ventas, ["-sales_count", "-id"])
+
+        if is_partial(request):
+            return load_more_response(request, page)
 
         return render(request, "top_selling_products.html", {
-            "productos": productos_top_ventas
+            "productos": page,
+            "periodo": periodo,
+            "periodos": [("7", "Esta semana"), ("30", "Últimos 30 días"), ("90", "Últimos 90 días"), ("todo", "Siempre")],
         })
     
 
 # Vista para mostrar solo productos con descuento
+@method_decorator(conditional_page(), name="get")
 class DiscountedProductsView(View):
     def get(self, request):
-        # Traer productos que tengan al menos una variante con descuento activa
+        # Productos con alguna variante activa en oferta, del mayor descuento
+        # al menor: columnas mantenidas en Product, sin JOIN ni DISTINCT
         productos = Product.objects.filter(
             is_active=True,
-            variants__discount_price__isnull=False,
-            variants__discount_price__gt=0,
-            variants__is_active=True
-        ).distinct().prefetch_related(
-            'variants__images',
-            'variants'
-        )
+            has_active_discount=True
+        ).for_cards()
+        page = paginate(request, productos, ["-max_discount_pct", "-id"])
+
+        if is_partial(request):
+            return load_more_response(request, page)
 
         context = {
-            "productos": productos
+            "productos": page
         }
 
         return render(request, "Discounted_products.html", context)
     
 
 # Vista para la página "Sobre Nosotros"
+@method_decorator(conditional_page(category_versions), name="get")
 class sobreNosotros(View):
     def get(self, request):
         return render(request, "Sobre_nosotros.html")
     
     
 # Vista para la página de Contacto
+@method_decorator(conditional_page(category_versions), name="get")
 class ContactView(View):
     def get(self, request):
         return render(request, "Sobre_nosotros.html")
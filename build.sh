@@ -7,4 +7,16 @@ python manage.py collectstatic --no-input
 
 python manage.py migrate
 
+python manage.py rebuild_card_summaries
+
+python manage.py rebuild_variant_matrices
+
+python manage.py rebuild_category_tiles
+
+python manage.py rebuild_search_index
+
+python manage.py rebuild_category_facets
+
+python manage.py rebuild_sales_rankings
+
 python manage.py createsuperuser --no-input || true
\ No newline at end of file
@@ -8,7 +8,7 @@
 function getCSRFToken() {
     // 1. Intentar desde input hidden generado por {% csrf_token %}
     const csrfInput = document.querySelector('[name=csrfmiddlewaretoken]');
-    if (csrfInput) {
+    if (csrfInput && csrfInput.value) {
         return csrfInput.value;
     }
     
@@ -0,0 +1,42 @@
+// static/js/load_more.js
+
+// ================= VER MÁS (PAGINACIÓN POR CURSOR) =================
+// Pide la siguiente página con ?parcial=1 y agrega las tarjetas al grid.
+// Si algo falla, navega a la URL normal (?after=...).
+// data-scope: busca el destino dentro del contenedor más cercano (p.ej. los
+// comentarios, que aparecen dos veces en el detalle: escritorio y móvil).
+document.addEventListener('click', function(e) {
+    const btn = e.target.closest('.load-more-btn');
+    if (!btn) return;
+
+    const scope = btn.dataset.scope ? btn.closest(btn.dataset.scope) : document;
+    const grid = scope && scope.querySelector(btn.dataset.target);
+    if (!grid) return;
+
+    e.preventDefault();
+
+    const nextUrl = btn.getAttribute('href');
+    const originalHTML = btn.innerHTML;
+    btn.innerHTML = '<span class="spinner-border spinner-border-sm"></span> Cargando...';
+    btn.classList.add('disabled');
+
+    const separator = nextUrl.includes('?') ? '&' : '?';
+
+    fetch(nextUrl + separator + 'parcial=1')
+        .then(response => response.json())
+        .then(data => {
+            grid.insertAdjacentHTML('beforeend', data.html);
+
+            if (data.next_url) {
+                btn.setAttribute('href', data.next_url);
+                btn.innerHTML = originalHTML;
+                btn.classList.remove('disabled');
+            } else {
+                btn.closest('.load-more-container').remove();
+            }
+        })
+        .catch(error => {
+            console.error('Error al cargar más resultados:', error);
+            window.location.href = nextUrl;
+        });
+});
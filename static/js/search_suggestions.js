@@ -0,0 +1,72 @@
+// static/js/search_suggestions.js
+
+// ================= SUGERENCIAS DEL BUSCADOR =================
+// Mientras se escribe pide /productos/buscar/sugerencias/?q=... y muestra
+// categorías, productos y opciones que empiezan por el texto.
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('input[data-suggest-url]').forEach(function(input) {
+        const box = document.querySelector(input.dataset.suggestTarget);
+        if (!box) return;
+
+        const icons = {
+            categoria: 'bi-grid',
+            producto: 'bi-bag',
+            opcion: 'bi-tag'
+        };
+        let timer = null;
+        let lastQuery = '';
+
+        function hide() {
+            box.classList.add('d-none');
+            box.innerHTML = '';
+        }
+
+        function render(results) {
+            box.innerHTML = '';
+            results.forEach(function(item) {
+                const link = document.createElement('a');
+                link.href = item.url;
+                link.className = 'list-group-item list-group-item-action d-flex align-items-center';
+
+                const icon = document.createElement('i');
+                icon.className = 'bi ' + (icons[item.type] || 'bi-search') + ' me-2 text-muted';
+
+                const label = document.createElement('span');
+                label.textContent = item.label;
+
+                link.append(icon, label);
+                box.appendChild(link);
+            });
+            box.classList.toggle('d-none', results.length === 0);
+        }
+
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            const query = input.value.trim();
+            if (!query) {
+                lastQuery = '';
+                hide();
+                return;
+            }
+
+            timer = setTimeout(function() {
+                lastQuery = query;
+                fetch(input.dataset.suggestUrl + '?q=' + encodeURIComponent(query))
+                    .then(response => response.json())
+                    .then(data => {
+                        // Ignorar respuestas de teclas anteriores
+                        if (data.query === lastQuery) render(data.results);
+                    })
+                    .catch(error => console.error('Error al cargar sugerencias:', error));
+            }, 120);
+        });
+
+        input.addEventListener('keydown', function(e) {
+            if (e.key === 'Escape') hide();
+        });
+
+        document.addEventListener('click', function(e) {
+            if (!box.contains(e.target) && e.target !== input) hide();
+        });
+    });
+});
@@ -3,9 +3,32 @@
 // ================= VARIABLES GLOBALES =================
 let currentVariantId = null;
 let allVariantImages = [];
+let variantMatrix = { axes: {}, images: [], variants: [], combinations: {} };
+let variantsById = {};
+
+// ================= MATRIZ DE VARIANTES =================
+// Documento JSON embebido por el servidor (json_script): ejes de opciones,
+// variantes con precio/stock/opciones/imágenes y lista de imágenes única
+function loadVariantMatrix() {
+    const script = document.getElementById('variantMatrix');
+    if (!script) return;
+
+    variantMatrix = JSON.parse(script.textContent);
+    variantsById = {};
+    variantMatrix.variants.forEach(variant => {
+        variantsById[variant.id] = variant;
+    });
+}
+
+// {"Color": "Rojo"} -> [{option: "Color", value: "Rojo"}]
+function variantOptionsList(variant) {
+    return Object.entries(variant.options || {}).map(([option, value]) => ({ option, value }));
+}
 
 // ================= INICIALIZACIÓN =================
 document.addEventListener('DOMContentLoaded', function() {
+    loadVariantMatrix();
+
     // Guardar todas las imágenes disponibles al cargar
     const thumbs = document.querySelectorAll('.product-thumb');
     allVariantImages = Array.from(thumbs).map(thumb => ({
@@ -23,7 +46,8 @@ document.addEventListener('DOMContentLoaded', function() {
     const mainVariantElement = document.querySelector('.variant-option.variant-selected');
     
     if (mainVariantElement) {
-        const options = JSON.parse(mainVariantElement.dataset.options || '[]');
+        const mainVariant = variantsById[mainVariantElement.dataset.variantId];
+        const options = mainVariant ? variantOptionsList(mainVariant) : [];
         
         // Inicializar las opciones de la variante principal
         if (typeof updateOptions === 'function') {
@@ -59,15 +83,24 @@ document.addEventListener('DOMContentLoaded', function() {
 // ================= CAMBIAR IMAGEN PRINCIPAL =================
 function changeMainImage(imageUrl, altText) {
     const mainImg = document.getElementById('mainProductImage');
+    const mainSource = document.getElementById('mainProductSource');
+    const thumbs = Array.from(document.querySelectorAll('.product-thumb'));
+    const selectedThumb = thumbs.find(thumb => thumb.src === imageUrl);
+
     if (mainImg) {
+        // Copias WebP/JPEG de la imagen elegida (srcset manda sobre src)
+        if (mainSource) {
+            mainSource.srcset = selectedThumb ? selectedThumb.dataset.srcsetWebp : '';
+        }
+        mainImg.srcset = selectedThumb ? selectedThumb.dataset.srcsetJpg : '';
         mainImg.src = imageUrl;
         mainImg.alt = altText || '';
     }
 
     // Actualizar miniatura activa
-    document.querySelectorAll('.product-thumb').forEach(thumb => {
+    thumbs.forEach(thumb => {
         thumb.classList.remove('active');
-        if (thumb.src === imageUrl) {
+        if (thumb === selectedThumb) {
             thumb.classList.add('active');
         }
     });
@@ -239,26 +272,22 @@ function updateOptionButtons(optionType, values) {
 
 // ================= SELECCIONAR VARIANTE DESDE DATA =================
 function selectVariantFromData(element) {
-    const variantId = element.dataset.variantId;
-    const imageUrl = element.dataset.mainImage;
-    const altText = element.dataset.mainAlt;
-    const price = element.dataset.price;
-    const discountPrice = element.dataset.discountPrice;
-    const discountPercentage = element.dataset.discountPercentage;
-    const stock = element.dataset.stock;
-    const images = JSON.parse(element.dataset.images || '[]');
-    const options = JSON.parse(element.dataset.options || '[]');
+    const variant = variantsById[element.dataset.variantId];
+    if (!variant) return;
+
+    const images = variant.images.map(position => variantMatrix.images[position]);
+    const mainImage = images[0] || { url: '', alt: '' };
 
     selectVariant(
-        variantId,
-        imageUrl,
-        altText,
-        price,
-        discountPrice,
-        discountPercentage,
-        stock,
+        variant.id,
+        mainImage.url,
+        mainImage.alt,
+        variant.price,
+        variant.discount_price,
+        variant.discount_pct,
+        variant.stock,
         images,
-        options
+        variantOptionsList(variant)
     );
 
     document.querySelectorAll('.variant-option').forEach(opt => {
@@ -48,19 +48,3 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 });
-
-// ================= CARGAR MÁS COMENTARIOS =================
-function loadMoreComments() {
-    const hiddenComments = document.getElementById('hiddenComments');
-    const loadMoreBtn = document.getElementById('loadMoreBtn');
-    const commentsContainer = document.getElementById('commentsContainer');
-    
-    if (hiddenComments) {
-        const comments = hiddenComments.querySelectorAll('.comment-item');
-        comments.forEach(comment => {
-            commentsContainer.appendChild(comment.cloneNode(true));
-        });
-        hiddenComments.style.display = 'none';
-        loadMoreBtn.style.display = 'none';
-    }
-}
\ No newline at end of file
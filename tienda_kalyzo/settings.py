@@ -95,6 +95,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "django.middleware.http.ConditionalGetMiddleware",  # 304 también para copias de la caché de páginas
 ]
 
 ROOT_URLCONF = "tienda_kalyzo.urls"
@@ -152,6 +153,45 @@ else:
     }
 
 
+# --------------------------------------------
+# CACHÉ
+# --------------------------------------------
+# Con varios workers se necesita una caché compartida (Redis) para que las
+# versiones del catálogo se invaliden en todos los procesos a la vez.
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "kalyzo",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "kalyzo",
+        }
+    }
+
+# Versiones del catálogo, caché de páginas y fragmentos de tarjetas solo
+# con una caché compartida: con la de memoria un cambio en el admin solo se
+# vería en el proceso que lo guardó y los demás seguirían sirviendo copias viejas
+SHARED_CACHE = bool(REDIS_URL)
+
+# Caché de páginas completas para anónimos (app_store/middleware.py)
+if SHARED_CACHE:
+    MIDDLEWARE.append("app_store.middleware.PageCacheMiddleware")
+PAGE_CACHE_TIMEOUT = 60 * 60
+PAGE_CACHE_STALE_WHILE_REVALIDATE = True
+
+# Dónde se guardan los carritos (app_orders/utils/cart_store.py): "db" o "cache".
+# "cache" solo con una caché compartida (REDIS_URL); la de memoria es por proceso.
+CART_STORE = config("CART_STORE", default="db")
+
+
 # --------------------------------------------
 # PASSWORD VALIDATION
 # --------------------------------------------
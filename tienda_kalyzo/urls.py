@@ -26,6 +26,7 @@ urlpatterns = [
     path("clientes/", include("app_customers.urls")),
     path("productos/", include("app_products.urls")),
     path("orders/", include("app_orders.urls")),
+    path("api/v1/", include("app_products.api_urls")),  # API JSON de solo lectura
     
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 